@@ -1,12 +1,12 @@
 from django.contrib import admin
-from .models import JobCategory, Job, JobApplication, JobReview, JobMessage
+from .models import JobCategory, Job, JobApplication, JobReview, JobMessage, SavedSearch, ArchivedJob
 
 @admin.register(JobCategory)
 class JobCategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['name', 'parent', 'depth', 'open_job_count', 'is_active', 'created_at']
+    list_filter = ['is_active', 'depth', 'created_at']
     search_fields = ['name', 'description']
-    readonly_fields = ['created_at']
+    readonly_fields = ['path', 'depth', 'open_job_count', 'created_at']
 
 @admin.register(Job)
 class JobAdmin(admin.ModelAdmin):
@@ -23,7 +23,7 @@ class JobAdmin(admin.ModelAdmin):
             'fields': ('title', 'description', 'category', 'posted_by')
         }),
         ('Budget & Location', {
-            'fields': ('budget_min', 'budget_max', 'location', 'is_remote')
+            'fields': ('budget_min', 'budget_max', 'location', 'latitude', 'longitude', 'is_remote')
         }),
         ('Job Details', {
             'fields': ('urgency', 'status', 'assigned_to', 'deadline')
@@ -100,3 +100,35 @@ class JobMessageAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         })
     )
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(admin.ModelAdmin):
+    list_display = ['name', 'provider', 'category', 'min_budget', 'radius_km', 'is_active', 'created_at']
+    list_filter = ['is_active', 'category', 'created_at']
+    search_fields = ['name', 'keywords', 'provider__business_name']
+    readonly_fields = ['created_at', 'updated_at']
+    
+    fieldsets = (
+        ('Search Details', {
+            'fields': ('provider', 'name', 'category', 'keywords', 'min_budget', 'is_active')
+        }),
+        ('Search Area', {
+            'fields': ('latitude', 'longitude', 'radius_km')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        })
+    )
+
+@admin.register(ArchivedJob)
+class ArchivedJobAdmin(admin.ModelAdmin):
+    list_display = ['title', 'posted_by', 'category', 'status', 'created_at', 'archived_at']
+    list_filter = ['status', 'archived_at']
+    search_fields = ['id', 'title', 'posted_by__email']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
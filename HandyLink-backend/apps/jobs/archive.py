@@ -0,0 +1,106 @@
+"""
+Move finished jobs out of the live tables.
+
+Completed and cancelled jobs that have not changed for JOB_ARCHIVE_AFTER_DAYS
+are copied into the archive tables with their applications and messages and
+deleted from the live tables, one chunk per transaction, so hot queries on
+jobs, applications and messages only scan rows that can still change.
+
+Payments and reviews stay where they are. Their job key has no database
+constraint and resolves to the ArchivedJob once the live row is gone
+(apps/jobs/fields.py), so jobs with payments or reviews are archived like
+any other.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.notifications.models import Notification
+from .models import (
+    ArchivedJob, ArchivedJobApplication, ArchivedJobMessage,
+    Job, JobApplication, JobMessage, JobMessageCounter
+)
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'cancelled')
+CHUNK_SIZE = 500
+
+
+def _copied_fields(source, target):
+    """Column names shared by a live model and its archive model"""
+    target_fields = {field.attname for field in target._meta.concrete_fields}
+    target_fields.discard('archived_at')
+    return [field.attname for field in source._meta.concrete_fields if field.attname in target_fields]
+
+
+def _copy_rows(queryset, archive_model, archived_at):
+    fields = _copied_fields(queryset.model, archive_model)
+    rows = [archive_model(archived_at=archived_at, **row) for row in queryset.values(*fields)]
+    archive_model.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(rows)
+
+
+def archivable_job_ids(days=None):
+    """Ids of finished jobs last updated more than `days` days ago"""
+    days = settings.JOB_ARCHIVE_AFTER_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(
+        status__in=FINISHED_STATUSES,
+        updated_at__lt=cutoff
+    ).order_by('id').values_list('id', flat=True)
+
+
+def archive_chunk(job_ids):
+    """
+    Archive one chunk of jobs in a single transaction, returning
+    (jobs moved, applications moved, messages moved)
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Lock the jobs and re-check them, they may have changed since the scan
+        job_ids = list(
+            Job.objects.select_for_update()
+            .filter(id__in=job_ids, status__in=FINISHED_STATUSES)
+            .values_list('id', flat=True)
+        )
+        if not job_ids:
+            return 0, 0, 0
+
+        applications = JobApplication.objects.filter(job_id__in=job_ids)
+        application_count = _copy_rows(applications, ArchivedJobApplication, now)
+        applications.delete()
+
+        messages = JobMessage.objects.filter(job_id__in=job_ids)
+        message_count = _copy_rows(messages, ArchivedJobMessage, now)
+        messages.delete()
+        JobMessageCounter.objects.filter(job_id__in=job_ids).delete()
+
+        _copy_rows(Job.objects.filter(id__in=job_ids), ArchivedJob, now)
+        # Keep users' notification history, it would cascade otherwise
+        Notification.objects.filter(job_id__in=job_ids).update(job=None)
+        Job.objects.filter(duplicate_of_id__in=job_ids).update(duplicate_of=None)
+        Job.objects.filter(id__in=job_ids).delete()
+
+    return len(job_ids), application_count, message_count
+
+
+def archive_finished_jobs(days=None, chunk_size=CHUNK_SIZE):
+    """Archive every eligible job chunk by chunk, returning the summed counts"""
+    job_ids = list(archivable_job_ids(days))
+    totals = [0, 0, 0]
+    for start in range(0, len(job_ids), chunk_size):
+        counts = archive_chunk(job_ids[start:start + chunk_size])
+        totals = [total + count for total, count in zip(totals, counts)]
+    logger.info(
+        f"Archived {totals[0]} jobs with {totals[1]} applications and {totals[2]} messages"
+    )
+    return tuple(totals)
+
+
+def get_archived_job(job_id):
+    """An archived job by its original id, or None"""
+    return ArchivedJob.objects.select_related('posted_by', 'category', 'assigned_to').filter(id=job_id).first()
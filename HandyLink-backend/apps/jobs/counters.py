@@ -0,0 +1,104 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Value, When
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+class JobViewCounter:
+    """
+    Buffer job view increments in process memory
+
+    Views are counted in a per-process buffer and written back as aggregated
+    deltas with a single UPDATE once the buffer is old or large enough, so a
+    popular job costs one write per flush instead of one per page view.
+
+    Counts are per process until flushed: each process can hold up to one
+    flush interval of views that are not yet in the database, and only that
+    process can write them. Besides flushes triggered by record(), a daemon
+    thread started with the first view flushes every JOB_VIEW_FLUSH_INTERVAL
+    seconds so views are written when traffic stops, and the buffer is
+    flushed at interpreter exit. Views buffered when a process is killed
+    without a clean exit are lost.
+    """
+
+    _lock = threading.Lock()
+    _pending = Counter()
+    _last_flush = time.monotonic()
+    _flusher = None
+
+    @classmethod
+    def record(cls, job_id):
+        """Count one view of a job, flushing the buffer when it is due"""
+        with cls._lock:
+            if cls._flusher is None:
+                cls._start_background_flush()
+            cls._pending[job_id] += 1
+            due = (
+                len(cls._pending) >= settings.JOB_VIEW_FLUSH_THRESHOLD or
+                time.monotonic() - cls._last_flush >= settings.JOB_VIEW_FLUSH_INTERVAL
+            )
+        if due:
+            cls.flush()
+
+    @classmethod
+    def _start_background_flush(cls):
+        """Start the periodic flush thread and flush at exit, called once under the lock"""
+        cls._flusher = threading.Thread(target=cls._flush_periodically, name='job-view-flush', daemon=True)
+        cls._flusher.start()
+        atexit.register(cls.flush)
+
+    @classmethod
+    def _flush_periodically(cls):
+        while True:
+            time.sleep(settings.JOB_VIEW_FLUSH_INTERVAL)
+            try:
+                cls.flush_if_due()
+            finally:
+                # The thread's connection would otherwise stay open between flushes
+                connection.close()
+
+    @classmethod
+    def flush_if_due(cls):
+        """Flush when views are buffered and the last flush is one interval old"""
+        with cls._lock:
+            due = bool(cls._pending) and time.monotonic() - cls._last_flush >= settings.JOB_VIEW_FLUSH_INTERVAL
+        return cls.flush() if due else 0
+
+    @classmethod
+    def pending(cls, job_id):
+        """Views of a job buffered in this process but not yet flushed"""
+        with cls._lock:
+            return cls._pending.get(job_id, 0)
+
+    @classmethod
+    def flush(cls):
+        """Write all buffered deltas to the database in one UPDATE"""
+        with cls._lock:
+            deltas, cls._pending = cls._pending, Counter()
+            cls._last_flush = time.monotonic()
+
+        if not deltas:
+            return 0
+
+        try:
+            return Job.objects.filter(id__in=deltas).update(
+                view_count=F('view_count') + Case(
+                    *[When(id=job_id, then=Value(delta)) for job_id, delta in deltas.items()],
+                    default=Value(0),
+                    output_field=IntegerField()
+                )
+            )
+        except Exception as e:
+            # Put the deltas back so the next flush retries them
+            logger.error(f"Error flushing job view counts: {e}")
+            with cls._lock:
+                cls._pending.update(deltas)
+            return 0
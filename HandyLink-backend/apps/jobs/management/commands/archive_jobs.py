@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.jobs.archive import CHUNK_SIZE, archivable_job_ids, archive_finished_jobs
+from apps.jobs.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Move finished jobs with their applications and messages into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.JOB_ARCHIVE_AFTER_DAYS,
+            help='Archive completed and cancelled jobs not updated for this many days'
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Jobs archived per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many jobs would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_job_ids(options['days']).count()
+            self.stdout.write(f'{count} jobs would be archived')
+            return
+
+        started = time.monotonic()
+        live_before = Job.objects.count()
+        moved, applications, messages = archive_finished_jobs(options['days'], options['chunk_size'])
+        live_after = Job.objects.count()
+        shrinkage = 100 * (live_before - live_after) / live_before if live_before else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} jobs, {applications} applications and {messages} messages '
+            f'in {time.monotonic() - started:.2f}s'
+        ))
+        self.stdout.write(
+            f'Live jobs table: {live_before} -> {live_after} rows ({shrinkage:.1f}% smaller)'
+        )
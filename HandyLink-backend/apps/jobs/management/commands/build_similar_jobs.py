@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.similarity import DEFAULT_TOP_K, rebuild_similar_jobs, update_similar_jobs
+
+
+class Command(BaseCommand):
+    help = 'Precompute "similar jobs" neighbour lists from TF-IDF vectors of open jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Neighbours to keep per job')
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Only index jobs opened since the last run instead of rebuilding every list'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['incremental']:
+            count = update_similar_jobs(options['top_k'])
+            message = f'Scored {count} new or unmatched open jobs'
+        else:
+            count = rebuild_similar_jobs(options['top_k'])
+            message = f'Rebuilt similar jobs for {count} open jobs'
+        self.stdout.write(self.style.SUCCESS(f'{message} in {time.monotonic() - started:.2f}s'))
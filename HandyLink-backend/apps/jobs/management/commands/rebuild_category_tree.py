@@ -0,0 +1,40 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from apps.jobs.models import Job, JobCategory
+
+
+class Command(BaseCommand):
+    help = 'Recompute job category paths, depths and rolled-up open job counts'
+
+    def handle(self, *args, **options):
+        categories = {category.pk: category for category in JobCategory.objects.all()}
+        children = {}
+        for category in categories.values():
+            children.setdefault(category.parent_id, []).append(category)
+
+        # Walk the tree from the roots so every parent path is set first
+        stack = [(category, '') for category in children.get(None, [])]
+        while stack:
+            category, parent_path = stack.pop()
+            category.path = f"{parent_path}{category.pk:0{JobCategory.PATH_SEGMENT_DIGITS}d}/"
+            category.depth = len(JobCategory.ancestor_paths(category.path)) - 1
+            category.open_job_count = 0
+            stack.extend((child, category.path) for child in children.get(category.pk, []))
+
+        direct_counts = Counter(dict(
+            Job.objects.filter(status='open').values_list('category').annotate(count=Count('id'))
+        ))
+        by_path = {category.path: category for category in categories.values()}
+        for category_id, count in direct_counts.items():
+            for path in JobCategory.ancestor_paths(categories[category_id].path):
+                by_path[path].open_job_count += count
+
+        with transaction.atomic():
+            JobCategory.objects.bulk_update(
+                categories.values(), ['path', 'depth', 'open_job_count'], batch_size=500
+            )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(categories)} categories'))
@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.jobs.services import BidStatsService
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-category bid statistics from the per-job bid statistics'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = BidStatsService.refresh_category_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Refreshed bid statistics for {count} categories in {time.monotonic() - started:.2f}s'
+        ))
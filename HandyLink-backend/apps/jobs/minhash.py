@@ -0,0 +1,74 @@
+"""
+MinHash signatures and LSH band keys for near-duplicate text detection.
+
+A signature has NUM_PERMUTATIONS minimum hashes of the text's word
+shingles; the fraction of positions two signatures share estimates the
+Jaccard similarity of their shingle sets. Signatures are split into
+NUM_BANDS bands of ROWS_PER_BAND rows and each band is hashed to a key,
+so texts with similarity above roughly (1 / NUM_BANDS) ** (1 / ROWS_PER_BAND)
+share at least one key with high probability.
+"""
+import hashlib
+import random
+import re
+import struct
+
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // NUM_BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed: signatures are stored, so the permutations must never change
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def _hash32(value):
+    return struct.unpack('<I', hashlib.blake2b(value.encode(), digest_size=4).digest())[0]
+
+
+def shingles(text):
+    """Set of hashed word n-grams of the normalised text"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {_hash32(' '.join(words))} if words else set()
+    return {
+        _hash32(' '.join(words[i:i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(text):
+    """MinHash signature of a text as a list of NUM_PERMUTATIONS ints"""
+    hashed = shingles(text)
+    if not hashed:
+        return [_MAX_HASH] * NUM_PERMUTATIONS
+    return [
+        min(((a * value + b) % _MERSENNE_PRIME) & _MAX_HASH for value in hashed)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_keys(sig):
+    """One signed 63-bit key per band, suitable for a BigIntegerField index"""
+    keys = []
+    for band in range(NUM_BANDS):
+        rows = sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        digest = hashlib.blake2b(
+            struct.pack(f'<I{ROWS_PER_BAND}I', band, *rows), digest_size=8
+        ).digest()
+        keys.append(struct.unpack('<q', digest)[0] >> 1)
+    return keys
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_PERMUTATIONS
@@ -1,13 +1,28 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth import get_user_model
 from apps.providers.models import Provider
+from core.tracking import TrackedFieldsMixin
+from .fields import ArchivableJobField
+from .utils import bounding_box
 
 User = get_user_model()
 
 class JobCategory(models.Model):
+    # Each path segment is the zero padded id followed by a slash, so a
+    # subtree is every category whose path starts with the root's path
+    PATH_SEGMENT_DIGITS = 8
+    
     name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     icon = models.CharField(max_length=50, blank=True, help_text="Icon class or emoji")
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    open_job_count = models.PositiveIntegerField(default=0, editable=False, help_text="Open jobs in this category and its subcategories")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -18,7 +33,52 @@ class JobCategory(models.Model):
     def __str__(self):
         return self.name
 
-class Job(models.Model):
+    @staticmethod
+    def ancestor_paths(path):
+        """Paths of the category at `path` and all of its ancestors"""
+        segments = path.split('/')[:-1]
+        return ['/'.join(segments[:i]) + '/' for i in range(1, len(segments) + 1)]
+
+    @classmethod
+    def adjust_open_job_count(cls, path, delta):
+        """Add delta to the rolled-up open job count of a category and its ancestors"""
+        if path and delta:
+            cls.objects.filter(path__in=cls.ancestor_paths(path)).update(
+                open_job_count=F('open_job_count') + delta
+            )
+
+    def save(self, *args, **kwargs):
+        if self.pk:
+            # The tree columns are maintained with UPDATEs, never trust stale copies
+            stored = JobCategory.objects.filter(pk=self.pk).values('path', 'depth', 'open_job_count').first()
+            if stored:
+                self.path, self.depth, self.open_job_count = stored['path'], stored['depth'], stored['open_job_count']
+        old_path, old_depth = self.path, self.depth
+        super().save(*args, **kwargs)
+        
+        parent_path = self.parent.path if self.parent_id else ''
+        new_path = f"{parent_path}{self.pk:0{self.PATH_SEGMENT_DIGITS}d}/"
+        if new_path == old_path:
+            return
+        new_depth = len(self.ancestor_paths(new_path)) - 1
+        
+        with transaction.atomic():
+            if old_path:
+                # Moved: rewrite descendants' paths and move the subtree's counts
+                JobCategory.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (new_depth - old_depth)
+                )
+                JobCategory.objects.filter(path__in=self.ancestor_paths(old_path)[:-1]).update(
+                    open_job_count=F('open_job_count') - self.open_job_count
+                )
+                JobCategory.objects.filter(path__in=self.ancestor_paths(new_path)[:-1]).update(
+                    open_job_count=F('open_job_count') + self.open_job_count
+                )
+            JobCategory.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        self.path, self.depth = new_path, new_depth
+
+class Job(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('open', 'Open'),
         ('in_progress', 'In Progress'),
@@ -42,24 +102,71 @@ class Job(models.Model):
     budget_min = models.DecimalField(max_digits=10, decimal_places=2)
     budget_max = models.DecimalField(max_digits=10, decimal_places=2)
     location = models.CharField(max_length=255)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     urgency = models.CharField(max_length=20, choices=URGENCY_CHOICES, default='medium')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
     
     is_remote = models.BooleanField(default=False)
     skills_required = models.JSONField(default=list, blank=True)
     attachments = models.JSONField(default=list, blank=True)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='duplicates',
+        help_text="Earlier open job by the same customer this post nearly duplicates"
+    )
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     deadline = models.DateTimeField(null=True, blank=True)
 
+    # Compared by the category count and notification signals
+    tracked_fields = ('status',)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-view_count']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
 
     def __str__(self):
         return f"{self.title} - {self.posted_by.email}"
 
-class JobApplication(models.Model):
+class JobFingerprint(models.Model):
+    """MinHash signature of a job's title and description"""
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    signature = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Fingerprint for {self.job_id}"
+
+class JobFingerprintBand(models.Model):
+    """One LSH band key of a job fingerprint, indexed for candidate lookup"""
+    fingerprint = models.ForeignKey(JobFingerprint, on_delete=models.CASCADE, related_name='bands')
+    key = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"Band {self.key} of {self.fingerprint_id}"
+
+class SimilarJob(models.Model):
+    """Precomputed nearest neighbour of an open job by TF-IDF cosine similarity"""
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='similar_jobs')
+    similar = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['job', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'rank'], name='unique_similar_job_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.similar_id} is #{self.rank} similar to {self.job_id}"
+
+class JobApplication(TrackedFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('accepted', 'Accepted'),
@@ -76,6 +183,9 @@ class JobApplication(models.Model):
     applied_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Compared by the bid statistics and notification signals
+    tracked_fields = ('status', 'bid_amount')
+
     class Meta:
         unique_together = ['job', 'provider']
         ordering = ['-applied_at']
@@ -83,8 +193,76 @@ class JobApplication(models.Model):
     def __str__(self):
         return f"{self.provider.business_name} applied to {self.job.title}"
 
+class JobBidStats(models.Model):
+    """
+    Running bid statistics of a job, maintained as applications are made,
+    withdrawn or deleted
+
+    Bids are kept as a sorted array of cents, so min, max and median are
+    array lookups and nothing scans the applications table at read time.
+    Withdrawn bids are removed. Once a job is no longer open its statistics
+    are left as they were when it closed.
+    """
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, primary_key=True, related_name='bid_stats')
+    bid_count = models.PositiveIntegerField(default=0)
+    bid_sum = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    bids = models.JSONField(default=list, help_text="Sorted bid amounts in cents")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Bid stats for job {self.job_id}"
+
+    @staticmethod
+    def _amount(cents):
+        return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+    @property
+    def min_bid(self):
+        return self._amount(self.bids[0]) if self.bids else None
+
+    @property
+    def max_bid(self):
+        return self._amount(self.bids[-1]) if self.bids else None
+
+    @property
+    def median_bid(self):
+        if not self.bids:
+            return None
+        middle = len(self.bids) // 2
+        if len(self.bids) % 2:
+            return self._amount(self.bids[middle])
+        return self._amount(Decimal(self.bids[middle - 1] + self.bids[middle]) / 2)
+
+    @property
+    def average_bid(self):
+        return (self.bid_sum / self.bid_count).quantize(Decimal('0.01')) if self.bid_count else None
+
+class CategoryBidStats(models.Model):
+    """
+    Bid statistics of a category and its subcategories over every job with
+    bids, refreshed in batch by the refresh_category_bid_stats command
+    """
+    category = models.OneToOneField(JobCategory, on_delete=models.CASCADE, primary_key=True, related_name='bid_stats')
+    job_count = models.PositiveIntegerField(default=0)
+    bid_count = models.PositiveIntegerField(default=0)
+    min_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    median_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    average_bid = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Category bid stats'
+
+    def __str__(self):
+        return f"Bid stats for {self.category.name}"
+
 class JobReview(models.Model):
-    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name='job_review')  # Changed related_name
+    """
+    Legacy job review, superseded by reviews.Review. New reviews are no
+    longer written here, the merge_job_reviews command moves existing rows.
+    """
+    job = ArchivableJobField(Job, related_name='job_review')
     reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='job_reviews_written')
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='job_reviews_received')
     rating = models.PositiveIntegerField(choices=[(i, i) for i in range(1, 6)])
@@ -103,6 +281,157 @@ class JobMessage(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['job', 'created_at']),
+        ]
 
     def __str__(self):
         return f"Message in {self.job.title} from {self.sender.email}"
+
+class JobMessageCounter(models.Model):
+    """
+    Unread message counter of one participant in a job conversation, kept
+    up to date on send and mark-read so unread badges never count messages
+    """
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='message_counters')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='job_message_counters')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['job', 'user']
+        indexes = [
+            models.Index(fields=['user', 'unread_count']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.email} has {self.unread_count} unread in {self.job_id}"
+
+class SavedSearch(models.Model):
+    """
+    A provider's saved job search, stored as indexed predicates so new jobs
+    can be matched against every search in one query (percolator style)
+    """
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='saved_searches')
+    name = models.CharField(max_length=100)
+    category = models.ForeignKey(JobCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='saved_searches')
+    keywords = models.CharField(max_length=255, blank=True, help_text="Space separated, all must match")
+    min_budget = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    
+    # Search area, stored with its bounding box so the index can prefilter
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    radius_km = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    min_latitude = models.FloatField(null=True, blank=True, editable=False)
+    max_latitude = models.FloatField(null=True, blank=True, editable=False)
+    min_longitude = models.FloatField(null=True, blank=True, editable=False)
+    max_longitude = models.FloatField(null=True, blank=True, editable=False)
+    
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Saved Searches"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', 'category', 'min_budget']),
+            models.Index(fields=['min_latitude', 'max_latitude']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.provider.business_name}"
+
+    @property
+    def has_area(self):
+        return None not in (self.latitude, self.longitude, self.radius_km)
+
+    def save(self, *args, **kwargs):
+        if self.has_area:
+            (
+                self.min_latitude, self.max_latitude,
+                self.min_longitude, self.max_longitude
+            ) = bounding_box(float(self.latitude), float(self.longitude), float(self.radius_km))
+        else:
+            self.min_latitude = self.max_latitude = None
+            self.min_longitude = self.max_longitude = None
+        super().save(*args, **kwargs)
+
+
+# Archive tables. Finished jobs are moved here by the archive_jobs command so
+# the live tables only hold rows that hot queries need. Ids are preserved so
+# archived rows can still be looked up by their original id. Foreign keys
+# are kept without database constraints or reverse accessors.
+
+class ArchivedJob(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    title = models.CharField(max_length=255)
+    description = models.TextField()
+    category = models.ForeignKey(JobCategory, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    posted_by = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    assigned_to = models.ForeignKey(Provider, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name='+')
+    
+    budget_min = models.DecimalField(max_digits=10, decimal_places=2)
+    budget_max = models.DecimalField(max_digits=10, decimal_places=2)
+    location = models.CharField(max_length=255)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    urgency = models.CharField(max_length=20, choices=Job.URGENCY_CHOICES)
+    status = models.CharField(max_length=20, choices=Job.STATUS_CHOICES)
+    
+    is_remote = models.BooleanField(default=False)
+    skills_required = models.JSONField(default=list, blank=True)
+    attachments = models.JSONField(default=list, blank=True)
+    view_count = models.PositiveIntegerField(default=0)
+    duplicate_of_id = models.BigIntegerField(null=True, blank=True)
+    
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deadline = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['posted_by', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+class ArchivedJobApplication(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    job_id = models.BigIntegerField(db_index=True, help_text="Id of the live or archived job")
+    provider = models.ForeignKey(Provider, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    bid_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    estimated_duration = models.CharField(max_length=100)
+    cover_letter = models.TextField()
+    status = models.CharField(max_length=20, choices=JobApplication.STATUS_CHOICES)
+    applied_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-applied_at']
+
+    def __str__(self):
+        return f"Archived application {self.id} to job {self.job_id}"
+
+class ArchivedJobMessage(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    job_id = models.BigIntegerField(help_text="Id of the live or archived job")
+    sender = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    message = models.TextField()
+    created_at = models.DateTimeField()
+    is_read = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['job_id', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Archived message {self.id} in job {self.job_id}"
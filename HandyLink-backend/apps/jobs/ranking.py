@@ -0,0 +1,143 @@
+"""
+Rank a job's applications by a weighted blend of normalised features.
+
+All applications of a job are loaded with their features in one query and
+scored together with NumPy, so ranking 100+ bids is a few array operations.
+Every factor is normalised to 0..1 (higher is better), multiplied by its
+weight and summed; the per-factor contributions are returned as the
+explanation for each application.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import JobApplication
+
+FACTORS = ('bid', 'rating', 'reviews', 'distance', 'history')
+
+# Distance at which the distance factor drops to 0.5
+DISTANCE_HALF_SCORE_KM = 10.0
+
+
+def get_weights(overrides=None):
+    """
+    Ranking weights from settings, optionally overridden, normalised to sum
+    to 1. Raises ValueError for a NaN or infinite weight.
+    """
+    weights = dict(settings.APPLICATION_RANKING_WEIGHTS)
+    weights.update(overrides or {})
+    values = [float(weights.get(factor, 0)) for factor in FACTORS]
+    for factor, value in zip(FACTORS, values):
+        if not math.isfinite(value):
+            raise ValueError(f'The {factor} ranking weight must be a finite number.')
+    vector = np.array([max(value, 0.0) for value in values])
+    total = vector.sum()
+    if total == 0:
+        vector = np.ones(len(FACTORS))
+        total = len(FACTORS)
+    return vector / total
+
+
+def _distances_km(job, lats, lngs):
+    """Vectorised haversine distance from the job to each provider, NaN if unknown"""
+    if job.latitude is None or job.longitude is None:
+        return np.full(len(lats), np.nan)
+    lat1, lng1 = np.radians(float(job.latitude)), np.radians(float(job.longitude))
+    lat2, lng2 = np.radians(lats), np.radians(lngs)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2 +
+        np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def score_features(bids, ratings, reviews, distances, accepted, decided, weights):
+    """
+    Score feature arrays, returning (scores, factor_matrix)
+
+    factor_matrix has one column per entry of FACTORS holding the weighted
+    contribution of that factor, so scores == factor_matrix.sum(axis=1).
+    """
+    # Cheaper bids score higher, relative to the other bids on the job
+    bid_range = bids.max() - bids.min()
+    bid_score = (bids.max() - bids) / bid_range if bid_range > 0 else np.ones_like(bids)
+
+    rating_score = np.clip(ratings / 5.0, 0.0, 1.0)
+
+    # Diminishing returns on review volume, relative to the best applicant
+    review_log = np.log1p(reviews)
+    review_score = review_log / review_log.max() if review_log.max() > 0 else np.zeros_like(reviews)
+
+    # Unknown distances score as neutral
+    distance_score = np.where(
+        np.isnan(distances), 0.5, 1.0 / (1.0 + distances / DISTANCE_HALF_SCORE_KM)
+    )
+
+    # Smoothed past win rate, so providers with no history start at 0.5
+    history_score = (accepted + 1.0) / (decided + 2.0)
+
+    factors = np.column_stack([bid_score, rating_score, review_score, distance_score, history_score])
+    contributions = factors * weights
+    return contributions.sum(axis=1), contributions
+
+
+def rank_applications(job, queryset=None, weights=None):
+    """
+    Return the job's applications best first, each with `ranking_score`
+    and `ranking_explanation` attributes set
+    """
+    queryset = queryset if queryset is not None else JobApplication.objects.filter(job=job)
+    applications = list(
+        queryset.select_related('provider', 'provider__user').annotate(
+            provider_accepted=Count(
+                'provider__job_applications',
+                filter=Q(provider__job_applications__status='accepted')
+            ),
+            provider_decided=Count(
+                'provider__job_applications',
+                filter=Q(provider__job_applications__status__in=['accepted', 'rejected'])
+            )
+        )
+    )
+    if not applications:
+        return []
+
+    def column(values):
+        return np.array([np.nan if value is None else float(value) for value in values])
+
+    bids = column(a.bid_amount for a in applications)
+    ratings = column(a.provider.rating for a in applications)
+    reviews = column(a.provider.total_reviews for a in applications)
+    distances = _distances_km(
+        job,
+        column(a.provider.latitude for a in applications),
+        column(a.provider.longitude for a in applications)
+    )
+    accepted = column(a.provider_accepted for a in applications)
+    decided = column(a.provider_decided for a in applications)
+
+    weight_vector = weights if weights is not None else get_weights()
+    scores, contributions = score_features(bids, ratings, reviews, distances, accepted, decided, weight_vector)
+
+    for index, application in enumerate(applications):
+        values = {
+            'bid': float(bids[index]),
+            'rating': float(ratings[index]),
+            'reviews': int(reviews[index]),
+            'distance': None if np.isnan(distances[index]) else round(float(distances[index]), 1),
+            'history': f"{int(accepted[index])}/{int(decided[index])}",
+        }
+        application.ranking_score = round(float(scores[index]), 4)
+        application.ranking_explanation = {
+            factor: {
+                'value': values[factor],
+                'weight': round(float(weight_vector[position]), 4),
+                'contribution': round(float(contributions[index, position]), 4),
+            }
+            for position, factor in enumerate(FACTORS)
+        }
+
+    order = np.argsort(-scores, kind='stable')
+    return [applications[index] for index in order]
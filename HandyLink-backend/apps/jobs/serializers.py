@@ -1,52 +1,115 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import JobCategory, Job, JobApplication, JobReview, JobMessage
+from .models import (
+    JobCategory, Job, JobApplication, JobMessage, SavedSearch, SimilarJob,
+    ArchivedJob, ArchivedJobApplication, JobBidStats, CategoryBidStats
+)
+from .services import DuplicateJobService
 from apps.providers.models import Provider
+from apps.reviews.models import Review
 
 class JobCategorySerializer(serializers.ModelSerializer):
-    job_count = serializers.SerializerMethodField()
+    job_count = serializers.IntegerField(source='open_job_count', read_only=True)
     
     class Meta:
         model = JobCategory
-        fields = ['id', 'name', 'description', 'icon', 'is_active', 'job_count', 'created_at']
-        read_only_fields = ['created_at']
+        fields = [
+            'id', 'name', 'description', 'icon', 'parent', 'path', 'depth',
+            'is_active', 'job_count', 'created_at'
+        ]
+        read_only_fields = ['path', 'depth', 'created_at']
     
-    def get_job_count(self, obj):
-        return obj.jobs.filter(status='open').count()
+    def validate_parent(self, value):
+        if value and self.instance and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under itself or its subcategories.")
+        return value
 
 class JobCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
         fields = [
             'title', 'description', 'category', 'budget_min', 'budget_max',
-            'location', 'urgency', 'is_remote', 'skills_required', 
-            'attachments', 'deadline'
+            'location', 'latitude', 'longitude', 'urgency', 'is_remote',
+            'skills_required', 'attachments', 'deadline'
         ]
     
     def validate(self, data):
         if data['budget_min'] > data['budget_max']:
             raise serializers.ValidationError("Minimum budget cannot be greater than maximum budget.")
         return data
+    
+    def create(self, validated_data):
+        # Flag duplicates before commit so post-commit hooks see the flag
+        with transaction.atomic():
+            job = super().create(validated_data)
+            DuplicateJobService.check_job(job)
+        return job
+
+class PrefetchedCategoryField(serializers.PrimaryKeyRelatedField):
+    """Resolve categories from a {id: category} map in the context, when given"""
+    
+    def to_internal_value(self, data):
+        categories = self.context.get('categories')
+        if categories is None:
+            return super().to_internal_value(data)
+        try:
+            return categories[int(data)]
+        except (KeyError, TypeError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
+class BulkJobItemSerializer(JobCreateSerializer):
+    """One job of a bulk post, validated without a query per item"""
+    category = PrefetchedCategoryField(queryset=JobCategory.objects.all())
+
+class JobBidStatsSerializer(serializers.ModelSerializer):
+    min_bid = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    median_bid = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    max_bid = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    average_bid = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = JobBidStats
+        fields = ['bid_count', 'min_bid', 'median_bid', 'max_bid', 'average_bid']
+
+class CategoryBidStatsSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    
+    class Meta:
+        model = CategoryBidStats
+        fields = [
+            'category', 'category_name', 'job_count', 'bid_count', 'min_bid',
+            'median_bid', 'max_bid', 'average_bid', 'refreshed_at'
+        ]
 
 class JobSerializer(serializers.ModelSerializer):
     posted_by_name = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     assigned_provider_name = serializers.CharField(source='assigned_to.business_name', read_only=True)
     application_count = serializers.SerializerMethodField()
+    bid_stats = serializers.SerializerMethodField()
     
     class Meta:
         model = Job
         fields = [
             'id', 'title', 'description', 'category', 'category_name',
             'posted_by', 'posted_by_name', 'assigned_to', 'assigned_provider_name',
-            'budget_min', 'budget_max', 'location', 'urgency', 'status',
-            'is_remote', 'skills_required', 'attachments', 'deadline',
-            'application_count', 'created_at', 'updated_at'
+            'budget_min', 'budget_max', 'location', 'latitude', 'longitude',
+            'urgency', 'status', 'is_remote', 'skills_required', 'attachments', 'deadline',
+            'application_count', 'bid_stats', 'view_count', 'duplicate_of',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['posted_by', 'created_at', 'updated_at']
+        read_only_fields = ['posted_by', 'view_count', 'duplicate_of', 'created_at', 'updated_at']
     
     def get_posted_by_name(self, obj):
         return f"{obj.posted_by.first_name} {obj.posted_by.last_name}".strip()
     
+    def get_bid_stats(self, obj):
+        try:
+            stats = obj.bid_stats
+        except JobBidStats.DoesNotExist:
+            return JobBidStatsSerializer(JobBidStats()).data
+        return JobBidStatsSerializer(stats).data
+    
     def get_application_count(self, obj):
         return obj.applications.count()
 
@@ -60,7 +123,7 @@ class JobListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'category_name', 'posted_by_name', 'budget_min',
             'budget_max', 'location', 'urgency', 'status', 'is_remote',
-            'application_count', 'created_at'
+            'application_count', 'view_count', 'created_at'
         ]
     
     def get_posted_by_name(self, obj):
@@ -82,6 +145,13 @@ class JobApplicationSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['applied_at', 'updated_at']
 
+class RankedJobApplicationSerializer(JobApplicationSerializer):
+    ranking_score = serializers.FloatField(read_only=True)
+    ranking_explanation = serializers.DictField(read_only=True)
+    
+    class Meta(JobApplicationSerializer.Meta):
+        fields = JobApplicationSerializer.Meta.fields + ['ranking_score', 'ranking_explanation']
+
 class ApplyToJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = JobApplication
@@ -93,10 +163,12 @@ class ApplyToJobSerializer(serializers.ModelSerializer):
         return value
 
 class JobReviewSerializer(serializers.ModelSerializer):
+    """Legacy rating and comment shape of a review, stored as a reviews.Review"""
+    comment = serializers.CharField(source='content')
     reviewer_name = serializers.SerializerMethodField()
     
     class Meta:
-        model = JobReview
+        model = Review
         fields = ['id', 'rating', 'comment', 'reviewer_name', 'created_at']
         read_only_fields = ['created_at']
     
@@ -113,3 +185,64 @@ class JobMessageSerializer(serializers.ModelSerializer):
     
     def get_sender_name(self, obj):
         return f"{obj.sender.first_name} {obj.sender.last_name}".strip()
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    
+    class Meta:
+        model = SavedSearch
+        fields = [
+            'id', 'name', 'category', 'category_name', 'keywords', 'min_budget',
+            'latitude', 'longitude', 'radius_km', 'is_active', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['created_at', 'updated_at']
+    
+    def validate(self, data):
+        area = [
+            data.get(field, getattr(self.instance, field, None))
+            for field in ('latitude', 'longitude', 'radius_km')
+        ]
+        if any(value is not None for value in area) and None in area:
+            raise serializers.ValidationError("Latitude, longitude and radius must be provided together.")
+        if area[2] is not None and area[2] <= 0:
+            raise serializers.ValidationError("Radius must be greater than 0.")
+        return data
+
+
+class SimilarJobSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(source='similar.id', read_only=True)
+    title = serializers.CharField(source='similar.title', read_only=True)
+    category_name = serializers.CharField(source='similar.category.name', read_only=True)
+    budget_min = serializers.DecimalField(source='similar.budget_min', max_digits=10, decimal_places=2, read_only=True)
+    budget_max = serializers.DecimalField(source='similar.budget_max', max_digits=10, decimal_places=2, read_only=True)
+    location = serializers.CharField(source='similar.location', read_only=True)
+    
+    class Meta:
+        model = SimilarJob
+        fields = ['id', 'title', 'category_name', 'budget_min', 'budget_max', 'location', 'score']
+
+class ArchivedJobSerializer(serializers.ModelSerializer):
+    """Read-only view of an archived job, shaped like JobSerializer"""
+    posted_by_name = serializers.SerializerMethodField()
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    assigned_provider_name = serializers.CharField(source='assigned_to.business_name', read_only=True, default=None)
+    application_count = serializers.SerializerMethodField()
+    duplicate_of = serializers.IntegerField(source='duplicate_of_id', read_only=True)
+    
+    class Meta:
+        model = ArchivedJob
+        fields = [
+            'id', 'title', 'description', 'category', 'category_name', 'posted_by',
+            'posted_by_name', 'assigned_to', 'assigned_provider_name',
+            'budget_min', 'budget_max', 'location', 'latitude', 'longitude',
+            'urgency', 'status', 'is_remote', 'skills_required', 'attachments', 'deadline',
+            'application_count', 'view_count', 'duplicate_of', 'archived_at', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+    
+    def get_posted_by_name(self, obj):
+        return f"{obj.posted_by.first_name} {obj.posted_by.last_name}".strip()
+    
+    def get_application_count(self, obj):
+        return ArchivedJobApplication.objects.filter(job_id=obj.id).count()
@@ -0,0 +1,590 @@
+import re
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from apps.notifications.services import NotificationService
+from apps.providers.areas import covering_provider_ids
+from apps.providers.models import ServiceArea
+from . import minhash, similarity
+from .models import (
+    CategoryBidStats, Job, JobBidStats, JobCategory, JobApplication, JobFingerprint,
+    JobFingerprintBand, JobMessage, JobMessageCounter, SavedSearch
+)
+from .utils import haversine_km
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobService:
+    """Service to handle job state transitions"""
+
+    @staticmethod
+    def accept_application(application_id, owner):
+        """
+        Accept an application and assign its job in a single transaction
+
+        The application row is locked with select_for_update so it cannot be
+        withdrawn underneath us, and the job is claimed with a conditional
+        UPDATE ... WHERE status='open'. Only one concurrent caller can match
+        that row, so only one application per job can ever be accepted.
+
+        Args:
+            application_id: id of the JobApplication to accept
+            owner: User who posted the job
+
+        Returns:
+            The accepted JobApplication, or None if the job was no longer open
+
+        Raises:
+            JobApplication.DoesNotExist: if no pending application matches
+        """
+        now = timezone.now()
+
+        with transaction.atomic():
+            application = JobApplication.objects.select_for_update(of=('self',)).select_related(
+                'job', 'job__category', 'provider', 'provider__user'
+            ).get(
+                id=application_id,
+                job__posted_by=owner,
+                status='pending'
+            )
+
+            claimed = Job.objects.filter(
+                id=application.job_id,
+                status='open'
+            ).update(
+                status='in_progress',
+                assigned_to=application.provider_id,
+                updated_at=now
+            )
+            if not claimed:
+                return None
+
+            JobApplication.objects.filter(id=application.id).update(
+                status='accepted',
+                updated_at=now
+            )
+
+            # Reject other pending applications
+            JobApplication.objects.filter(
+                job_id=application.job_id,
+                status='pending'
+            ).exclude(id=application.id).update(status='rejected', updated_at=now)
+
+            JobCategory.adjust_open_job_count(application.job.category.path, -1)
+
+            application.status = 'accepted'
+            application.updated_at = now
+            application.remember_stored_values()
+            application.job.status = 'in_progress'
+            application.job.assigned_to = application.provider
+            application.job.updated_at = now
+            application.job.remember_stored_values()
+
+            # Bulk updates skip post_save, so run its side effects explicitly
+            transaction.on_commit(
+                lambda: JobService._notify_application_accepted(application)
+            )
+            transaction.on_commit(lambda: similarity.drop_job(application.job_id))
+
+        return application
+
+    @staticmethod
+    def bulk_create_jobs(posted_by, items):
+        """
+        Create many open jobs for one customer with a fixed number of queries
+
+        Rows are inserted with a single bulk_create, which skips post_save, so
+        the work the Job signals and JobCreateSerializer.create would do per
+        job is done here once for the whole batch: duplicate flagging, one
+        category count UPDATE per category, and one post-commit pass that
+        notifies matching saved searches.
+
+        Args:
+            posted_by: User posting the jobs
+            items: list of validated JobCreateSerializer data
+
+        Returns:
+            The created jobs, in the order of items
+        """
+        jobs = [Job(posted_by=posted_by, status='open', **item) for item in items]
+        with transaction.atomic():
+            Job.objects.bulk_create(jobs)
+            for job in jobs:
+                job.remember_stored_values()
+
+            DuplicateJobService.check_jobs(jobs)
+
+            opened = Counter(job.category.path for job in jobs)
+            for path, count in opened.items():
+                JobCategory.adjust_open_job_count(path, count)
+
+            transaction.on_commit(lambda: JobService._notify_new_jobs(jobs))
+        return jobs
+
+    @staticmethod
+    def _notify_new_jobs(jobs):
+        for job in jobs:
+            try:
+                SavedSearchService.notify_matches(job)
+            except Exception as e:
+                logger.error(f"Error notifying saved searches for job {job.id}: {e}")
+
+    @staticmethod
+    def _notify_application_accepted(application):
+        """Tell the provider their application was accepted"""
+        provider_user = application.provider.user
+        NotificationService.create_notification(
+            recipient=provider_user,
+            notification_type='application_response',
+            context_data={
+                'user_name': provider_user.get_full_name or provider_user.email,
+                'job_title': application.job.title,
+                'status': application.status,
+            },
+            related_job=application.job,
+            priority='high',
+            action_url=f'/jobs/{application.job_id}/'
+        )
+
+
+_KEYWORD_RE = re.compile(r'[a-z0-9]+')
+
+def _keyword_set(text):
+    """Lowercase words of a text, so keywords match whole words only"""
+    return set(_KEYWORD_RE.findall(text.lower()))
+
+class SavedSearchService:
+    """
+    Match new jobs against providers' saved searches, percolator style
+
+    Instead of re-running every saved search when a job is posted, the job is
+    run against the saved-search table: category, budget and bounding-box
+    predicates are indexed columns, so one query narrows the candidates and
+    only keywords and the exact radius are checked in Python.
+
+    A search without an area of its own covers the provider's service areas
+    if they have any, found for the job's location through the service area
+    grid index.
+    """
+
+    NOTIFY_BATCH_SIZE = 500
+
+    @staticmethod
+    def candidate_searches(job):
+        """Saved searches whose indexed predicates accept the job"""
+        # A search on a category also covers the jobs posted in its subcategories
+        searches = SavedSearch.objects.filter(
+            is_active=True,
+            provider__status='approved'
+        ).filter(
+            Q(category__isnull=True) |
+            Q(category__path__in=JobCategory.ancestor_paths(job.category.path))
+        ).filter(
+            Q(min_budget__isnull=True) | Q(min_budget__lte=job.budget_max)
+        ).exclude(provider__user_id=job.posted_by_id)
+
+        # Remote jobs match any area; otherwise the job must fall in the box
+        if not job.is_remote:
+            area = Q(min_latitude__isnull=True)
+            if job.latitude is not None and job.longitude is not None:
+                area |= Q(
+                    min_latitude__lte=job.latitude,
+                    max_latitude__gte=job.latitude,
+                    min_longitude__lte=job.longitude,
+                    max_longitude__gte=job.longitude
+                )
+            searches = searches.filter(area)
+
+        return searches.annotate(
+            provider_has_areas=Exists(ServiceArea.objects.filter(provider=OuterRef('provider'), is_active=True))
+        ).select_related('provider__user')
+
+    @staticmethod
+    def search_matches(search, job, job_words, covering_providers=None):
+        """Check the predicates the index cannot answer, `job_words` being the job's _keyword_set"""
+        if search.keywords and not _keyword_set(search.keywords) <= job_words:
+            return False
+        if (
+            covering_providers is not None and not search.has_area and
+            search.provider_has_areas and search.provider_id not in covering_providers
+        ):
+            return False
+        if search.has_area and not job.is_remote:
+            distance = haversine_km(
+                float(search.latitude), float(search.longitude),
+                float(job.latitude), float(job.longitude)
+            )
+            if distance > float(search.radius_km):
+                return False
+        return True
+
+    @staticmethod
+    def match_job(job):
+        """Return the saved searches that match a job, at most one per provider"""
+        job_words = _keyword_set(' '.join(
+            [job.title, job.description] + [str(skill) for skill in job.skills_required or []]
+        ))
+
+        covering_providers = None
+        if not job.is_remote and job.latitude is not None and job.longitude is not None:
+            covering_providers = covering_provider_ids(float(job.latitude), float(job.longitude))
+
+        matches = {}
+        for search in SavedSearchService.candidate_searches(job).iterator(chunk_size=2000):
+            if search.provider_id in matches:
+                continue
+            if SavedSearchService.search_matches(search, job, job_words, covering_providers):
+                matches[search.provider_id] = search
+        return list(matches.values())
+
+    @staticmethod
+    def notify_matches(job):
+        """Alert providers whose saved searches match a newly posted job"""
+        if job.duplicate_of_id:
+            return 0
+        matches = SavedSearchService.match_job(job)
+        context_data = {
+            'job_title': job.title,
+            'location': job.location,
+            'budget_min': str(job.budget_min),
+            'budget_max': str(job.budget_max),
+        }
+
+        batch_size = SavedSearchService.NOTIFY_BATCH_SIZE
+        for start in range(0, len(matches), batch_size):
+            batch = matches[start:start + batch_size]
+            NotificationService.create_bulk_notifications(
+                recipients=[search.provider.user for search in batch],
+                notification_type='new_job_match',
+                context_data=context_data,
+                recipient_context={
+                    search.provider.user_id: {'search_name': search.name}
+                    for search in batch
+                },
+                related_job=job,
+                priority='medium',
+                action_url=f'/jobs/{job.id}/'
+            )
+        return len(matches)
+
+
+class DuplicateJobService:
+    """
+    Detect near-duplicate job posts with MinHash signatures and an LSH index
+
+    Every new job's title and description are fingerprinted and its band keys
+    stored in an indexed table. A new job only has to be compared with jobs
+    sharing at least one band key, so the check costs one signature, one
+    indexed lookup and a handful of comparisons however many jobs are open.
+    """
+
+    SIMILARITY_THRESHOLD = 0.7
+    WINDOW_DAYS = 30
+
+    @staticmethod
+    def job_signature(job):
+        return minhash.signature(f"{job.title} {job.description}")
+
+    @staticmethod
+    def find_duplicate(job, signature):
+        """
+        Return (job_id, similarity) of the most similar recent open job by the
+        same customer, or None if nothing reaches SIMILARITY_THRESHOLD
+        """
+        cutoff = timezone.now() - timedelta(days=DuplicateJobService.WINDOW_DAYS)
+        candidate_ids = JobFingerprintBand.objects.filter(
+            key__in=minhash.band_keys(signature),
+            fingerprint__job__posted_by_id=job.posted_by_id,
+            fingerprint__job__status='open',
+            fingerprint__job__duplicate_of__isnull=True,
+            fingerprint__job__created_at__gte=cutoff
+        ).exclude(fingerprint_id=job.pk).values_list('fingerprint_id', flat=True).distinct()
+
+        best = None
+        for fingerprint in JobFingerprint.objects.filter(pk__in=list(candidate_ids)):
+            score = minhash.similarity(signature, fingerprint.signature)
+            if score >= DuplicateJobService.SIMILARITY_THRESHOLD and (best is None or score > best[1]):
+                best = (fingerprint.job_id, score)
+        return best
+
+    @staticmethod
+    def index_job(job, signature):
+        """Store a job's fingerprint and LSH band keys"""
+        fingerprint = JobFingerprint.objects.create(job=job, signature=signature)
+        JobFingerprintBand.objects.bulk_create([
+            JobFingerprintBand(fingerprint=fingerprint, key=key)
+            for key in minhash.band_keys(signature)
+        ])
+
+    @staticmethod
+    def check_job(job):
+        """
+        Fingerprint a newly created job and flag it when it nearly duplicates
+        one of the customer's earlier open posts. Flagged jobs are hidden from
+        the open job list and do not trigger saved-search alerts.
+        """
+        signature = DuplicateJobService.job_signature(job)
+        duplicate = DuplicateJobService.find_duplicate(job, signature)
+        if duplicate:
+            Job.objects.filter(pk=job.pk).update(duplicate_of_id=duplicate[0])
+            job.duplicate_of_id = duplicate[0]
+        else:
+            # Only originals are indexed, duplicates point at their original
+            DuplicateJobService.index_job(job, signature)
+        return duplicate
+
+    @staticmethod
+    def check_jobs(jobs):
+        """
+        check_job for a batch of new jobs by one customer in a fixed number
+        of queries, returning {job_id: (duplicate_of_id, similarity)}
+
+        Jobs are only compared with earlier posts, not with each other: a
+        bulk post is expected to hold similar jobs, e.g. one per unit.
+        """
+        if not jobs:
+            return {}
+        signatures = {job.pk: DuplicateJobService.job_signature(job) for job in jobs}
+        keys = {job_id: minhash.band_keys(signature) for job_id, signature in signatures.items()}
+
+        cutoff = timezone.now() - timedelta(days=DuplicateJobService.WINDOW_DAYS)
+        candidates_by_key = defaultdict(set)
+        for key, fingerprint_id in JobFingerprintBand.objects.filter(
+            key__in={key for job_keys in keys.values() for key in job_keys},
+            fingerprint__job__posted_by_id=jobs[0].posted_by_id,
+            fingerprint__job__status='open',
+            fingerprint__job__duplicate_of__isnull=True,
+            fingerprint__job__created_at__gte=cutoff
+        ).exclude(fingerprint_id__in=list(signatures)).values_list('key', 'fingerprint_id'):
+            candidates_by_key[key].add(fingerprint_id)
+
+        candidate_ids = set().union(*candidates_by_key.values())
+        stored = dict(JobFingerprint.objects.filter(pk__in=candidate_ids).values_list('job_id', 'signature'))
+
+        duplicates = {}
+        for job in jobs:
+            best = None
+            for candidate_id in set().union(*(candidates_by_key[key] for key in keys[job.pk])):
+                score = minhash.similarity(signatures[job.pk], stored[candidate_id])
+                if score >= DuplicateJobService.SIMILARITY_THRESHOLD and (best is None or score > best[1]):
+                    best = (candidate_id, score)
+            if best:
+                duplicates[job.pk] = best
+                job.duplicate_of_id = best[0]
+
+        by_original = defaultdict(list)
+        for job_id, (original_id, _) in duplicates.items():
+            by_original[original_id].append(job_id)
+        for original_id, job_ids in by_original.items():
+            Job.objects.filter(pk__in=job_ids).update(duplicate_of_id=original_id)
+
+        originals = [job_id for job_id in signatures if job_id not in duplicates]
+        JobFingerprint.objects.bulk_create([
+            JobFingerprint(job_id=job_id, signature=signatures[job_id]) for job_id in originals
+        ])
+        JobFingerprintBand.objects.bulk_create([
+            JobFingerprintBand(fingerprint_id=job_id, key=key)
+            for job_id in originals for key in keys[job_id]
+        ])
+        return duplicates
+
+class JobMessageService:
+    """
+    Conversation between a job's owner and its assigned provider
+
+    History is read as ranges of the (job, created_at) index: the latest
+    page, the page before a message, or everything after a message for
+    incremental sync. Unread counts live in JobMessageCounter rows that are
+    bumped on send and decremented by the number of messages marked read.
+    """
+
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 200
+    POLL_INTERVAL = 1.0
+
+    @staticmethod
+    def participant_ids(job):
+        """Users allowed in the job's conversation, job.assigned_to must be loaded"""
+        ids = {job.posted_by_id}
+        if job.assigned_to_id:
+            ids.add(job.assigned_to.user_id)
+        return ids
+
+    @staticmethod
+    def _anchor(job, message_id):
+        """created_at of a message in the job, so paging can range scan the index"""
+        return JobMessage.objects.filter(job=job, id=message_id).values_list('created_at', flat=True).first()
+
+    @staticmethod
+    def get_messages(job, after=None, before=None, limit=PAGE_SIZE):
+        """
+        A page of the job's messages in chronological order
+
+        Args:
+            after: only messages newer than this message id (incremental sync)
+            before: only messages older than this message id (scrollback)
+            limit: maximum number of messages returned
+        """
+        limit = max(1, min(limit, JobMessageService.MAX_PAGE_SIZE))
+        messages = JobMessage.objects.filter(job=job).select_related('sender')
+
+        if after is not None:
+            anchor = JobMessageService._anchor(job, after)
+            if anchor is not None:
+                messages = messages.filter(created_at__gte=anchor)
+            return list(messages.filter(id__gt=after).order_by('created_at', 'id')[:limit])
+
+        if before is not None:
+            anchor = JobMessageService._anchor(job, before)
+            if anchor is not None:
+                messages = messages.filter(created_at__lte=anchor)
+            messages = messages.filter(id__lt=before)
+
+        page = list(messages.order_by('-created_at', '-id')[:limit])
+        page.reverse()
+        return page
+
+    @staticmethod
+    def wait_for_messages(job, after, timeout, limit=PAGE_SIZE):
+        """
+        Long-poll: return messages newer than `after` as soon as there are
+        any, or an empty list once `timeout` seconds have passed
+
+        Each check is a single indexed EXISTS query. The request holds a
+        worker for the whole wait, so timeout is capped by
+        JOB_MESSAGE_LONG_POLL_TIMEOUT.
+        """
+        deadline = time.monotonic() + min(timeout, settings.JOB_MESSAGE_LONG_POLL_TIMEOUT)
+        pending = JobMessage.objects.filter(job=job, id__gt=after)
+        while not pending.exists():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return []
+            time.sleep(min(JobMessageService.POLL_INTERVAL, remaining))
+        return JobMessageService.get_messages(job, after=after, limit=limit)
+
+    @staticmethod
+    def send_message(job, sender, text):
+        """Store a message and bump the unread counters of the other participants"""
+        with transaction.atomic():
+            message = JobMessage.objects.create(job=job, sender=sender, message=text)
+            for user_id in JobMessageService.participant_ids(job) - {sender.id}:
+                JobMessageCounter.objects.get_or_create(job=job, user_id=user_id)
+                JobMessageCounter.objects.filter(job=job, user_id=user_id).update(
+                    unread_count=F('unread_count') + 1,
+                    updated_at=timezone.now()
+                )
+        return message
+
+    @staticmethod
+    def mark_read(job, user, up_to=None):
+        """
+        Mark every message to `user` up to and including message id `up_to`
+        (all if None) as read with one UPDATE, returning how many changed
+        """
+        with transaction.atomic():
+            unread = JobMessage.objects.filter(job=job, is_read=False).exclude(sender=user)
+            if up_to is not None:
+                unread = unread.filter(id__lte=up_to)
+            else:
+                up_to = JobMessage.objects.filter(job=job).order_by('-id').values_list('id', flat=True).first()
+            marked = unread.update(is_read=True)
+
+            JobMessageCounter.objects.get_or_create(job=job, user=user)
+            JobMessageCounter.objects.filter(job=job, user=user).update(
+                unread_count=Greatest(F('unread_count') - marked, 0),
+                last_read_message_id=Greatest(Coalesce(F('last_read_message_id'), Value(0)), Value(up_to or 0)),
+                updated_at=timezone.now()
+            )
+        return marked
+
+    @staticmethod
+    def unread_count(job, user):
+        return JobMessageCounter.objects.filter(job=job, user=user).values_list('unread_count', flat=True).first() or 0
+
+class BidStatsService:
+    """Keep per-job bid statistics in step with applications and roll them up per category"""
+
+    @staticmethod
+    def _cents(amount):
+        return int((Decimal(amount) * 100).to_integral_value())
+
+    @staticmethod
+    def _amount(cents):
+        return (Decimal(float(cents)) / 100).quantize(Decimal('0.01'))
+
+    @staticmethod
+    def add_bid(job_id, amount):
+        """Add one bid to a job's statistics under a row lock"""
+        with transaction.atomic():
+            JobBidStats.objects.get_or_create(job_id=job_id)
+            stats = JobBidStats.objects.select_for_update().get(job_id=job_id)
+            insort(stats.bids, BidStatsService._cents(amount))
+            stats.bid_count += 1
+            stats.bid_sum += Decimal(amount)
+            stats.save()
+
+    @staticmethod
+    def remove_bid(job_id, amount):
+        """Remove one bid from the statistics of a job that is still open"""
+        with transaction.atomic():
+            stats = JobBidStats.objects.select_for_update().filter(job_id=job_id, job__status='open').first()
+            if stats is None:
+                return
+            cents = BidStatsService._cents(amount)
+            index = bisect_left(stats.bids, cents)
+            if index == len(stats.bids) or stats.bids[index] != cents:
+                return
+            del stats.bids[index]
+            stats.bid_count -= 1
+            stats.bid_sum -= Decimal(amount)
+            stats.save()
+
+    @staticmethod
+    def refresh_category_stats():
+        """
+        Recompute CategoryBidStats from the per-job statistics, rolling every
+        job up into its category and the category's ancestors. Returns the
+        number of categories with bids.
+        """
+        paths = dict(JobCategory.objects.values_list('id', 'path'))
+        ids_by_path = {path: category_id for category_id, path in paths.items()}
+
+        bids = defaultdict(list)
+        job_counts = Counter()
+        job_bids = JobBidStats.objects.filter(bid_count__gt=0).values_list('job__category_id', 'bids')
+        for category_id, job_bid_list in job_bids.iterator(chunk_size=2000):
+            for path in JobCategory.ancestor_paths(paths.get(category_id, '')):
+                if path in ids_by_path:
+                    bids[ids_by_path[path]].extend(job_bid_list)
+                    job_counts[ids_by_path[path]] += 1
+
+        rows = []
+        for category_id, values in bids.items():
+            array = np.array(values, dtype=np.int64)
+            rows.append(CategoryBidStats(
+                category_id=category_id,
+                job_count=job_counts[category_id],
+                bid_count=len(array),
+                min_bid=BidStatsService._amount(array.min()),
+                median_bid=BidStatsService._amount(np.median(array)),
+                max_bid=BidStatsService._amount(array.max()),
+                average_bid=BidStatsService._amount(array.mean())
+            ))
+
+        with transaction.atomic():
+            CategoryBidStats.objects.all().delete()
+            CategoryBidStats.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
@@ -0,0 +1,50 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Job, JobApplication, JobCategory
+from .services import BidStatsService
+from .similarity import drop_job
+
+@receiver(post_save, sender=Job)
+def drop_closed_job_from_similar(sender, instance, created, **kwargs):
+    """Remove jobs that are no longer open from the similar jobs table"""
+    if not created and instance.status != 'open':
+        drop_job(instance.pk)
+
+@receiver(post_save, sender=Job)
+def update_category_open_job_count(sender, instance, created, **kwargs):
+    """Roll open job counts up the category tree when a job opens or closes"""
+    was_open = not created and getattr(instance, '_original_status', None) == 'open'
+    is_open = instance.status == 'open'
+    if was_open != is_open:
+        JobCategory.adjust_open_job_count(instance.category.path, 1 if is_open else -1)
+
+@receiver(post_delete, sender=Job)
+def release_category_open_job_count(sender, instance, **kwargs):
+    """Deleting an open job removes it from the category counts"""
+    if getattr(instance, '_original_status', instance.status) == 'open':
+        JobCategory.adjust_open_job_count(
+            JobCategory.objects.filter(pk=instance.category_id).values_list('path', flat=True).first() or '',
+            -1
+        )
+
+@receiver(post_save, sender=JobApplication)
+def update_job_bid_stats(sender, instance, created, **kwargs):
+    """Add new bids to the job's statistics and drop withdrawn or changed ones"""
+    if created:
+        if instance.status != 'withdrawn':
+            BidStatsService.add_bid(instance.job_id, instance.bid_amount)
+    elif instance.original_values() is not None:
+        was_counted = instance._original_status != 'withdrawn'
+        is_counted = instance.status != 'withdrawn'
+        changed = instance._original_bid_amount != instance.bid_amount
+        if was_counted and (not is_counted or changed):
+            BidStatsService.remove_bid(instance.job_id, instance._original_bid_amount)
+        if is_counted and (not was_counted or changed):
+            BidStatsService.add_bid(instance.job_id, instance.bid_amount)
+
+@receiver(post_delete, sender=JobApplication)
+def remove_deleted_bid(sender, instance, **kwargs):
+    """Deleting a bid of an open job removes it from the job's statistics"""
+    if getattr(instance, '_original_status', instance.status) != 'withdrawn':
+        BidStatsService.remove_bid(instance.job_id, getattr(instance, '_original_bid_amount', instance.bid_amount))
@@ -0,0 +1,182 @@
+"""
+Offline "similar jobs" pipeline.
+
+Open jobs' title, description and skills are vectorised with TF-IDF into a
+SciPy sparse matrix with L2-normalised rows, so a sparse product gives
+cosine similarities. The top-k neighbours of every job are written to the
+SimilarJob table, which JobDetailView reads with one indexed lookup.
+
+The full rebuild recomputes every list. The incremental update only scores
+jobs that have opened since the last run and merges them into the lists of
+the jobs they are similar to; closed jobs are dropped by the post_save
+handler as soon as they leave the open state.
+"""
+import logging
+import re
+from collections import defaultdict
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+
+from .models import Job, SimilarJob
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 10
+CHUNK_SIZE = 1000
+
+_WORD_RE = re.compile(r'[a-z][a-z0-9]+')
+_STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its my need needs of on or our
+    please so that the their there this to was we will with you your
+""".split())
+
+
+def tokenize(text):
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in _STOP_WORDS]
+
+
+def job_document(title, description, skills):
+    return ' '.join([title, description] + [str(skill) for skill in skills or []])
+
+
+def tfidf_matrix(documents):
+    """L2-normalised TF-IDF CSR matrix with one row per document"""
+    vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for document in documents:
+        row = defaultdict(int)
+        for token in tokenize(document):
+            row[vocabulary.setdefault(token, len(vocabulary))] += 1
+        indices.extend(row.keys())
+        counts.extend(row.values())
+        indptr.append(len(indices))
+
+    matrix = sparse.csr_matrix(
+        (np.array(counts, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr)),
+        shape=(len(documents), max(len(vocabulary), 1))
+    )
+    # Sublinear term frequency and smoothed inverse document frequency
+    matrix.data = 1.0 + np.log(matrix.data)
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1.0 + len(documents)) / (1.0 + document_frequency)) + 1.0
+    matrix = matrix @ sparse.diags(idf)
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.csr_matrix(sparse.diags(1.0 / norms) @ matrix)
+
+
+def top_k_rows(similarities, row_ids, column_ids, k, exclude_self=True):
+    """
+    Yield (job_id, [(similar_id, score), ...]) best first for each row of a
+    sparse similarity matrix
+    """
+    similarities = sparse.csr_matrix(similarities)
+    for row, job_id in enumerate(row_ids):
+        start, end = similarities.indptr[row], similarities.indptr[row + 1]
+        columns = similarities.indices[start:end]
+        scores = similarities.data[start:end]
+        if exclude_self:
+            keep = column_ids[columns] != job_id
+            columns, scores = columns[keep], scores[keep]
+        if len(scores) > k:
+            best = np.argpartition(-scores, k)[:k]
+            columns, scores = columns[best], scores[best]
+        order = np.argsort(-scores, kind='stable')
+        yield job_id, [(int(column_ids[columns[i]]), float(scores[i])) for i in order if scores[i] > 0]
+
+
+def _load_open_jobs():
+    rows = list(
+        Job.objects.filter(status='open', duplicate_of__isnull=True)
+        .order_by('id')
+        .values_list('id', 'title', 'description', 'skills_required')
+    )
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    documents = [job_document(*row[1:]) for row in rows]
+    return ids, documents
+
+
+def _neighbour_rows(job_id, neighbours):
+    return [
+        SimilarJob(job_id=job_id, similar_id=similar_id, rank=rank, score=round(score, 6))
+        for rank, (similar_id, score) in enumerate(neighbours, start=1)
+    ]
+
+
+def rebuild_similar_jobs(k=DEFAULT_TOP_K):
+    """Recompute the neighbour lists of every open job, returning the job count"""
+    ids, documents = _load_open_jobs()
+    rows = []
+    if len(ids):
+        matrix = tfidf_matrix(documents)
+        transposed = matrix.T.tocsr()
+        for start in range(0, len(ids), CHUNK_SIZE):
+            chunk = matrix[start:start + CHUNK_SIZE] @ transposed
+            for job_id, neighbours in top_k_rows(chunk, ids[start:start + CHUNK_SIZE], ids, k):
+                rows.extend(_neighbour_rows(job_id, neighbours))
+
+    with transaction.atomic():
+        SimilarJob.objects.all().delete()
+        SimilarJob.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+    return len(ids)
+
+
+def update_similar_jobs(k=DEFAULT_TOP_K):
+    """
+    Score jobs opened since the last run and merge them into existing
+    neighbour lists, returning the number of jobs scored. Open jobs with no
+    neighbours yet are rescored too, so they pick up later similar posts.
+    """
+    ids, documents = _load_open_jobs()
+    if not len(ids):
+        SimilarJob.objects.all().delete()
+        return 0
+
+    open_ids = set(ids.tolist())
+    indexed = set(SimilarJob.objects.values_list('job_id', flat=True).distinct())
+    new_positions = np.array([i for i, job_id in enumerate(ids) if job_id not in indexed], dtype=np.int64)
+    if not len(new_positions):
+        return 0
+
+    matrix = tfidf_matrix(documents)
+    new_ids = ids[new_positions]
+    new_rows = []
+    # Existing job -> [(new similar id, score)] candidates to merge into its list
+    candidates = defaultdict(list)
+    for start in range(0, len(new_positions), CHUNK_SIZE):
+        positions = new_positions[start:start + CHUNK_SIZE]
+        chunk = matrix[positions] @ matrix.T
+        for job_id, neighbours in top_k_rows(chunk, ids[positions], ids, k):
+            new_rows.extend(_neighbour_rows(job_id, neighbours))
+            for similar_id, score in neighbours:
+                if similar_id in indexed:
+                    candidates[similar_id].append((job_id, score))
+
+    current = defaultdict(list)
+    for row in SimilarJob.objects.filter(job_id__in=list(candidates)).order_by('job_id', 'rank'):
+        if row.similar_id in open_ids:
+            current[row.job_id].append((row.similar_id, row.score))
+
+    merged_rows = []
+    for job_id, additions in candidates.items():
+        neighbours = sorted(current[job_id] + additions, key=lambda pair: -pair[1])[:k]
+        merged_rows.extend(_neighbour_rows(job_id, neighbours))
+
+    replaced = list(candidates) + new_ids.tolist()
+    with transaction.atomic():
+        SimilarJob.objects.exclude(job__status='open').delete()
+        for start in range(0, len(replaced), CHUNK_SIZE):
+            SimilarJob.objects.filter(job_id__in=replaced[start:start + CHUNK_SIZE]).delete()
+        SimilarJob.objects.bulk_create(new_rows + merged_rows, batch_size=CHUNK_SIZE)
+
+    logger.info(f"Scored {len(new_ids)} jobs, updated {len(candidates)} neighbour lists")
+    return len(new_ids)
+
+
+def drop_job(job_id):
+    """Remove a job that is no longer open from every neighbour list"""
+    SimilarJob.objects.filter(job_id=job_id).delete()
+    SimilarJob.objects.filter(similar_id=job_id).delete()
@@ -1,3 +1,706 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, OperationalError
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.providers.models import Provider, ServiceArea
+from apps.notifications.models import Notification
+from .models import Job, JobCategory, JobApplication, SavedSearch
+from .serializers import JobCreateSerializer
+from .services import JobService, SavedSearchService, DuplicateJobService, JobMessageService, BidStatsService
+from .counters import JobViewCounter
+from .models import JobBidStats, CategoryBidStats, SimilarJob, ArchivedJob, ArchivedJobApplication, ArchivedJobMessage, JobMessage
+from .archive import archive_finished_jobs
+from . import similarity
+
+User = get_user_model()
+
+
+def make_user(email):
+    return User.objects.create_user(
+        email=email, first_name='Test', last_name='User', password='pass1234'
+    )
+
+
+def make_provider(email):
+    return Provider.objects.create(
+        user=make_user(email),
+        business_name=email.split('@')[0],
+        status='approved',
+        is_verified=True
+    )
+
+
+def make_job(owner, category, **fields):
+    fields = {
+        'title': 'Fix a leaking tap',
+        'description': 'Kitchen tap drips constantly.',
+        'budget_min': Decimal('50.00'),
+        'budget_max': Decimal('150.00'),
+        'location': 'Nairobi',
+        **fields
+    }
+    return Job.objects.create(category=category, posted_by=owner, **fields)
+
+
+def make_applications(job, count):
+    return [
+        JobApplication.objects.create(
+            job=job,
+            provider=make_provider(f'provider{i}@example.com'),
+            bid_amount=Decimal('100.00') + i,
+            estimated_duration='2 hours',
+            cover_letter='I can do this.'
+        )
+        for i in range(count)
+    ]
+
+
+class AcceptApplicationTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.category = JobCategory.objects.create(name='Plumbing')
+        self.job = make_job(self.owner, self.category)
+        self.applications = make_applications(self.job, 3)
+
+    def test_accept_assigns_job_and_rejects_others(self):
+        winner = self.applications[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            accepted = JobService.accept_application(winner.id, self.owner)
+
+        self.assertEqual(accepted.id, winner.id)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'in_progress')
+        self.assertEqual(self.job.assigned_to_id, winner.provider_id)
+        statuses = dict(JobApplication.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[winner.id], 'accepted')
+        self.assertEqual(
+            sorted(statuses[a.id] for a in self.applications[1:]),
+            ['rejected', 'rejected']
+        )
+
+    def test_accept_on_closed_job_returns_none(self):
+        Job.objects.filter(id=self.job.id).update(status='cancelled')
+        self.assertIsNone(JobService.accept_application(self.applications[0].id, self.owner))
+        self.assertFalse(JobApplication.objects.filter(status='accepted').exists())
+
+    def test_only_owner_can_accept(self):
+        stranger = make_user('stranger@example.com')
+        with self.assertRaises(JobApplication.DoesNotExist):
+            JobService.accept_application(self.applications[0].id, stranger)
+
+
+class ConcurrentAcceptApplicationTests(TransactionTestCase):
+    workers = 8
+
+    def setUp(self):
+        # Views buffered by other tests would have the background flush compete for the SQLite lock
+        JobViewCounter.flush()
+
+    def test_parallel_accepts_have_exactly_one_winner(self):
+        owner = make_user('owner@example.com')
+        job = make_job(owner, JobCategory.objects.create(name='Plumbing'))
+        applications = make_applications(job, self.workers)
+
+        barrier = threading.Barrier(self.workers)
+        winners = []
+        lock = threading.Lock()
+
+        def accept(application_id):
+            try:
+                barrier.wait()
+                try:
+                    accepted = JobService.accept_application(application_id, owner)
+                except (JobApplication.DoesNotExist, OperationalError):
+                    # Lost the race: rejected by the winner, or locked out
+                    accepted = None
+                if accepted is not None:
+                    with lock:
+                        winners.append(accepted.id)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=accept, args=(application.id,))
+            for application in applications
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(winners), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'in_progress')
+        winner = JobApplication.objects.get(status='accepted')
+        self.assertEqual(winner.id, winners[0])
+        self.assertEqual(job.assigned_to_id, winner.provider_id)
+
+
+class SavedSearchMatchingTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.plumbing = JobCategory.objects.create(name='Plumbing')
+        self.electrical = JobCategory.objects.create(name='Electrical')
+        self.provider = make_provider('provider@example.com')
+        # Nairobi CBD
+        self.search = SavedSearch.objects.create(
+            provider=self.provider,
+            name='Plumbing near town',
+            category=self.plumbing,
+            keywords='tap',
+            min_budget=Decimal('100.00'),
+            latitude=Decimal('-1.286389'),
+            longitude=Decimal('36.817223'),
+            radius_km=Decimal('10')
+        )
+
+    def test_search_stores_bounding_box(self):
+        self.assertLess(self.search.min_latitude, -1.286389)
+        self.assertGreater(self.search.max_longitude, 36.817223)
+
+    def test_matching_job_is_found(self):
+        # Westlands, about 4km away
+        job = make_job(self.owner, self.plumbing, latitude=Decimal('-1.267'), longitude=Decimal('36.811'))
+        self.assertEqual(SavedSearchService.match_job(job), [self.search])
+
+    def test_non_matching_jobs_are_skipped(self):
+        far_away = make_job(self.owner, self.plumbing, latitude=Decimal('-4.043'), longitude=Decimal('39.668'))
+        wrong_category = make_job(self.owner, self.electrical, is_remote=True)
+        low_budget = make_job(self.owner, self.plumbing, is_remote=True, budget_max=Decimal('80.00'))
+        no_keyword = make_job(
+            self.owner, self.plumbing, is_remote=True,
+            title='Fix a shower', description='Shower head is broken.'
+        )
+        partial_word = make_job(
+            self.owner, self.plumbing, is_remote=True,
+            title='Hang a tapestry', description='Large tapestry for the hall.'
+        )
+        for job in (far_away, wrong_category, low_budget, no_keyword, partial_word):
+            self.assertEqual(SavedSearchService.match_job(job), [])
+
+    def test_subcategory_jobs_match_parent_category_searches(self):
+        leaks = JobCategory.objects.create(name='Leaks', parent=self.plumbing)
+        job = make_job(self.owner, leaks, latitude=Decimal('-1.267'), longitude=Decimal('36.811'))
+        self.assertEqual(SavedSearchService.match_job(job), [self.search])
+
+        # A search on the subcategory does not cover its parent
+        self.search.category = leaks
+        self.search.save()
+        job = make_job(self.owner, self.plumbing, latitude=Decimal('-1.267'), longitude=Decimal('36.811'))
+        self.assertEqual(SavedSearchService.match_job(job), [])
+
+    def test_searches_without_area_follow_service_areas(self):
+        self.search.latitude = self.search.longitude = self.search.radius_km = None
+        self.search.save()
+        ServiceArea.objects.create(
+            provider=self.provider, name='Nairobi', kind='circle',
+            latitude=Decimal('-1.286389'), longitude=Decimal('36.817223'), radius_km=Decimal('15')
+        )
+        inside = make_job(self.owner, self.plumbing, latitude=Decimal('-1.267'), longitude=Decimal('36.811'))
+        mombasa = make_job(self.owner, self.plumbing, latitude=Decimal('-4.043'), longitude=Decimal('39.668'))
+        remote = make_job(self.owner, self.plumbing, is_remote=True)
+        self.assertEqual(SavedSearchService.match_job(inside), [self.search])
+        self.assertEqual(SavedSearchService.match_job(mombasa), [])
+        self.assertEqual(SavedSearchService.match_job(remote), [self.search])
+
+    def test_new_job_notifies_matching_provider(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = make_job(self.owner, self.plumbing, is_remote=True)
+        notification = Notification.objects.get(type='new_job_match')
+        self.assertEqual(notification.recipient, self.provider.user)
+        self.assertEqual(notification.job, job)
+        self.assertEqual(notification.data['search_name'], 'Plumbing near town')
+
+
+class JobViewCounterTests(TestCase):
+    def setUp(self):
+        # Drop views buffered by other tests before their job ids are reused
+        JobViewCounter.flush()
+        owner = make_user('owner@example.com')
+        category = JobCategory.objects.create(name='Plumbing')
+        self.jobs = [make_job(owner, category) for _ in range(2)]
+
+    def test_flush_writes_aggregated_deltas_in_one_query(self):
+        for _ in range(3):
+            JobViewCounter.record(self.jobs[0].id)
+        JobViewCounter.record(self.jobs[1].id)
+        self.assertEqual(JobViewCounter.pending(self.jobs[0].id), 3)
+
+        with self.assertNumQueries(1):
+            JobViewCounter.flush()
+
+        self.assertEqual(JobViewCounter.pending(self.jobs[0].id), 0)
+        counts = dict(Job.objects.values_list('id', 'view_count'))
+        self.assertEqual(counts[self.jobs[0].id], 3)
+        self.assertEqual(counts[self.jobs[1].id], 1)
+
+    def test_idle_buffer_is_flushed_once_due(self):
+        JobViewCounter.record(self.jobs[0].id)
+        self.assertIsNotNone(JobViewCounter._flusher)
+        self.assertEqual(JobViewCounter.flush_if_due(), 0)
+
+        # As if the last flush was one interval ago and no view came since
+        JobViewCounter._last_flush -= settings.JOB_VIEW_FLUSH_INTERVAL
+        self.assertEqual(JobViewCounter.flush_if_due(), 1)
+        self.assertEqual(Job.objects.get(id=self.jobs[0].id).view_count, 1)
+
+
+class DuplicateJobTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.category = JobCategory.objects.create(name='Plumbing')
+
+    def create_job(self, owner, title, description):
+        serializer = JobCreateSerializer(data={
+            'title': title,
+            'description': description,
+            'category': self.category.id,
+            'budget_min': '50.00',
+            'budget_max': '150.00',
+            'location': 'Nairobi'
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.save(posted_by=owner)
+
+    def test_repost_is_flagged_as_duplicate(self):
+        original = self.create_job(
+            self.owner, 'Fix leaking kitchen tap',
+            'The kitchen tap has been dripping for a week and the washer probably needs replacing soon.'
+        )
+        repost = self.create_job(
+            self.owner, 'Fix leaking kitchen tap!',
+            'The kitchen tap has been dripping for a week and the washer probably needs replacing.'
+        )
+        self.assertIsNone(original.duplicate_of_id)
+        self.assertEqual(repost.duplicate_of_id, original.id)
+        self.assertEqual(Job.objects.get(id=repost.id).duplicate_of_id, original.id)
+
+    def test_different_jobs_and_customers_are_not_flagged(self):
+        description = 'The kitchen tap has been dripping for a week and the washer probably needs replacing.'
+        self.create_job(self.owner, 'Fix leaking kitchen tap', description)
+        other_customer = self.create_job(make_user('other@example.com'), 'Fix leaking kitchen tap', description)
+        different = self.create_job(
+            self.owner, 'Install ceiling fan',
+            'Need a new ceiling fan wired into the living room with a wall switch.'
+        )
+        self.assertIsNone(other_customer.duplicate_of_id)
+        self.assertIsNone(different.duplicate_of_id)
+
+
+class RankedApplicationsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.job = make_job(self.owner, JobCategory.objects.create(name='Plumbing'))
+        self.applications = make_applications(self.job, 3)
+        Provider.objects.filter(id=self.applications[2].provider_id).update(rating=Decimal('5.00'), total_reviews=40)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = reverse('job-applications', args=[self.job.id])
+
+    def test_rank_best_orders_by_score_with_explanations(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'rank': 'best'})
+        self.assertEqual(response.status_code, 200)
+        scores = [item['ranking_score'] for item in response.data]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(response.data[0]['id'], self.applications[2].id)
+        explanation = response.data[0]['ranking_explanation']
+        self.assertAlmostEqual(
+            sum(factor['contribution'] for factor in explanation.values()),
+            response.data[0]['ranking_score'], places=3
+        )
+
+    def test_weight_override_changes_order(self):
+        response = self.client.get(self.url, {
+            'rank': 'best', 'weight_bid': 1, 'weight_rating': 0, 'weight_reviews': 0,
+            'weight_distance': 0, 'weight_history': 0
+        })
+        # Cheapest bid wins when only the bid counts
+        self.assertEqual(response.data[0]['id'], self.applications[0].id)
+
+    def test_non_finite_weights_are_rejected(self):
+        for value in ('nan', 'inf', '-inf'):
+            response = self.client.get(self.url, {'rank': 'best', 'weight_bid': value})
+            self.assertEqual(response.status_code, 400)
+
+
+class SimilarJobsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        category = JobCategory.objects.create(name='Plumbing')
+        self.tap = make_job(self.owner, category, title='Fix leaking kitchen tap', description='Tap drips, washer worn.')
+        self.sink = make_job(self.owner, category, title='Kitchen sink tap replacement', description='Replace old mixer tap.')
+        self.fan = make_job(self.owner, category, title='Install ceiling fan', description='Wire a fan in the bedroom.')
+        self.category = category
+
+    def neighbours(self, job):
+        return list(SimilarJob.objects.filter(job=job).order_by('rank').values_list('similar_id', flat=True))
+
+    def test_rebuild_ranks_most_similar_first(self):
+        self.assertEqual(similarity.rebuild_similar_jobs(k=2), 3)
+        self.assertEqual(self.neighbours(self.tap)[0], self.sink.id)
+
+    def test_incremental_update_merges_new_jobs(self):
+        similarity.rebuild_similar_jobs(k=2)
+        new_tap = make_job(
+            self.owner, self.category,
+            title='Leaking kitchen tap', description='Kitchen tap drips, washer worn out.'
+        )
+        similarity.update_similar_jobs(k=2)
+        self.assertEqual(self.neighbours(new_tap)[0], self.tap.id)
+        self.assertEqual(self.neighbours(self.tap)[0], new_tap.id)
+
+    def test_closed_jobs_are_dropped_and_detail_serves_neighbours(self):
+        similarity.rebuild_similar_jobs(k=2)
+        self.sink.status = 'cancelled'
+        self.sink.save()
+        self.assertNotIn(self.sink.id, self.neighbours(self.tap))
+        response = APIClient().get(reverse('job-detail', args=[self.tap.id]))
+        self.assertEqual(
+            [job['id'] for job in response.data['similar_jobs']],
+            self.neighbours(self.tap)
+        )
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.home = JobCategory.objects.create(name='Home repair')
+        self.plumbing = JobCategory.objects.create(name='Plumbing', parent=self.home)
+        self.leaks = JobCategory.objects.create(name='Leaks', parent=self.plumbing)
+        self.garden = JobCategory.objects.create(name='Garden')
+
+    def counts(self):
+        return dict(JobCategory.objects.values_list('name', 'open_job_count'))
+
+    def test_paths_nest_under_parents(self):
+        self.assertTrue(self.leaks.path.startswith(self.plumbing.path))
+        self.assertTrue(self.plumbing.path.startswith(self.home.path))
+        self.assertEqual(self.leaks.depth, 2)
+
+    def test_open_job_counts_roll_up_and_down(self):
+        job = make_job(self.owner, self.leaks)
+        make_job(self.owner, self.plumbing)
+        self.assertEqual(self.counts(), {'Home repair': 2, 'Plumbing': 2, 'Leaks': 1, 'Garden': 0})
+
+        job.status = 'cancelled'
+        job.save()
+        self.assertEqual(self.counts()['Home repair'], 1)
+        self.assertEqual(self.counts()['Leaks'], 0)
+
+    def test_reloaded_jobs_only_count_real_status_changes(self):
+        job = Job.objects.get(pk=make_job(self.owner, self.leaks, status='completed').pk)
+        self.assertEqual(job._original_status, 'completed')
+        job.title = 'Fix a dripping tap'
+        job.save()
+        self.assertEqual(self.counts()['Leaks'], 0)
+
+        job = Job.objects.get(pk=job.pk)
+        job.status = 'open'
+        job.save()
+        self.assertEqual(self.counts()['Leaks'], 1)
+        self.assertEqual(job._original_status, 'open')
+
+    def test_reloaded_jobs_only_notify_real_status_changes(self):
+        provider = make_provider('provider@example.com')
+        job = make_job(self.owner, self.leaks, status='in_progress', assigned_to=provider)
+
+        job = Job.objects.get(pk=job.pk)
+        job.status = 'completed'
+        job.save()
+        self.assertEqual(Notification.objects.filter(type='job_completed').count(), 2)
+
+        # Saving a loaded job without a status change does not notify again
+        job = Job.objects.get(pk=job.pk)
+        job.title = 'Fix a dripping tap'
+        job.save()
+        self.assertEqual(Notification.objects.filter(type='job_completed').count(), 2)
+
+    def test_moving_a_subtree_moves_paths_and_counts(self):
+        make_job(self.owner, self.leaks)
+        self.plumbing.parent = self.garden
+        self.plumbing.save()
+        self.leaks.refresh_from_db()
+        self.assertTrue(self.leaks.path.startswith(self.garden.path))
+        self.assertEqual(self.counts(), {'Home repair': 0, 'Plumbing': 1, 'Leaks': 1, 'Garden': 1})
+
+    def test_list_filter_includes_subcategories(self):
+        leak = make_job(self.owner, self.leaks)
+        pipe = make_job(self.owner, self.plumbing, title='Replace pipe', description='Old pipe.')
+        make_job(self.owner, self.garden, title='Mow lawn', description='Front lawn.')
+        response = APIClient().get(reverse('job-list-create'), {'category': self.home.id})
+        self.assertEqual(sorted(job['id'] for job in response.data), sorted([leak.id, pipe.id]))
+
+    def test_rebuild_command_repairs_tree(self):
+        make_job(self.owner, self.leaks)
+        JobCategory.objects.update(path='', depth=0, open_job_count=0)
+        call_command('rebuild_category_tree', stdout=StringIO())
+        self.assertEqual(self.counts(), {'Home repair': 1, 'Plumbing': 1, 'Leaks': 1, 'Garden': 0})
+        self.assertEqual(JobCategory.objects.get(pk=self.leaks.pk).path, self.leaks.path)
+
+    def test_accept_releases_open_count(self):
+        job = make_job(self.owner, self.leaks)
+        application = make_applications(job, 1)[0]
+        JobService.accept_application(application.id, self.owner)
+        self.assertEqual(self.counts()['Home repair'], 0)
+
+
+class JobArchiveTests(TestCase):
+    def setUp(self):
+        self.category = JobCategory.objects.create(name='Plumbing')
+        self.owner = make_user('owner@example.com')
+        self.job = make_job(self.owner, self.category, status='completed')
+        make_applications(self.job, 3)
+        JobMessage.objects.create(job=self.job, sender=self.owner, message='Thanks!')
+        Job.objects.filter(id=self.job.id).update(updated_at=timezone.now() - timedelta(days=400))
+
+    def test_moves_old_finished_job_with_children(self):
+        recent = make_job(self.owner, self.category, status='completed')
+        open_job = make_job(self.owner, self.category)
+        Job.objects.filter(id=open_job.id).update(updated_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(archive_finished_jobs(days=180), (1, 3, 1))
+
+        self.assertFalse(Job.objects.filter(id=self.job.id).exists())
+        self.assertEqual(Job.objects.filter(id__in=[recent.id, open_job.id]).count(), 2)
+        archived = ArchivedJob.objects.get(id=self.job.id)
+        self.assertEqual(archived.title, self.job.title)
+        self.assertEqual(ArchivedJobApplication.objects.filter(job_id=self.job.id).count(), 3)
+        self.assertEqual(ArchivedJobMessage.objects.filter(job_id=self.job.id).count(), 1)
+        self.assertEqual(JobApplication.objects.filter(job_id=self.job.id).count(), 0)
+
+    def test_job_with_payment_and_review_is_archived(self):
+        from apps.payments.models import Payment
+        from apps.reviews.models import Review
+        provider = JobApplication.objects.filter(job=self.job).first().provider
+        Job.objects.filter(id=self.job.id).update(assigned_to=provider)
+        payment = Payment.objects.create(
+            job=self.job, payer=self.owner, provider=provider, amount=Decimal('100.00'),
+            payment_method='card', transaction_id='txn-archive-test'
+        )
+        Review.objects.create(
+            job=self.job, reviewer=self.owner, provider=provider, rating=5, title='Great', content='Dry at last.',
+            quality_rating=5, timeliness_rating=5, communication_rating=5, value_rating=5
+        )
+        Job.objects.filter(id=self.job.id).update(updated_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(archive_finished_jobs(days=180), (1, 3, 1))
+
+        self.assertFalse(Job.objects.filter(id=self.job.id).exists())
+        payment = Payment.objects.select_related('job').get(pk=payment.pk)
+        self.assertIsInstance(payment.job, ArchivedJob)
+        self.assertEqual(payment.job.title, self.job.title)
+        response = APIClient().get(reverse('provider-reviews', args=[provider.id]))
+        self.assertEqual([row['job_title'] for row in response.data], [self.job.title])
+
+        # Notifications about the payment no longer link the job
+        payment.status = 'completed'
+        payment.save()
+        notification = Notification.objects.filter(type='payment_received').first()
+        self.assertIsNone(notification.job)
+
+    def test_command_reports_shrinkage(self):
+        make_job(self.owner, self.category, status='completed')
+
+        out = StringIO()
+        call_command('archive_jobs', '--days', '180', '--dry-run', stdout=out)
+        self.assertIn('1 jobs would be archived', out.getvalue())
+
+        out = StringIO()
+        call_command('archive_jobs', '--days', '180', stdout=out)
+        self.assertIn('Live jobs table: 2 -> 1 rows (50.0% smaller)', out.getvalue())
+
+    def test_detail_resolves_archived_job(self):
+        archive_finished_jobs(days=180)
+
+        response = APIClient().get(reverse('job-detail', args=[self.job.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], self.job.id)
+        self.assertEqual(response.data['application_count'], 3)
+        self.assertEqual(response.data['similar_jobs'], [])
+
+        response = APIClient().get(reverse('job-detail', args=[self.job.id + 1000]))
+        self.assertEqual(response.status_code, 404)
+
+
+class JobMessagingTests(TestCase):
+    def setUp(self):
+        category = JobCategory.objects.create(name='Plumbing')
+        self.owner = make_user('owner@example.com')
+        self.provider = make_provider('provider@example.com')
+        self.job = make_job(self.owner, category, status='in_progress', assigned_to=self.provider)
+        self.owner_client = APIClient()
+        self.owner_client.force_authenticate(self.owner)
+        self.provider_client = APIClient()
+        self.provider_client.force_authenticate(self.provider.user)
+        self.url = reverse('job-messages', args=[self.job.id])
+
+    def test_incremental_fetch_and_unread_counters(self):
+        for i in range(3):
+            response = self.owner_client.post(self.url, {'message': f'Message {i}'})
+            self.assertEqual(response.status_code, 201)
+        first_id = JobMessage.objects.filter(job=self.job).order_by('id').first().id
+
+        response = self.provider_client.get(self.url, {'after': first_id})
+        self.assertEqual([m['message'] for m in response.data['messages']], ['Message 1', 'Message 2'])
+        self.assertEqual(response.data['unread_count'], 3)
+
+        response = self.provider_client.get(self.url, {'after': response.data['last_id']})
+        self.assertEqual(response.data['messages'], [])
+
+        unread = self.provider_client.get(reverse('job-messages-unread'))
+        self.assertEqual(unread.data['total_unread'], 3)
+
+        response = self.provider_client.post(
+            reverse('job-messages-read', args=[self.job.id]), {'up_to': first_id + 1}
+        )
+        self.assertEqual(response.data, {'marked_read': 2, 'unread_count': 1})
+        self.provider_client.post(reverse('job-messages-read', args=[self.job.id]))
+        self.assertEqual(JobMessageService.unread_count(self.job, self.provider.user), 0)
+        self.assertFalse(JobMessage.objects.filter(job=self.job, is_read=False).exists())
+
+    def test_scrollback_pages(self):
+        for i in range(5):
+            JobMessageService.send_message(self.job, self.owner, f'Message {i}')
+        latest = JobMessageService.get_messages(self.job, limit=2)
+        self.assertEqual([m.message for m in latest], ['Message 3', 'Message 4'])
+        older = JobMessageService.get_messages(self.job, before=latest[0].id, limit=2)
+        self.assertEqual([m.message for m in older], ['Message 1', 'Message 2'])
+
+    def test_long_poll_times_out_without_new_messages(self):
+        message = JobMessageService.send_message(self.job, self.owner, 'Hello')
+        with self.settings(JOB_MESSAGE_LONG_POLL_TIMEOUT=0):
+            response = self.provider_client.get(self.url, {'after': message.id, 'wait': 10})
+        self.assertEqual(response.data['messages'], [])
+        self.assertEqual(response.data['last_id'], message.id)
+
+    def test_only_participants_can_access(self):
+        outsider = APIClient()
+        outsider.force_authenticate(make_user('outsider@example.com'))
+        self.assertEqual(outsider.get(self.url).status_code, 403)
+        self.assertEqual(outsider.post(self.url, {'message': 'Hi'}).status_code, 403)
+
+
+class BulkJobCreateTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.root = JobCategory.objects.create(name='Home')
+        self.plumbing = JobCategory.objects.create(name='Plumbing', parent=self.root)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.url = reverse('job-bulk-create')
+
+    def item(self, unit, **fields):
+        return {
+            'title': f'Fix a leaking tap in unit {unit}',
+            'description': f'Kitchen tap in unit {unit} drips constantly.',
+            'category': self.plumbing.id,
+            'budget_min': '50.00',
+            'budget_max': '150.00',
+            'location': 'Nairobi',
+            'is_remote': True,
+            **fields
+        }
+
+    def test_creates_valid_jobs_and_reports_errors(self):
+        items = [self.item('1A'), self.item('1B', budget_min='500.00'), self.item('1C'), self.item('1D', category=999)]
+        response = self.client.post(self.url, {'jobs': items}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([job['index'] for job in response.data['created']], [0, 2])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertIn('category', response.data['errors'][1]['errors'])
+        self.assertEqual(Job.objects.filter(posted_by=self.owner).count(), 2)
+        # Batch jobs are not duplicates of each other
+        self.assertFalse(Job.objects.filter(duplicate_of__isnull=False).exists())
+
+        self.root.refresh_from_db()
+        self.plumbing.refresh_from_db()
+        self.assertEqual((self.root.open_job_count, self.plumbing.open_job_count), (2, 2))
+
+    def test_batch_is_inserted_with_fixed_queries(self):
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, {'jobs': [self.item(unit) for unit in range(20)]}, format='json')
+        self.assertEqual(len(response.data['created']), 20)
+
+    def test_reposted_job_is_flagged_and_only_originals_notified(self):
+        provider = make_provider('provider@example.com')
+        SavedSearch.objects.create(provider=provider, name='Taps', keywords='tap')
+        original = make_job(
+            self.owner, self.plumbing,
+            title='Fix a leaking tap in unit 1A', description='Kitchen tap in unit 1A drips constantly.'
+        )
+        DuplicateJobService.check_job(original)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url, {'jobs': [self.item('1A'), self.item('2B')]}, format='json')
+
+        self.assertEqual(response.data['created'][0]['duplicate_of'], original.id)
+        self.assertIsNone(response.data['created'][1]['duplicate_of'])
+        notified = Notification.objects.filter(type='new_job_match').values_list('job_id', flat=True)
+        self.assertEqual(list(notified), [response.data['created'][1]['id']])
+
+    def test_rejects_oversized_batch(self):
+        with self.settings(JOB_BULK_CREATE_LIMIT=2):
+            response = self.client.post(self.url, {'jobs': [self.item(unit) for unit in range(3)]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+
+class BidStatsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.root = JobCategory.objects.create(name='Home')
+        self.plumbing = JobCategory.objects.create(name='Plumbing', parent=self.root)
+        self.job = make_job(self.owner, self.plumbing)
+        # Bids of 100.00, 101.00, 102.00 and 103.00
+        self.applications = make_applications(self.job, 4)
+
+    def test_stats_follow_new_and_withdrawn_bids(self):
+        stats = JobBidStats.objects.get(job=self.job)
+        self.assertEqual(stats.bid_count, 4)
+        self.assertEqual((stats.min_bid, stats.median_bid, stats.max_bid), (
+            Decimal('100.00'), Decimal('101.50'), Decimal('103.00')
+        ))
+
+        withdrawn = JobApplication.objects.get(pk=self.applications[0].pk)
+        withdrawn.status = 'withdrawn'
+        withdrawn.save()
+        JobApplication.objects.get(pk=self.applications[3].pk).delete()
+
+        stats.refresh_from_db()
+        self.assertEqual(stats.bids, [10100, 10200])
+        self.assertEqual(stats.average_bid, Decimal('101.50'))
+
+    def test_job_detail_reads_stats_without_scanning_applications(self):
+        response = APIClient().get(reverse('job-detail', args=[self.job.id]))
+        self.assertEqual(response.data['bid_stats'], {
+            'bid_count': 4, 'min_bid': '100.00', 'median_bid': '101.50',
+            'max_bid': '103.00', 'average_bid': '101.50'
+        })
+
+    def test_category_rollup_includes_subcategories(self):
+        other = make_job(self.owner, self.root)
+        JobApplication.objects.create(
+            job=other, provider=self.applications[0].provider, bid_amount=Decimal('200.00'),
+            estimated_duration='1 day', cover_letter='Happy to help.'
+        )
+
+        self.assertEqual(BidStatsService.refresh_category_stats(), 2)
+        root_stats = CategoryBidStats.objects.get(category=self.root)
+        self.assertEqual((root_stats.job_count, root_stats.bid_count), (2, 5))
+        self.assertEqual((root_stats.median_bid, root_stats.max_bid), (Decimal('102.00'), Decimal('200.00')))
+
+        response = APIClient().get(reverse('jobcategory-bid-stats'))
+        self.assertEqual([row['category'] for row in response.data], [self.root.id, self.plumbing.id])
+        self.assertEqual(response.data[1]['median_bid'], '101.50')
@@ -1,14 +1,16 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    JobCategoryViewSet, JobListCreateView, JobDetailView, MyJobsView,
+    JobCategoryViewSet, SavedSearchViewSet, JobListCreateView, BulkJobCreateView, JobDetailView, MyJobsView,
     JobApplicationView, JobApplicationListView, AcceptApplicationView,
-    JobReviewView, UpdateJobStatusView
+    JobReviewView, UpdateJobStatusView, JobMessageListView, MarkJobMessagesReadView,
+    UnreadJobMessagesView
 )
 
 # Create router for viewsets
 router = DefaultRouter()
 router.register(r'categories', JobCategoryViewSet)
+router.register(r'saved-searches', SavedSearchViewSet, basename='saved-search')
 
 urlpatterns = [
     # Include router URLs
@@ -16,6 +18,7 @@ urlpatterns = [
     
     # Job URLs
     path('jobs/', JobListCreateView.as_view(), name='job-list-create'),
+    path('jobs/bulk/', BulkJobCreateView.as_view(), name='job-bulk-create'),
     path('jobs/<int:pk>/', JobDetailView.as_view(), name='job-detail'),
     path('jobs/<int:job_id>/status/', UpdateJobStatusView.as_view(), name='job-status-update'),
     path('my-jobs/', MyJobsView.as_view(), name='my-jobs'),
@@ -27,4 +30,9 @@ urlpatterns = [
     
     # Job Review URLs
     path('jobs/<int:job_id>/review/', JobReviewView.as_view(), name='job-review'),
+    
+    # Job Message URLs
+    path('jobs/<int:job_id>/messages/', JobMessageListView.as_view(), name='job-messages'),
+    path('jobs/<int:job_id>/messages/read/', MarkJobMessagesReadView.as_view(), name='job-messages-read'),
+    path('messages/unread/', UnreadJobMessagesView.as_view(), name='job-messages-unread'),
 ]
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from rest_framework import status, filters
 from rest_framework.decorators import action
@@ -8,15 +10,26 @@ from rest_framework.generics import (
     UpdateAPIView, DestroyAPIView, GenericAPIView
 )
 from rest_framework.viewsets import ModelViewSet
+from rest_framework.exceptions import PermissionDenied
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Job, JobCategory, JobApplication, JobReview, JobMessage
+from .models import (
+    Job, JobCategory, JobApplication, JobMessage, JobMessageCounter, SavedSearch, SimilarJob,
+    CategoryBidStats
+)
 from .serializers import (
     JobSerializer, JobListSerializer, JobCreateSerializer, JobCategorySerializer,
     JobApplicationSerializer, ApplyToJobSerializer, JobReviewSerializer,
-    JobMessageSerializer
+    JobMessageSerializer, SavedSearchSerializer, RankedJobApplicationSerializer,
+    SimilarJobSerializer, ArchivedJobSerializer, BulkJobItemSerializer, CategoryBidStatsSerializer
 )
+from .services import JobService, JobMessageService
+from .archive import get_archived_job
+from .counters import JobViewCounter
+from . import ranking
+from apps.reviews.models import Review
+from apps.reviews.services import ReviewRejected, ReviewService
 
 class JobCategoryViewSet(ModelViewSet):
     """
@@ -28,9 +41,50 @@ class JobCategoryViewSet(ModelViewSet):
     
     @swagger_auto_schema(
         operation_summary='List all job categories',
-        operation_description='Returns a list of all active job categories with job counts.',
+        operation_description='Returns a list of all active job categories with open job counts rolled up over their subcategories.',
+        tags=['Job Categories']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @swagger_auto_schema(
+        operation_summary='Get bid statistics per category',
+        operation_description='Returns bid count, min, median, max and average bid of every category with bids, including its subcategories. Refreshed in batch by the refresh_category_bid_stats command.',
         tags=['Job Categories']
     )
+    @action(detail=False, methods=['get'], url_path='bid-stats')
+    def bid_stats(self, request):
+        stats = CategoryBidStats.objects.filter(category__is_active=True).select_related('category').order_by('category__path')
+        return Response(CategoryBidStatsSerializer(stats, many=True).data)
+
+class SavedSearchViewSet(ModelViewSet):
+    """
+    ViewSet for a provider's saved job searches
+    """
+    serializer_class = SavedSearchSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return SavedSearch.objects.filter(provider__user=self.request.user).select_related('category')
+    
+    def perform_create(self, serializer):
+        if not hasattr(self.request.user, 'provider_profile'):
+            raise PermissionDenied('You must be a registered provider to save job searches.')
+        serializer.save(provider=self.request.user.provider_profile)
+    
+    @swagger_auto_schema(
+        operation_summary='List my saved searches',
+        operation_description="""
+        Returns the authenticated provider's saved job searches.
+        
+        When a new job matching an active saved search is posted, the provider
+        receives a `new_job_match` notification. A search matches when all of
+        its set fields match: category, every keyword, a job budget_max of at
+        least min_budget, and a job location within radius_km of
+        latitude/longitude (remote jobs match any area).
+        """,
+        tags=['Saved Searches']
+    )
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -40,8 +94,20 @@ class JobListCreateView(GenericAPIView):
     """
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    ordering_fields = ['created_at', 'budget_min', 'deadline', 'view_count']
+    
     def get_queryset(self):
-        return Job.objects.filter(status='open').select_related('posted_by', 'category', 'assigned_to')
+        queryset = Job.objects.filter(
+            status='open',
+            duplicate_of__isnull=True
+        ).select_related('posted_by', 'category', 'assigned_to')
+        
+        # Category filter includes every subcategory: one prefix match on the path index
+        category_id = self.request.query_params.get('category')
+        if category_id:
+            category = get_object_or_404(JobCategory, id=category_id)
+            queryset = queryset.filter(category__path__startswith=category.path)
+        return queryset
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -54,12 +120,12 @@ class JobListCreateView(GenericAPIView):
         Returns a paginated list of open jobs with filtering and search capabilities.
         
         **Filters:**
-        - category: Filter by job category ID
+        - category: Filter by job category ID, including its subcategories
         - urgency: Filter by urgency level (low, medium, high, urgent)
         - is_remote: Filter remote jobs (true/false)
         
         **Search:** Search in title, description, and location
-        **Ordering:** Sort by created_at, budget_min, or deadline
+        **Ordering:** Sort by created_at, budget_min, deadline, or view_count
         """,
         tags=['Jobs']
     )
@@ -87,25 +153,120 @@ class JobListCreateView(GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid(raise_exception=True):
-            job = serializer.save()
+            job = serializer.save(posted_by=request.user)
             response_serializer = JobSerializer(job)
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
+class BulkJobCreateView(GenericAPIView):
+    """
+    Create many jobs in one request
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Create jobs in bulk',
+        operation_description="""
+        Create up to `JOB_BULK_CREATE_LIMIT` jobs at once, e.g. the same job for
+        several properties. Each entry of `jobs` takes the fields of the single
+        job create endpoint.
+        
+        Valid jobs are created even when others fail validation. `created`
+        lists the new jobs and `errors` the rejected ones, both with the
+        `index` of the entry in the request. Jobs in a batch are not flagged
+        as duplicates of each other.
+        """,
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'jobs': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT))
+            },
+            required=['jobs']
+        ),
+        responses={
+            201: 'At least one job created',
+            400: 'No job could be created'
+        },
+        tags=['Jobs']
+    )
+    def post(self, request):
+        items = request.data.get('jobs')
+        if not isinstance(items, list) or not items:
+            return Response({
+                'error': 'jobs must be a non-empty list.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.JOB_BULK_CREATE_LIMIT:
+            return Response({
+                'error': f'At most {settings.JOB_BULK_CREATE_LIMIT} jobs can be created at once.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Load every referenced category in one query for the whole batch
+        category_ids = set()
+        for item in items:
+            try:
+                category_ids.add(int(item.get('category')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        context = {**self.get_serializer_context(), 'categories': JobCategory.objects.in_bulk(category_ids)}
+        
+        valid, errors = [], []
+        for index, item in enumerate(items):
+            serializer = BulkJobItemSerializer(data=item, context=context)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                errors.append({'index': index, 'errors': serializer.errors})
+        
+        jobs = JobService.bulk_create_jobs(request.user, [data for _, data in valid]) if valid else []
+        created = [
+            {'index': index, 'id': job.id, 'title': job.title, 'duplicate_of': job.duplicate_of_id}
+            for (index, _), job in zip(valid, jobs)
+        ]
+        return Response({
+            'created': created,
+            'errors': errors
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
 class JobDetailView(RetrieveAPIView):
     """
     Get detailed information about a specific job
     """
-    queryset = Job.objects.select_related('posted_by', 'category', 'assigned_to')
+    queryset = Job.objects.select_related('posted_by', 'category', 'assigned_to', 'bid_stats')
     serializer_class = JobSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     @swagger_auto_schema(
         operation_summary='Get job details',
-        operation_description='Returns detailed information about a specific job including applications.',
+        operation_description='Returns detailed information about a specific job including applications and precomputed similar open jobs.',
         tags=['Jobs']
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            job = self.get_object()
+        except Http404:
+            # Finished jobs move to the archive tables but keep their id
+            archived_job = get_archived_job(self.kwargs[self.lookup_field])
+            if archived_job is None:
+                raise
+            data = ArchivedJobSerializer(archived_job).data
+            data['similar_jobs'] = []
+            return Response(data)
+        
+        JobViewCounter.record(job.id)
+        
+        # view_count is eventually consistent, include views not yet flushed
+        job.view_count += JobViewCounter.pending(job.id)
+        data = self.get_serializer(job).data
+        
+        # Precomputed by the build_similar_jobs command, one (job, rank) index scan
+        similar_jobs = SimilarJob.objects.filter(
+            job=job,
+            similar__status='open'
+        ).select_related('similar', 'similar__category').order_by('rank')
+        data['similar_jobs'] = SimilarJobSerializer(similar_jobs, many=True).data
+        return Response(data)
 
 class MyJobsView(ListAPIView):
     """
@@ -190,16 +351,49 @@ class JobApplicationListView(ListAPIView):
     
     def get_queryset(self):
         job_id = self.kwargs['job_id']
-        job = get_object_or_404(Job, id=job_id, posted_by=self.request.user)
-        return JobApplication.objects.filter(job=job).select_related('provider', 'provider__user')
+        self.job = get_object_or_404(Job, id=job_id, posted_by=self.request.user)
+        return JobApplication.objects.filter(job=self.job).select_related('provider', 'provider__user')
     
     @swagger_auto_schema(
         operation_summary='Get job applications',
-        operation_description='Returns all applications for a specific job. Only job owner can access.',
+        operation_description="""
+        Returns all applications for a specific job. Only job owner can access.
+        
+        **Ranking:** pass `rank=best` to get a shortlist ordered by a weighted
+        score of bid amount, provider rating, review count, distance and the
+        provider's past win rate. Each application then includes
+        `ranking_score` and a per-factor `ranking_explanation`. Default weights
+        come from `APPLICATION_RANKING_WEIGHTS` and can be overridden per
+        request with `weight_<factor>` parameters, e.g. `weight_bid=2`.
+        """,
+        manual_parameters=[
+            openapi.Parameter('rank', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['best']),
+        ] + [
+            openapi.Parameter(f'weight_{factor}', openapi.IN_QUERY, type=openapi.TYPE_NUMBER)
+            for factor in ranking.FACTORS
+        ],
         tags=['Job Applications']
     )
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
+        if request.query_params.get('rank') != 'best':
+            return super().get(request, *args, **kwargs)
+        
+        queryset = self.get_queryset()
+        try:
+            overrides = {
+                factor: float(request.query_params[f'weight_{factor}'])
+                for factor in ranking.FACTORS
+                if f'weight_{factor}' in request.query_params
+            }
+            weights = ranking.get_weights(overrides)
+        except ValueError:
+            return Response({
+                'error': 'Ranking weights must be finite numbers.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        applications = ranking.rank_applications(self.job, queryset, weights=weights)
+        serializer = RankedJobApplicationSerializer(applications, many=True)
+        return Response(serializer.data)
 
 class AcceptApplicationView(GenericAPIView):
     """
@@ -218,49 +412,52 @@ class AcceptApplicationView(GenericAPIView):
         tags=['Job Applications']
     )
     def post(self, request, application_id):
-        application = get_object_or_404(
-            JobApplication, 
-            id=application_id, 
-            job__posted_by=request.user,
-            status='pending'
-        )
+        try:
+            application = JobService.accept_application(application_id, request.user)
+        except JobApplication.DoesNotExist:
+            return Response({
+                'error': 'Application not found.'
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        job = application.job
-        if job.status != 'open':
+        if application is None:
             return Response({
                 'error': 'This job is no longer open for applications.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Accept the application and assign the job
-        application.status = 'accepted'
-        application.save()
-        
-        job.assigned_to = application.provider
-        job.status = 'in_progress'
-        job.save()
-        
-        # Reject other pending applications
-        JobApplication.objects.filter(
-            job=job, 
-            status='pending'
-        ).exclude(id=application.id).update(status='rejected')
-        
         return Response({
             'message': 'Application accepted successfully.',
-            'job_status': job.status,
+            'job_status': application.job.status,
             'assigned_provider': application.provider.business_name
         })
 
-class JobReviewView(CreateAPIView):
+class JobReviewView(GenericAPIView):
     """
-    Create a review for a completed job
+    Read or create the review of a completed job
+
+    Compatibility endpoint for clients of the old job review API, reviews
+    are stored as reviews.Review like the ones created through the reviews
+    endpoints.
     """
     serializer_class = JobReviewSerializer
     permission_classes = [IsAuthenticated]
     
+    @swagger_auto_schema(
+        operation_summary='Get the review of a job',
+        operation_description='Returns the review of a job with its rating and comment.',
+        tags=['Job Reviews']
+    )
+    def get(self, request, job_id):
+        review = get_object_or_404(Review.objects.select_related('reviewer'), job_id=job_id)
+        return Response(self.get_serializer(review).data)
+    
     @swagger_auto_schema(
         operation_summary='Review a completed job',
-        operation_description='Submit a review for a completed job. Only job owner can review.',
+        operation_description="""
+        Submit a rating and comment for a completed job. Only job owner can review.
+        
+        Stored as a full review, the comment's first line becomes its title and
+        the rating is used for every detailed rating.
+        """,
         tags=['Job Reviews']
     )
     def post(self, request, job_id):
@@ -271,19 +468,146 @@ class JobReviewView(CreateAPIView):
             status='completed'
         )
         
-        if hasattr(job, 'review'):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fields = ReviewService.legacy_fields(serializer.validated_data['rating'], serializer.validated_data['content'])
+        try:
+            review = ReviewService.create_review(job, request.user, **fields)
+        except ReviewRejected as e:
             return Response({
-                'error': 'This job has already been reviewed.'
+                'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(review).data, status=status.HTTP_201_CREATED)
+
+class JobConversationMixin:
+    """Load the job of a conversation and check the user takes part in it"""
+    
+    def get_conversation_job(self, job_id):
+        job = get_object_or_404(Job.objects.select_related('assigned_to'), id=job_id)
+        if self.request.user.id not in JobMessageService.participant_ids(job):
+            raise PermissionDenied('Only the job owner and the assigned provider can access this conversation.')
+        return job
+
+class JobMessageListView(JobConversationMixin, GenericAPIView):
+    """
+    Read and send messages in a job's conversation
+    """
+    serializer_class = JobMessageSerializer
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Get job messages',
+        operation_description="""
+        Returns a page of the job's conversation in chronological order: the
+        latest messages by default, messages older than `before`, or messages
+        newer than `after` for incremental sync.
         
-        serializer = self.get_serializer(data=request.data)
-        if serializer.is_valid(raise_exception=True):
-            serializer.save(
-                job=job,
-                reviewer=request.user,
-                provider=job.assigned_to
+        **Long-poll:** pass `after` together with `wait=<seconds>` to hold the
+        request until a newer message arrives or the wait runs out, in which
+        case `messages` is empty. `last_id` is the id to pass as `after` next.
+        """,
+        manual_parameters=[
+            openapi.Parameter('after', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('before', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('wait', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+        ],
+        tags=['Job Messages']
+    )
+    def get(self, request, job_id):
+        job = self.get_conversation_job(job_id)
+        try:
+            after, before, wait = (
+                int(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('after', 'before', 'wait')
             )
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            limit = int(request.query_params.get('limit', JobMessageService.PAGE_SIZE))
+        except ValueError:
+            return Response({
+                'error': 'after, before, limit and wait must be integers.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if wait and after is not None:
+            messages = JobMessageService.wait_for_messages(job, after, wait, limit=limit)
+        else:
+            messages = JobMessageService.get_messages(job, after=after, before=before, limit=limit)
+        
+        return Response({
+            'messages': self.get_serializer(messages, many=True).data,
+            'last_id': messages[-1].id if messages else after,
+            'unread_count': JobMessageService.unread_count(job, request.user)
+        })
+    
+    @swagger_auto_schema(
+        operation_summary='Send job message',
+        operation_description='Send a message to the other participant of the job conversation.',
+        request_body=JobMessageSerializer,
+        tags=['Job Messages']
+    )
+    def post(self, request, job_id):
+        job = self.get_conversation_job(job_id)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        message = JobMessageService.send_message(job, request.user, serializer.validated_data['message'])
+        return Response(self.get_serializer(message).data, status=status.HTTP_201_CREATED)
+
+class MarkJobMessagesReadView(JobConversationMixin, GenericAPIView):
+    """
+    Mark messages in a job's conversation as read
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Mark job messages read',
+        operation_description='Marks every message to the user up to and including `up_to` as read in one update, or all of them if `up_to` is omitted.',
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'up_to': openapi.Schema(type=openapi.TYPE_INTEGER, description='Id of the last message read')
+            }
+        ),
+        tags=['Job Messages']
+    )
+    def post(self, request, job_id):
+        job = self.get_conversation_job(job_id)
+        up_to = request.data.get('up_to')
+        try:
+            up_to = int(up_to) if up_to is not None else None
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'up_to must be a message id.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        marked = JobMessageService.mark_read(job, request.user, up_to)
+        return Response({
+            'marked_read': marked,
+            'unread_count': JobMessageService.unread_count(job, request.user)
+        })
+
+class UnreadJobMessagesView(GenericAPIView):
+    """
+    Unread message counts of the authenticated user per job
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Get unread job message counts',
+        operation_description='Returns the unread message count of every job conversation with unread messages, read from precomputed counters.',
+        tags=['Job Messages']
+    )
+    def get(self, request):
+        counters = JobMessageCounter.objects.filter(
+            user=request.user,
+            unread_count__gt=0
+        ).select_related('job').order_by('-updated_at')
+        jobs = [
+            {'job': counter.job_id, 'job_title': counter.job.title, 'unread_count': counter.unread_count}
+            for counter in counters
+        ]
+        return Response({
+            'total_unread': sum(job['unread_count'] for job in jobs),
+            'jobs': jobs
+        })
 
 class UpdateJobStatusView(GenericAPIView):
     """
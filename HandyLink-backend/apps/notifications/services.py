@@ -1,4 +1,4 @@
-from django.core.mail import send_mail, EmailMessage
+from django.core.mail import send_mail, EmailMessage, get_connection
 from django.template import Template, Context
 from django.template.loader import render_to_string, get_template
 from django.conf import settings
@@ -74,7 +74,117 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Error creating notification: {e}")
             return None
-    
+
+    @staticmethod
+    def create_bulk_notifications(
+        recipients,
+        notification_type,
+        context_data=None,
+        recipient_context=None,
+        related_job=None,
+        related_provider=None,
+        priority='medium',
+        action_url=''
+    ):
+        """
+        Create the same notification for many recipients in one batch
+
+        The template and preferences are loaded once for the whole batch,
+        notifications are inserted with bulk_create and emails go out over
+        a single SMTP connection.
+
+        Args:
+            recipients: iterable of User objects
+            notification_type: str from NOTIFICATION_TYPES
+            context_data: dict shared by all recipients, user_name is added per recipient
+            recipient_context: optional dict of user id -> extra context for that recipient
+            related_*: Related model instances
+            priority: notification priority
+            action_url: URL to navigate when clicked
+        """
+        recipients = list(recipients)
+        if not recipients:
+            return []
+        context_data = context_data or {}
+        recipient_context = recipient_context or {}
+
+        try:
+            template = NotificationTemplate.objects.filter(
+                type=notification_type,
+                is_active=True
+            ).first()
+
+            if not template:
+                template = NotificationService._create_default_template(notification_type)
+
+            notifications = []
+            for recipient in recipients:
+                data = {
+                    **context_data,
+                    'user_name': recipient.get_full_name or recipient.email,
+                    **recipient_context.get(recipient.pk, {})
+                }
+                notifications.append(Notification(
+                    recipient=recipient,
+                    type=notification_type,
+                    title=NotificationService._render_template(template.title_template, data),
+                    message=NotificationService._render_template(template.message_template, data),
+                    priority=priority,
+                    job=related_job,
+                    provider=related_provider,
+                    data=data,
+                    action_url=action_url
+                ))
+            notifications = Notification.objects.bulk_create(notifications)
+
+            NotificationService._send_bulk_notifications(notifications, template)
+            return notifications
+
+        except Exception as e:
+            logger.error(f"Error creating bulk notifications: {e}")
+            return []
+
+    @staticmethod
+    def _send_bulk_notifications(notifications, template):
+        """Send a batch of notifications, honouring each recipient's preferences"""
+        try:
+            preferences = {
+                preference.user_id: preference
+                for preference in NotificationPreference.objects.filter(
+                    user__in=[notification.recipient for notification in notifications]
+                )
+            }
+
+            sent_ids = []
+            emails = {}
+            for notification in notifications:
+                # Users without saved preferences get the model defaults
+                user_preferences = preferences.get(
+                    notification.recipient.pk,
+                    NotificationPreference(user=notification.recipient)
+                )
+                if not NotificationService._is_notification_type_enabled(notification.type, user_preferences):
+                    continue
+                sent_ids.append(notification.id)
+
+                if (
+                    user_preferences.email_enabled and template.send_email and
+                    not NotificationService._is_quiet_hours(user_preferences)
+                ):
+                    emails[notification.id] = NotificationService._build_email(notification, template)
+
+            if emails:
+                try:
+                    get_connection(fail_silently=False).send_messages(list(emails.values()))
+                    Notification.objects.filter(id__in=emails).update(sent_via_email=True)
+                except Exception as smtp_error:
+                    logger.error(f"SMTP Error sending {len(emails)} batched emails: {smtp_error}")
+
+            Notification.objects.filter(id__in=sent_ids).update(is_sent=True, sent_at=timezone.now())
+
+        except Exception as e:
+            logger.error(f"Error sending bulk notifications: {e}")
+
     @staticmethod
     def _render_template(template_string, context_data):
         """Render template string with context data"""
@@ -119,81 +229,16 @@ class NotificationService:
             if NotificationService._is_quiet_hours(preferences):
                 return
             
-            # Prepare context data for template rendering
-            context_data = notification.data.copy() if notification.data else {}
-            context_data.update({
-                'recipient_name': notification.recipient.get_full_name or notification.recipient.email,
-                'notification_title': notification.title,
-                'notification_message': notification.message,
-                'action_url': notification.action_url,
-                'priority': notification.priority,
-                'notification_type': notification.type,
-            })
-            
-            # Render email subject
-            subject = NotificationService._render_template(
-                template.email_subject_template or notification.title,
-                context_data
-            )
-            
-            # Try to use HTML template first, fallback to text
-            html_content = None
-            template_name = f"emails/{notification.type}.html"
+            email = NotificationService._build_email(notification, template)
+            content_type = 'HTML' if email.content_subtype == 'html' else 'Plain text'
             
             try:
-                # Render HTML email template
-                html_content = render_to_string(template_name, context_data)
-            except Exception as template_error:
-                logger.warning(f"HTML template {template_name} not found: {template_error}")
-                # Fallback to generic template
-                try:
-                    html_content = render_to_string("emails/generic.html", context_data)
-                except Exception as generic_error:
-                    logger.warning(f"Generic template not found: {generic_error}")
-                    # Final fallback to base template
-                    try:
-                        html_content = render_to_string("emails/base.html", context_data)
-                    except Exception as base_error:
-                        logger.error(f"Base template not found: {base_error}")
-                        html_content = None
-            
-            # Create email message
-            if html_content:
-                # Send HTML email
-                email = EmailMessage(
-                    subject=subject,
-                    body=html_content,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to=[notification.recipient.email]
-                )
-                email.content_subtype = "html"  # Set content type to HTML
-                
-                try:
-                    email.send(fail_silently=False)
-                    print(f"✅ HTML email sent to {notification.recipient.email}: {subject}")
-                except Exception as smtp_error:
-                    print(f"❌ SMTP Error: {smtp_error}")
-                    logger.error(f"SMTP Error sending email to {notification.recipient.email}: {smtp_error}")
-                    raise smtp_error
-            else:
-                # Fallback to plain text email
-                body = NotificationService._render_template(
-                    template.email_body_template or notification.message,
-                    context_data
-                )
-                try:
-                    send_mail(
-                        subject=subject,
-                        message=body,
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[notification.recipient.email],
-                        fail_silently=False,
-                    )
-                    print(f"✅ Plain text email sent to {notification.recipient.email}: {subject}")
-                except Exception as smtp_error:
-                    print(f"❌ SMTP Error: {smtp_error}")
-                    logger.error(f"SMTP Error sending plain text email to {notification.recipient.email}: {smtp_error}")
-                    raise smtp_error
+                email.send(fail_silently=False)
+                print(f"✅ {content_type} email sent to {notification.recipient.email}: {email.subject}")
+            except Exception as smtp_error:
+                print(f"❌ SMTP Error: {smtp_error}")
+                logger.error(f"SMTP Error sending email to {notification.recipient.email}: {smtp_error}")
+                raise smtp_error
             
             notification.sent_via_email = True
             notification.save(update_fields=['sent_via_email'])
@@ -201,6 +246,69 @@ class NotificationService:
         except Exception as e:
             logger.error(f"Error sending email notification: {e}")
     
+    @staticmethod
+    def _build_email(notification, template):
+        """Render the email message for a notification, HTML when a template exists"""
+        # Prepare context data for template rendering
+        context_data = notification.data.copy() if notification.data else {}
+        context_data.update({
+            'recipient_name': notification.recipient.get_full_name or notification.recipient.email,
+            'notification_title': notification.title,
+            'notification_message': notification.message,
+            'action_url': notification.action_url,
+            'priority': notification.priority,
+            'notification_type': notification.type,
+        })
+        
+        # Render email subject
+        subject = NotificationService._render_template(
+            template.email_subject_template or notification.title,
+            context_data
+        )
+        
+        # Try to use HTML template first, fallback to text
+        html_content = None
+        template_name = f"emails/{notification.type}.html"
+        
+        try:
+            # Render HTML email template
+            html_content = render_to_string(template_name, context_data)
+        except Exception as template_error:
+            logger.warning(f"HTML template {template_name} not found: {template_error}")
+            # Fallback to generic template
+            try:
+                html_content = render_to_string("emails/generic.html", context_data)
+            except Exception as generic_error:
+                logger.warning(f"Generic template not found: {generic_error}")
+                # Final fallback to base template
+                try:
+                    html_content = render_to_string("emails/base.html", context_data)
+                except Exception as base_error:
+                    logger.error(f"Base template not found: {base_error}")
+                    html_content = None
+        
+        if html_content:
+            email = EmailMessage(
+                subject=subject,
+                body=html_content,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[notification.recipient.email]
+            )
+            email.content_subtype = "html"  # Set content type to HTML
+            return email
+        
+        # Fallback to plain text email
+        body = NotificationService._render_template(
+            template.email_body_template or notification.message,
+            context_data
+        )
+        return EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.recipient.email]
+        )
+    
     @staticmethod
     def _get_user_preferences(user):
         """Get or create user notification preferences"""
@@ -291,6 +399,12 @@ class NotificationService:
                 'message': 'You received a new {rating}-star review for "{job_title}".',
                 'email_subject': 'New Review Received',
                 'email_body': 'Hi {user_name},\n\nYou have received a new {rating}-star review for your work on "{job_title}".\n\nView review: {action_url}\n\nBest regards,\nThe HandyLink Team'
+            },
+            'new_job_match': {
+                'title': 'New Job Match',
+                'message': 'A new job "{job_title}" matches your saved search "{search_name}".',
+                'email_subject': 'New Job Matching "{search_name}": {job_title}',
+                'email_body': 'Hi {user_name},\n\nA new job "{job_title}" in {location} matches your saved search "{search_name}".\n\nView the job: {action_url}\n\nBest regards,\nThe HandyLink Team'
             }
         }
         
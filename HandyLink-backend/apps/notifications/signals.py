@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
@@ -6,10 +7,16 @@ from apps.jobs.models import Job, JobApplication
 from apps.reviews.models import Review
 from apps.payments.models import Payment
 from apps.providers.models import Provider
+from apps.jobs.services import SavedSearchService
 from .services import NotificationService
 
 User = get_user_model()
 
+def live_job(instance):
+    """The job of a review or payment, None once it is archived, notifications only link live jobs"""
+    job = instance.job
+    return job if isinstance(job, Job) else None
+
 # User-related signals
 @receiver(post_save, sender=User)
 def user_created_notification(sender, instance, created, **kwargs):
@@ -126,6 +133,12 @@ def application_status_notification(sender, instance, created, **kwargs):
                 action_url=f'/jobs/{instance.job.id}/'
             )
 
+@receiver(post_save, sender=Job)
+def job_match_notification(sender, instance, created, **kwargs):
+    """Alert providers whose saved searches match a newly posted job"""
+    if created and instance.status == 'open':
+        transaction.on_commit(lambda: SavedSearchService.notify_matches(instance))
+
 @receiver(post_save, sender=Job)
 def job_status_notification(sender, instance, created, **kwargs):
     """Send notification when job status changes"""
@@ -192,7 +205,7 @@ def review_notification(sender, instance, created, **kwargs):
                 'reviewer_name': instance.reviewer.get_full_name or instance.reviewer.email,
             },
             related_review=instance,
-            related_job=instance.job,
+            related_job=live_job(instance),
             priority='medium',
             action_url=f'/reviews/{instance.id}/'
         )
@@ -209,7 +222,7 @@ def review_notification(sender, instance, created, **kwargs):
                     'provider_name': instance.provider.business_name,
                 },
                 related_review=instance,
-                related_job=instance.job,
+                related_job=live_job(instance),
                 priority='low',
                 action_url=f'/reviews/{instance.id}/'
             )
@@ -232,7 +245,7 @@ def payment_notification(sender, instance, created, **kwargs):
                         'amount': str(instance.provider_amount),
                     },
                     related_payment=instance,
-                    related_job=instance.job,
+                    related_job=live_job(instance),
                     priority='high',
                     action_url=f'/payments/{instance.id}/'
                 )
@@ -248,7 +261,7 @@ def payment_notification(sender, instance, created, **kwargs):
                         'provider_name': instance.provider.business_name,
                     },
                     related_payment=instance,
-                    related_job=instance.job,
+                    related_job=live_job(instance),
                     priority='medium',
                     action_url=f'/payments/{instance.id}/'
                 )
@@ -264,12 +277,13 @@ def payment_notification(sender, instance, created, **kwargs):
                         'amount': str(instance.amount),
                     },
                     related_payment=instance,
-                    related_job=instance.job,
+                    related_job=live_job(instance),
                     priority='urgent',
                     action_url=f'/payments/{instance.id}/'
                 )
 
-# Signal to track original values for comparison
+# Signal to track original values for comparison. Jobs, applications and
+# reviews remember their stored values themselves (core/tracking.py).
 @receiver(post_save, sender=Provider)
 def save_original_provider_values(sender, instance, **kwargs):
     """Save original values to track changes"""
@@ -280,36 +294,6 @@ def save_original_provider_values(sender, instance, **kwargs):
         except Provider.DoesNotExist:
             pass
 
-@receiver(post_save, sender=JobApplication)
-def save_original_application_values(sender, instance, **kwargs):
-    """Save original values to track changes"""
-    if instance.pk:
-        try:
-            original = JobApplication.objects.get(pk=instance.pk)
-            instance._original_status = original.status
-        except JobApplication.DoesNotExist:
-            pass
-
-@receiver(post_save, sender=Job)
-def save_original_job_values(sender, instance, **kwargs):
-    """Save original values to track changes"""
-    if instance.pk:
-        try:
-            original = Job.objects.get(pk=instance.pk)
-            instance._original_status = original.status
-        except Job.DoesNotExist:
-            pass
-
-@receiver(post_save, sender=Review)
-def save_original_review_values(sender, instance, **kwargs):
-    """Save original values to track changes"""
-    if instance.pk:
-        try:
-            original = Review.objects.get(pk=instance.pk)
-            instance._original_provider_response = original.provider_response
-        except Review.DoesNotExist:
-            pass
-
 @receiver(post_save, sender=User)
 def save_original_user_values(sender, instance, **kwargs):
     """Save original values to track changes"""
@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from apps.jobs.fields import ArchivableJobField
+
 User = get_user_model()
 
 class Payment(models.Model):
@@ -24,7 +26,8 @@ class Payment(models.Model):
     ]
     
     # Core relationships
-    job = models.OneToOneField('jobs.Job', on_delete=models.CASCADE, related_name='payment')
+    # Payments outlive the live row of their job, see apps/jobs/fields.py
+    job = ArchivableJobField('jobs.Job', related_name='payment')
     payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments_made')
     provider = models.ForeignKey('providers.Provider', on_delete=models.CASCADE, related_name='payments_received')
     
@@ -1,22 +1,39 @@
-from django.contrib import admin
-from .models import Provider, ProviderService, ProviderDocument
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db.models import F
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import (
+    Provider, ProviderService, ProviderDocument, DocumentBlob, ServiceArea, ProviderAvailability, Booking
+)
+from .imports import import_providers
+
+class ProviderImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX file, see apps/providers/imports.py for the columns")
 
 @admin.register(Provider)
 class ProviderAdmin(admin.ModelAdmin):
     list_display = ['business_name', 'user', 'provider_type', 'status', 'is_verified', 'rating', 'created_at']
     list_filter = ['provider_type', 'status', 'is_verified', 'created_at']
     search_fields = ['business_name', 'user__email', 'user__first_name', 'user__last_name']
-    readonly_fields = ['rating', 'total_reviews', 'created_at', 'updated_at']
+    readonly_fields = [
+        'rating', 'total_reviews', 'ranking_score', 'ranking_updated_at',
+        'trust_score', 'trust_score_updated_at', 'created_at', 'updated_at'
+    ]
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('user', 'business_name', 'provider_type', 'description')
         }),
         ('Contact Information', {
-            'fields': ('website', 'phone_number', 'address')
+            'fields': ('website', 'phone_number', 'address', 'latitude', 'longitude')
         }),
         ('Status & Verification', {
-            'fields': ('status', 'is_verified', 'rating', 'total_reviews')
+            'fields': (
+                'status', 'is_verified', 'rating', 'total_reviews', 'ranking_score', 'ranking_updated_at',
+                'trust_score', 'trust_score_updated_at'
+            )
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -27,19 +44,50 @@ class ProviderAdmin(admin.ModelAdmin):
     actions = ['approve_providers', 'reject_providers', 'verify_providers']
     
     def approve_providers(self, request, queryset):
-        queryset.update(status='approved')
+        queryset.update(status='approved', profile_version=F('profile_version') + 1)
         self.message_user(request, f"{queryset.count()} providers have been approved.")
     approve_providers.short_description = "Approve selected providers"
     
     def reject_providers(self, request, queryset):
-        queryset.update(status='rejected')
+        queryset.update(status='rejected', profile_version=F('profile_version') + 1)
         self.message_user(request, f"{queryset.count()} providers have been rejected.")
     reject_providers.short_description = "Reject selected providers"
     
     def verify_providers(self, request, queryset):
-        queryset.update(is_verified=True)
+        queryset.update(is_verified=True, profile_version=F('profile_version') + 1)
         self.message_user(request, f"{queryset.count()} providers have been verified.")
     verify_providers.short_description = "Verify selected providers"
+    
+    change_list_template = 'admin/providers/provider/change_list.html'
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='providers_provider_import'),
+        ] + super().get_urls()
+    
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        
+        result = None
+        form = ProviderImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            result = import_providers(upload.file, upload.name)
+            self.message_user(
+                request,
+                f"Imported {result.providers} providers and {result.services} services from "
+                f"{result.rows} rows in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s).",
+                messages.SUCCESS if not result.error_count else messages.WARNING
+            )
+        
+        return TemplateResponse(request, 'admin/providers/provider/import_providers.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import providers',
+            'form': form,
+            'result': result,
+        })
 
 @admin.register(ProviderService)
 class ProviderServiceAdmin(admin.ModelAdmin):
@@ -50,7 +98,7 @@ class ProviderServiceAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Service Information', {
-            'fields': ('provider', 'name', 'description')
+            'fields': ('provider', 'category', 'name', 'description')
         }),
         ('Pricing & Duration', {
             'fields': ('price', 'duration')
@@ -65,11 +113,11 @@ class ProviderDocumentAdmin(admin.ModelAdmin):
     list_display = ['provider', 'document_type', 'is_verified', 'uploaded_at']
     list_filter = ['document_type', 'is_verified', 'uploaded_at']
     search_fields = ['provider__business_name', 'provider__user__email']
-    readonly_fields = ['uploaded_at']
+    readonly_fields = ['blob', 'original_filename', 'uploaded_at']
     
     fieldsets = (
         ('Document Information', {
-            'fields': ('provider', 'document_type', 'document_file')
+            'fields': ('provider', 'document_type', 'document_file', 'original_filename', 'blob')
         }),
         ('Verification', {
             'fields': ('is_verified', 'uploaded_at')
@@ -79,6 +127,67 @@ class ProviderDocumentAdmin(admin.ModelAdmin):
     actions = ['verify_documents']
     
     def verify_documents(self, request, queryset):
+        # Verified documents show on the cached profiles of their providers
+        Provider.objects.filter(documents__in=queryset).update(profile_version=F('profile_version') + 1)
         queryset.update(is_verified=True)
         self.message_user(request, f"{queryset.count()} documents have been verified.")
     verify_documents.short_description = "Verify selected documents"
+
+@admin.register(DocumentBlob)
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'content_type', 'page_count', 'status', 'created_at']
+    list_filter = ['status', 'content_type']
+    search_fields = ['sha256']
+    readonly_fields = [
+        'sha256', 'file', 'size', 'content_type', 'page_count', 'thumbnail',
+        'status', 'error', 'created_at', 'processed_at'
+    ]
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ServiceArea)
+class ServiceAreaAdmin(admin.ModelAdmin):
+    list_display = ['name', 'provider', 'kind', 'radius_km', 'is_active', 'created_at']
+    list_filter = ['kind', 'is_active']
+    search_fields = ['name', 'provider__business_name']
+    readonly_fields = ['min_latitude', 'max_latitude', 'min_longitude', 'max_longitude', 'created_at', 'updated_at']
+    
+    fieldsets = (
+        ('Area', {
+            'fields': ('provider', 'name', 'kind', 'is_active')
+        }),
+        ('Shape', {
+            'fields': ('latitude', 'longitude', 'radius_km', 'polygon')
+        }),
+        ('Bounding Box', {
+            'fields': ('min_latitude', 'max_latitude', 'min_longitude', 'max_longitude', 'created_at', 'updated_at'),
+            'classes': ('collapse',)
+        })
+    )
+
+@admin.register(ProviderAvailability)
+class ProviderAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'weekday', 'start_time', 'end_time']
+    list_filter = ['weekday']
+    search_fields = ['provider__business_name']
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'customer', 'service', 'start', 'end', 'status', 'created_at']
+    list_filter = ['status', 'start']
+    search_fields = ['provider__business_name', 'customer__email']
+    readonly_fields = ['created_at', 'updated_at']
+    
+    fieldsets = (
+        ('Booking Details', {
+            'fields': ('provider', 'customer', 'service', 'notes')
+        }),
+        ('Slot', {
+            'fields': ('start', 'end', 'status')
+        }),
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        })
+    )
@@ -0,0 +1,89 @@
+"""
+Provider service areas and their grid index.
+
+Every service area, a circle or a polygon, is registered in the grid cells
+its bounding box overlaps (SERVICE_AREA_GRID_DEGREES on a side). The areas
+that may cover a point are the ones registered in the point's cell: one
+indexed lookup, then an exact circle or point-in-polygon test on those few
+candidates instead of on every area.
+"""
+import math
+
+from django.conf import settings
+
+from apps.jobs.utils import bounding_box, haversine_km
+
+
+def grid_columns():
+    return math.ceil(360 / settings.SERVICE_AREA_GRID_DEGREES)
+
+
+def cell_key(lat, lng):
+    """Grid cell of a point"""
+    size = settings.SERVICE_AREA_GRID_DEGREES
+    row = math.floor((min(lat, 89.999999) + 90) / size)
+    column = math.floor((min(lng, 179.999999) + 180) / size)
+    return row * grid_columns() + column
+
+
+def cells_for_box(min_lat, max_lat, min_lng, max_lng):
+    """Grid cells overlapped by a bounding box"""
+    first_row, first_column = divmod(cell_key(min_lat, min_lng), grid_columns())
+    last_row, last_column = divmod(cell_key(max_lat, max_lng), grid_columns())
+    return [
+        row * grid_columns() + column
+        for row in range(first_row, last_row + 1)
+        for column in range(first_column, last_column + 1)
+    ]
+
+
+def polygon_box(points):
+    """(min_lat, max_lat, min_lng, max_lng) of a polygon given as [lat, lng] points"""
+    lats = [lat for lat, lng in points]
+    lngs = [lng for lat, lng in points]
+    return min(lats), max(lats), min(lngs), max(lngs)
+
+
+def circle_box(lat, lng, radius_km):
+    return bounding_box(lat, lng, radius_km)
+
+
+def point_in_polygon(lat, lng, points):
+    """Even-odd ray casting test, treating coordinates as planar"""
+    inside = False
+    previous_lat, previous_lng = points[-1]
+    for point_lat, point_lng in points:
+        if (point_lat > lat) != (previous_lat > lat):
+            crossing_lng = point_lng + (lat - point_lat) * (previous_lng - point_lng) / (previous_lat - point_lat)
+            if lng < crossing_lng:
+                inside = not inside
+        previous_lat, previous_lng = point_lat, point_lng
+    return inside
+
+
+def area_covers(area, lat, lng):
+    """Exact test of whether a service area contains the point"""
+    if area.kind == 'circle':
+        return haversine_km(float(area.latitude), float(area.longitude), lat, lng) <= float(area.radius_km)
+    return point_in_polygon(lat, lng, area.polygon)
+
+
+def covering_areas(lat, lng, areas=None):
+    """Active service areas containing the point, looked up through the grid"""
+    from .models import ServiceArea
+
+    areas = areas if areas is not None else ServiceArea.objects.all()
+    candidates = areas.filter(
+        is_active=True,
+        cells__cell=cell_key(lat, lng),
+        min_latitude__lte=lat,
+        max_latitude__gte=lat,
+        min_longitude__lte=lng,
+        max_longitude__gte=lng
+    )
+    return [area for area in candidates if area_covers(area, lat, lng)]
+
+
+def covering_provider_ids(lat, lng):
+    """Ids of the providers with a service area containing the point"""
+    return {area.provider_id for area in covering_areas(lat, lng)}
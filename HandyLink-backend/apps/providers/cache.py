@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+
+class ProviderProfileCache:
+    """
+    Rendered provider profiles keyed by provider id and profile_version
+
+    Anything shown on the profile bumps Provider.profile_version in the same
+    database write or right after it, so a reader that sees the current
+    version can only ever hit a profile rendered at or after that version.
+    Old versions are never read again and simply expire.
+    """
+
+    @staticmethod
+    def key(provider_id, version, request=None):
+        # Document URLs are absolute, so profiles are cached per host
+        host = request.build_absolute_uri('/') if request is not None else ''
+        return f"provider-profile:{provider_id}:{version}:{host}"
+
+    @staticmethod
+    def get_or_render(provider_id, version, render, request=None):
+        """The cached profile for this version, rendering and storing it on a miss"""
+        key = ProviderProfileCache.key(provider_id, version, request)
+        data = cache.get(key)
+        if data is None:
+            data = render()
+            cache.set(key, data, settings.PROVIDER_PROFILE_CACHE_TIMEOUT)
+        return data
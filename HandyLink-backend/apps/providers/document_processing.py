@@ -0,0 +1,84 @@
+"""
+Post-processing of uploaded provider documents.
+
+These functions run in worker processes of the document processing pool, so
+they only take and return plain values: no Django settings, models or
+database connections. apps/providers/uploads.py stores the results.
+"""
+import os
+import re
+
+PDF_PAGE = re.compile(rb'/Type\s*/Page(?![a-zA-Z])')
+
+SIGNATURES = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+]
+
+
+def sniff_content_type(head):
+    """Content type from the first bytes of a file, None if not a supported type"""
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def pdf_page_count(path):
+    """
+    Number of page objects in a PDF, None if they cannot be counted because
+    they are inside compressed object streams
+    """
+    with open(path, 'rb') as f:
+        count = len(PDF_PAGE.findall(f.read()))
+    return count or None
+
+
+def make_thumbnail(path, thumbnail_path, size):
+    """Write a PNG thumbnail of an image at most size x size pixels"""
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image.thumbnail((size, size))
+        os.makedirs(os.path.dirname(thumbnail_path), exist_ok=True)
+        partial_path = f'{thumbnail_path}.partial'
+        image.save(partial_path, format='PNG')
+    os.replace(partial_path, thumbnail_path)
+
+
+def process_document(path, thumbnail_path, max_size, max_pages, thumbnail_size):
+    """
+    Check a stored document and thumbnail it, returning a dict with
+    content_type, page_count, thumbnail (True if written) and error (empty
+    when the document is accepted)
+    """
+    result = {'content_type': '', 'page_count': None, 'thumbnail': False, 'error': ''}
+
+    if os.path.getsize(path) > max_size:
+        result['error'] = f'The document is larger than {max_size} bytes.'
+        return result
+
+    with open(path, 'rb') as f:
+        content_type = sniff_content_type(f.read(16))
+    if content_type is None:
+        result['error'] = 'Unsupported file type, upload a PDF, PNG, JPEG or WebP file.'
+        return result
+    result['content_type'] = content_type
+
+    if content_type == 'application/pdf':
+        result['page_count'] = pdf_page_count(path)
+        if result['page_count'] and result['page_count'] > max_pages:
+            result['error'] = f'The document has more than {max_pages} pages.'
+        return result
+
+    result['page_count'] = 1
+    try:
+        make_thumbnail(path, thumbnail_path, thumbnail_size)
+    except Exception as e:
+        result['error'] = f'The image could not be read: {e}'
+        return result
+    result['thumbnail'] = True
+    return result
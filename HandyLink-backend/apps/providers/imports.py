@@ -0,0 +1,189 @@
+"""
+Bulk provider onboarding from CSV or XLSX files.
+
+Rows are streamed from the file and handled in batches: each batch is
+validated, its users and categories are looked up with one query each, and
+its providers and services are created with one bulk insert each in a
+single transaction. Memory use depends on the batch size, not the file.
+
+Each row names an existing, verified user by email and the provider's
+details, optionally with one service in the service_* columns. Later rows
+with the same email only add services to the provider the first one
+created.
+"""
+import csv
+import io
+import logging
+import time
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from apps.jobs.models import JobCategory
+from .models import Provider, ProviderService
+from .serializers import ProviderImportRowSerializer
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+PROVIDER_FIELDS = (
+    'business_name', 'provider_type', 'description', 'website',
+    'phone_number', 'address', 'latitude', 'longitude'
+)
+
+class ImportResult:
+    """Counts, per-row errors and timing of an import"""
+
+    def __init__(self):
+        self.rows = 0
+        self.providers = 0
+        self.services = 0
+        self.error_count = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        # Keep memory bounded when a whole file is wrong
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+def read_rows(file, filename):
+    """
+    Yield (row number, row dict) from a binary CSV or XLSX file without
+    loading it, row numbers counting the header as row 1
+    """
+    if filename.lower().endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name or '').strip().lower() for name in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                yield number, dict(zip(header, ('' if value is None else value for value in values)))
+        finally:
+            workbook.close()
+        return
+
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    header = [name.strip().lower() for name in next(reader, [])]
+    for number, values in enumerate(reader, start=2):
+        yield number, dict(zip(header, values))
+
+def _clean(row):
+    """Drop empty cells so optional columns fall back to their defaults"""
+    cleaned = {}
+    for name, value in row.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value != '' and name:
+            cleaned[name] = value
+    return cleaned
+
+def _error_message(errors):
+    return '; '.join(
+        f"{field}: {' '.join(str(message) for message in messages)}" if field != 'non_field_errors'
+        else ' '.join(str(message) for message in messages)
+        for field, messages in errors.items()
+    )
+
+class ProviderImporter:
+    """Imports batches of rows, remembering the providers created so far"""
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.result = ImportResult()
+        # Email to provider id of the providers created by this import
+        self.imported = {}
+
+    def run(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        result = self.result
+        result.elapsed = time.monotonic() - result.started
+        logger.info(
+            f"Imported {result.providers} providers and {result.services} services from {result.rows} rows "
+            f"in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s), {result.error_count} errors"
+        )
+        return result
+
+    def import_batch(self, batch):
+        result = self.result
+        result.rows += len(batch)
+
+        valid = []
+        for number, row in batch:
+            serializer = ProviderImportRowSerializer(data=_clean(row))
+            if serializer.is_valid():
+                valid.append((number, serializer.validated_data))
+            else:
+                result.add_error(number, _error_message(serializer.errors))
+
+        emails = {data['email'] for number, data in valid if data['email'] not in self.imported}
+        users = {
+            user.email: user
+            for user in User.objects.filter(email__in=emails).select_related('provider_profile')
+        } if emails else {}
+        category_ids = {data['service_category'] for number, data in valid if 'service_category' in data}
+        categories = JobCategory.objects.in_bulk(category_ids) if category_ids else {}
+
+        providers = {}
+        services = []
+        for number, data in valid:
+            email = data['email']
+            if email not in self.imported and email not in providers:
+                user = users.get(email)
+                if user is None:
+                    result.add_error(number, f'No user with the email {email}.')
+                    continue
+                if not user.is_verified:
+                    result.add_error(number, 'The user email must be verified before becoming a provider.')
+                    continue
+                if hasattr(user, 'provider_profile'):
+                    result.add_error(number, 'The user is already registered as a provider.')
+                    continue
+                providers[email] = Provider(user=user, **{field: data[field] for field in PROVIDER_FIELDS if field in data})
+
+            if data.get('service_name'):
+                category_id = data.get('service_category')
+                if category_id is not None and category_id not in categories:
+                    result.add_error(number, f'Unknown service category {category_id}.')
+                    continue
+                services.append((email, ProviderService(
+                    name=data['service_name'],
+                    description=data['service_description'],
+                    price=data['service_price'],
+                    duration=data['service_duration'],
+                    category_id=category_id
+                )))
+
+        with transaction.atomic():
+            Provider.objects.bulk_create(providers.values())
+            self.imported.update((email, provider.id) for email, provider in providers.items())
+            for email, service in services:
+                service.provider_id = self.imported[email]
+            ProviderService.objects.bulk_create([service for email, service in services])
+
+        result.providers += len(providers)
+        result.services += len(services)
+
+def import_providers(file, filename, batch_size=BATCH_SIZE):
+    """Import providers and services from a binary CSV or XLSX file, returning the ImportResult"""
+    return ProviderImporter(batch_size).run(read_rows(file, filename))
@@ -0,0 +1,43 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.providers.imports import BATCH_SIZE, import_providers
+
+
+class Command(BaseCommand):
+    help = 'Import providers and their services from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file to import')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Rows validated and inserted per batch'
+        )
+        parser.add_argument(
+            '--errors-file',
+            help='Write the rows that failed and why to this CSV file'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as f:
+                result = import_providers(f, options['path'], options['batch_size'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        if options['errors_file']:
+            with open(options['errors_file'], 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['row', 'error'])
+                writer.writerows(result.errors)
+        else:
+            for row_number, message in result.errors:
+                self.stderr.write(f'Row {row_number}: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'Only the first {len(result.errors)} of {result.error_count} errors are reported.')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.providers} providers and {result.services} services from {result.rows} rows '
+            f'in {result.elapsed:.1f}s ({result.rows_per_second:.0f} rows/s), {result.error_count} errors'
+        ))
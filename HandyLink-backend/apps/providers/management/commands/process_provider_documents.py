@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.providers.uploads import DocumentProcessingPool, DocumentUploadService
+
+
+class Command(BaseCommand):
+    help = 'Process documents left pending and delete abandoned document uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending-minutes', type=int, default=10,
+            help='Process documents still pending after this many minutes'
+        )
+        parser.add_argument(
+            '--expire-hours', type=int, default=24,
+            help='Delete unfinished uploads untouched for this many hours'
+        )
+
+    def handle(self, *args, **options):
+        processed = DocumentProcessingPool.process_pending(options['pending_minutes'])
+        expired = DocumentUploadService.expire_uploads(options['expire_hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} pending documents and deleted {expired} abandoned uploads'
+        ))
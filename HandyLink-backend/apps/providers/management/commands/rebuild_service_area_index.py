@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.providers.models import ServiceArea
+
+
+class Command(BaseCommand):
+    help = 'Recompute the bounding boxes and grid cells of every service area'
+
+    def handle(self, *args, **options):
+        count = 0
+        for area in ServiceArea.objects.iterator(chunk_size=500):
+            with transaction.atomic():
+                # save() recomputes the bounding box and registers the grid cells
+                area.save(update_fields=['min_latitude', 'max_latitude', 'min_longitude', 'max_longitude'])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the grid index of {count} service areas'))
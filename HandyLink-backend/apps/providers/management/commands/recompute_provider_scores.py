@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.providers.services import ProviderRankingService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the precomputed search ranking score of every provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=ProviderRankingService.CHUNK_SIZE,
+            help='Providers read and updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = ProviderRankingService.recompute_scores(options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed ranking scores of {count} providers in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.providers.trust import CHUNK_SIZE, recompute_trust_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trust score of every provider, meant to run nightly'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Providers written per bulk update'
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            count, timings = recompute_trust_scores(options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        for stage, seconds in timings.items():
+            self.stdout.write(f'{stage:<16}{seconds:8.2f}s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed trust scores of {count} providers in {time.monotonic() - started:.2f}s'
+        ))
@@ -1,6 +1,11 @@
-from django.db import models
+import uuid
+from datetime import timedelta
+
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
+from .areas import cells_for_box, circle_box, polygon_box
+
 User = get_user_model()
 
 class Provider(models.Model):
@@ -24,18 +29,58 @@ class Provider(models.Model):
     website = models.URLField(blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
     address = models.TextField(blank=True)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     is_verified = models.BooleanField(default=False)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.00)
     total_reviews = models.PositiveIntegerField(default=0)
+    ranking_score = models.FloatField(
+        default=0, editable=False,
+        help_text="Precomputed search ranking, refreshed by the recompute_provider_scores command"
+    )
+    ranking_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    trust_score = models.FloatField(
+        default=0, editable=False,
+        help_text="Nightly trust score in 0..1, refreshed by the recompute_trust_scores command"
+    )
+    trust_score_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    profile_version = models.PositiveIntegerField(
+        default=0, editable=False,
+        help_text="Bumped whenever anything shown on the profile changes, keys the profile cache"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'is_verified']),
+            models.Index(fields=['status', 'is_verified', '-ranking_score']),
+        ]
+    
     def __str__(self):
         return f"{self.business_name} ({self.user.email})"
+    
+    def save(self, *args, **kwargs):
+        if self.pk:
+            # Bump in SQL so a stale in-memory counter is never written back
+            self.profile_version = models.F('profile_version') + 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'profile_version'}
+        super().save(*args, **kwargs)
+        if self.pk and isinstance(self.profile_version, models.expressions.Combinable):
+            self.refresh_from_db(fields=['profile_version'])
+    
+    @classmethod
+    def bump_profile_version(cls, provider_id):
+        """Invalidate the cached profile after changes that bypass save()"""
+        cls.objects.filter(pk=provider_id).update(profile_version=models.F('profile_version') + 1)
 
 class ProviderService(models.Model):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='services')
+    category = models.ForeignKey(
+        'jobs.JobCategory', on_delete=models.SET_NULL, null=True, blank=True, related_name='provider_services'
+    )
     name = models.CharField(max_length=255)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -43,9 +88,47 @@ class ProviderService(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', 'is_active']),
+        ]
+    
     def __str__(self):
         return f"{self.name} - {self.provider.business_name}"
 
+class DocumentBlob(models.Model):
+    """
+    Stored document content, addressed by its SHA-256
+
+    Identical uploads share one blob and one file, stored under
+    provider_documents/sha256/<2 hex>/<2 hex>/<hash> so no directory grows
+    too large. The file is checked and thumbnailed in the background.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('rejected', 'Rejected'),
+    ]
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
 class ProviderDocument(models.Model):
     DOCUMENT_TYPES = [
         ('license', 'Business License'),
@@ -56,11 +139,177 @@ class ProviderDocument(models.Model):
     
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='documents')
     document_type = models.CharField(max_length=20, choices=DOCUMENT_TYPES)
-    document_file = models.FileField(upload_to='provider_documents/')
+    document_file = models.FileField(upload_to='provider_documents/', max_length=255)
+    blob = models.ForeignKey(
+        DocumentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='documents'
+    )
+    original_filename = models.CharField(max_length=255, blank=True)
     is_verified = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"{self.provider.business_name} - {self.document_type}"
 
+class DocumentUpload(models.Model):
+    """
+    A resumable chunked upload of a provider document
+
+    Chunks are appended to a partial file in PROVIDER_UPLOAD_TEMP_DIR and
+    received_size only advances once a chunk is on disk, so a client that
+    lost a response resumes from received_size.
+    """
+    STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='document_uploads')
+    document_type = models.CharField(max_length=20, choices=ProviderDocument.DOCUMENT_TYPES)
+    filename = models.CharField(max_length=255)
+    total_size = models.PositiveBigIntegerField()
+    received_size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
+    document = models.OneToOneField(
+        ProviderDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received_size}/{self.total_size} bytes)"
+
+class ServiceArea(models.Model):
+    """
+    An area a provider serves, a circle or a polygon of [lat, lng] points
+
+    The bounding box is stored with the area and the area is registered in
+    the grid cells the box overlaps (ServiceAreaCell), so the areas covering
+    a point are found with an indexed lookup, see apps/providers/areas.py.
+    """
+    KIND_CHOICES = [
+        ('circle', 'Circle'),
+        ('polygon', 'Polygon'),
+    ]
+    
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='service_areas')
+    name = models.CharField(max_length=100)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    radius_km = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    polygon = models.JSONField(default=list, blank=True, help_text="[[lat, lng], ...] for polygon areas")
+    min_latitude = models.FloatField(editable=False)
+    max_latitude = models.FloatField(editable=False)
+    min_longitude = models.FloatField(editable=False)
+    max_longitude = models.FloatField(editable=False)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} - {self.provider.business_name}"
+    
+    def bounding_box(self):
+        if self.kind == 'circle':
+            return circle_box(float(self.latitude), float(self.longitude), float(self.radius_km))
+        return polygon_box(self.polygon)
+    
+    def save(self, *args, **kwargs):
+        (
+            self.min_latitude, self.max_latitude,
+            self.min_longitude, self.max_longitude
+        ) = self.bounding_box()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.rebuild_cells()
+    
+    def rebuild_cells(self):
+        """Register the area in the grid cells its bounding box overlaps"""
+        self.cells.all().delete()
+        ServiceAreaCell.objects.bulk_create([
+            ServiceAreaCell(area=self, cell=cell)
+            for cell in cells_for_box(self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude)
+        ])
+
+class ServiceAreaCell(models.Model):
+    """A grid cell a service area's bounding box overlaps"""
+    area = models.ForeignKey(ServiceArea, on_delete=models.CASCADE, related_name='cells')
+    cell = models.IntegerField(db_index=True)
+    
+    class Meta:
+        unique_together = ['area', 'cell']
+    
+    def __str__(self):
+        return f"{self.area_id} in cell {self.cell}"
 
+class ProviderAvailability(models.Model):
+    """A weekly recurring window in which a provider takes bookings"""
+    WEEKDAYS = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='availability')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAYS)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    
+    class Meta:
+        verbose_name_plural = 'Provider availability'
+        ordering = ['weekday', 'start_time']
+        indexes = [
+            models.Index(fields=['weekday', 'start_time', 'end_time']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider.business_name} {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+class Booking(models.Model):
+    """
+    A customer's booking of a provider for a time slot
+
+    Bookings are at most MAX_DURATION long, so every booking overlapping a
+    window starts less than MAX_DURATION before it: conflict checks and
+    "who is free" queries are range scans on the start index.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = ('pending', 'confirmed')
+    MAX_DURATION = timedelta(hours=12)
+    
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='bookings')
+    customer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='provider_bookings')
+    service = models.ForeignKey(ProviderService, on_delete=models.SET_NULL, null=True, blank=True, related_name='bookings')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['start']
+        indexes = [
+            models.Index(fields=['provider', 'start']),
+            models.Index(fields=['start', 'end']),
+        ]
+    
+    def __str__(self):
+        return f"{self.provider.business_name} booked {self.start:%Y-%m-%d %H:%M}-{self.end:%H:%M}"
@@ -0,0 +1,7 @@
+from rest_framework.pagination import PageNumberPagination
+
+class ProviderPagination(PageNumberPagination):
+    """Page number pagination for provider listings, ?page_size= up to 100"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -1,17 +1,40 @@
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Provider, ProviderService, ProviderDocument
+from .models import (
+    Provider, ProviderService, ProviderDocument, DocumentUpload, ServiceArea, ProviderAvailability, Booking
+)
 from apps.users.serializers import UserSerializer
 
 class ProviderDocumentSerializer(serializers.ModelSerializer):
+    processing_status = serializers.CharField(source='blob.status', read_only=True, default=None)
+    content_type = serializers.CharField(source='blob.content_type', read_only=True, default=None)
+    page_count = serializers.IntegerField(source='blob.page_count', read_only=True, default=None)
+    thumbnail = serializers.FileField(source='blob.thumbnail', read_only=True, default=None)
+    
     class Meta:
         model = ProviderDocument
-        fields = ['id', 'document_type', 'document_file', 'is_verified', 'uploaded_at']
+        fields = [
+            'id', 'document_type', 'document_file', 'original_filename', 'processing_status',
+            'content_type', 'page_count', 'thumbnail', 'is_verified', 'uploaded_at'
+        ]
         read_only_fields = ['is_verified', 'uploaded_at']
 
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    document = ProviderDocumentSerializer(read_only=True)
+    
+    class Meta:
+        model = DocumentUpload
+        fields = [
+            'id', 'document_type', 'filename', 'total_size', 'received_size',
+            'status', 'document', 'created_at'
+        ]
+        read_only_fields = ['received_size', 'status', 'created_at']
+
 class ProviderServiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProviderService
-        fields = ['id', 'name', 'description', 'price', 'duration', 'is_active', 'created_at']
+        fields = ['id', 'name', 'description', 'category', 'price', 'duration', 'is_active', 'created_at']
         read_only_fields = ['created_at']
 
 class ProviderRegistrationSerializer(serializers.ModelSerializer):
@@ -22,7 +45,7 @@ class ProviderRegistrationSerializer(serializers.ModelSerializer):
         model = Provider
         fields = [
             'user_email', 'business_name', 'provider_type', 'description', 
-            'website', 'phone_number', 'address', 'services'
+            'website', 'phone_number', 'address', 'latitude', 'longitude', 'services'
         ]
     
     def validate_user_email(self, value):
@@ -64,11 +87,152 @@ class ProviderSerializer(serializers.ModelSerializer):
         model = Provider
         fields = [
             'id', 'user_email', 'user_name', 'business_name', 'provider_type', 'description',
-            'website', 'phone_number', 'address', 'status', 'is_verified',
+            'website', 'phone_number', 'address', 'latitude', 'longitude', 'status', 'is_verified',
             'rating', 'total_reviews', 'services', 'documents',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['status', 'is_verified', 'rating', 'total_reviews', 'created_at', 'updated_at']
     
     def get_user_name(self, obj):
-        return f"{obj.user.first_name} {obj.user.last_name}".strip()
\ No newline at end of file
+        return f"{obj.user.first_name} {obj.user.last_name}".strip()
+
+class ProviderServiceSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProviderService
+        fields = ['id', 'name', 'price', 'duration']
+
+class ProviderListSerializer(serializers.ModelSerializer):
+    """
+    Compact provider representation for listings
+
+    Expects the queryset to select the user and prefetch active services
+    into `active_services`, so a page costs a fixed number of queries.
+    """
+    user_name = serializers.SerializerMethodField()
+    services = ProviderServiceSummarySerializer(source='active_services', many=True, read_only=True)
+    
+    class Meta:
+        model = Provider
+        fields = [
+            'id', 'user_name', 'business_name', 'provider_type', 'address',
+            'latitude', 'longitude', 'rating', 'total_reviews', 'ranking_score', 'services'
+        ]
+    
+    def get_user_name(self, obj):
+        return f"{obj.user.first_name} {obj.user.last_name}".strip()
+
+class ProviderAvailabilitySerializer(serializers.ModelSerializer):
+    weekday_name = serializers.CharField(source='get_weekday_display', read_only=True)
+    
+    class Meta:
+        model = ProviderAvailability
+        fields = ['id', 'weekday', 'weekday_name', 'start_time', 'end_time']
+    
+    def validate(self, data):
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time >= end_time:
+            raise serializers.ValidationError("Availability must end after it starts.")
+        return data
+
+class ServiceAreaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ServiceArea
+        fields = ['id', 'name', 'kind', 'latitude', 'longitude', 'radius_km', 'polygon', 'is_active', 'created_at']
+        read_only_fields = ['created_at']
+    
+    def validate_polygon(self, value):
+        if not value:
+            return []
+        if not isinstance(value, list) or not 3 <= len(value) <= 200:
+            raise serializers.ValidationError("A polygon needs between 3 and 200 [lat, lng] points.")
+        points = []
+        for point in value:
+            try:
+                lat, lng = (float(coordinate) for coordinate in point)
+            except (TypeError, ValueError):
+                raise serializers.ValidationError("Each polygon point must be a [lat, lng] pair of numbers.")
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                raise serializers.ValidationError("Polygon points must be valid coordinates.")
+            points.append([lat, lng])
+        return points
+    
+    def validate(self, data):
+        def current(field):
+            return data.get(field, getattr(self.instance, field, None))
+        
+        kind = current('kind')
+        if kind == 'circle':
+            if None in (current('latitude'), current('longitude'), current('radius_km')):
+                raise serializers.ValidationError("A circle needs latitude, longitude and radius_km.")
+            if not 0 < current('radius_km') <= settings.SERVICE_AREA_MAX_RADIUS_KM:
+                raise serializers.ValidationError(
+                    f"radius_km must be between 0 and {settings.SERVICE_AREA_MAX_RADIUS_KM}."
+                )
+            data['polygon'] = []
+        else:
+            polygon = current('polygon')
+            if not polygon:
+                raise serializers.ValidationError("A polygon area needs its polygon points.")
+            lats = [lat for lat, lng in polygon]
+            lngs = [lng for lat, lng in polygon]
+            if max(max(lats) - min(lats), max(lngs) - min(lngs)) > settings.SERVICE_AREA_MAX_SPAN_DEGREES:
+                raise serializers.ValidationError(
+                    f"A polygon may span at most {settings.SERVICE_AREA_MAX_SPAN_DEGREES} degrees."
+                )
+            data['latitude'] = data['longitude'] = data['radius_km'] = None
+        return data
+
+class BookingSerializer(serializers.ModelSerializer):
+    provider_name = serializers.CharField(source='provider.business_name', read_only=True)
+    customer_name = serializers.SerializerMethodField()
+    service_name = serializers.CharField(source='service.name', read_only=True, default=None)
+    
+    class Meta:
+        model = Booking
+        fields = [
+            'id', 'provider', 'provider_name', 'customer', 'customer_name', 'service',
+            'service_name', 'start', 'end', 'status', 'notes', 'created_at'
+        ]
+        read_only_fields = ['customer', 'status', 'created_at']
+    
+    def get_customer_name(self, obj):
+        return f"{obj.customer.first_name} {obj.customer.last_name}".strip()
+    
+    def validate(self, data):
+        provider = data['provider']
+        if provider.status != 'approved' or not provider.is_verified:
+            raise serializers.ValidationError("This provider cannot be booked.")
+        if data.get('service') and data['service'].provider_id != provider.id:
+            raise serializers.ValidationError("The service does not belong to this provider.")
+        if data['start'] <= timezone.now():
+            raise serializers.ValidationError("A booking must start in the future.")
+        return data
+
+class ProviderImportRowSerializer(serializers.Serializer):
+    """
+    One row of a provider import file, validated without queries
+
+    Users and categories are looked up for a whole batch of rows in
+    apps/providers/imports.py. The service columns are optional, rows of
+    the same email after the first only add services.
+    """
+    email = serializers.EmailField()
+    business_name = serializers.CharField(max_length=255)
+    provider_type = serializers.ChoiceField(choices=Provider.PROVIDER_TYPES, default='individual')
+    description = serializers.CharField(required=False, default='')
+    website = serializers.URLField(required=False, default='')
+    phone_number = serializers.CharField(max_length=20, required=False, default='')
+    address = serializers.CharField(required=False, default='')
+    latitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
+    longitude = serializers.DecimalField(max_digits=9, decimal_places=6, required=False)
+    service_name = serializers.CharField(max_length=255, required=False)
+    service_description = serializers.CharField(required=False, default='')
+    service_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    service_duration = serializers.IntegerField(min_value=1, required=False)
+    service_category = serializers.IntegerField(min_value=1, required=False)
+    
+    def validate(self, data):
+        if data.get('service_name') and ('service_price' not in data or 'service_duration' not in data):
+            raise serializers.ValidationError("A service needs a price and a duration.")
+        return data
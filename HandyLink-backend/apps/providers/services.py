@@ -0,0 +1,278 @@
+import logging
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.jobs.models import ArchivedJob, ArchivedJobApplication, Job, JobApplication
+from apps.payments.models import Payment, PayoutRequest
+from .models import Booking, Provider, ProviderAvailability
+
+logger = logging.getLogger(__name__)
+
+class ProviderRankingService:
+    """
+    Precompute the provider search ranking score
+
+    The score blends three factors in 0..1, weighted by
+    PROVIDER_RANKING_WEIGHTS:
+
+    - rating: the Bayesian average of the provider's rating, pulled towards
+      the site-wide mean by PROVIDER_RATING_PRIOR_REVIEWS phantom reviews,
+      so one 5-star review does not outrank a hundred 4.8-star ones
+    - completion: smoothed share of assigned jobs completed, not cancelled
+    - recency: halves every PROVIDER_RECENCY_HALF_LIFE_DAYS since the last
+      completed job
+
+    Jobs moved to the archive tables count like live ones.
+
+    Scores are written to the indexed Provider.ranking_score column in batch,
+    so searches order by an index instead of computing anything per request.
+    """
+
+    CHUNK_SIZE = 1000
+
+    @staticmethod
+    def site_mean_rating():
+        """Review-weighted mean rating over all providers, 0 if nobody has reviews"""
+        totals = Provider.objects.filter(total_reviews__gt=0).aggregate(
+            weighted=Sum(F('rating') * F('total_reviews')),
+            reviews=Sum('total_reviews')
+        )
+        if not totals['reviews']:
+            return 0.0
+        return float(totals['weighted']) / totals['reviews']
+
+    @staticmethod
+    def score(rating, total_reviews, completed, cancelled, last_completed_at, mean_rating, now):
+        """Ranking score of one provider from its raw figures"""
+        weights = settings.PROVIDER_RANKING_WEIGHTS
+        prior = settings.PROVIDER_RATING_PRIOR_REVIEWS
+
+        bayesian_rating = (prior * mean_rating + float(rating) * total_reviews) / (prior + total_reviews)
+        completion = (completed + 1.0) / (completed + cancelled + 2.0)
+        if last_completed_at:
+            days = max((now - last_completed_at).total_seconds() / 86400, 0.0)
+            recency = 0.5 ** (days / settings.PROVIDER_RECENCY_HALF_LIFE_DAYS)
+        else:
+            recency = 0.0
+
+        return round(
+            weights['rating'] * bayesian_rating / 5.0 +
+            weights['completion'] * completion +
+            weights['recency'] * recency,
+            6
+        )
+
+    @staticmethod
+    def recompute_scores(chunk_size=CHUNK_SIZE):
+        """Recompute every provider's ranking score, returning the number updated"""
+        now = timezone.now()
+        mean_rating = ProviderRankingService.site_mean_rating()
+        count = IntegerField()
+        annotations = {}
+        for prefix, jobs in (('', Job.objects.all()), ('archived_', ArchivedJob.objects.all())):
+            annotations.update({
+                f'{prefix}completed_jobs': _total(jobs, 'assigned_to', Count('id', filter=Q(status='completed')), count),
+                f'{prefix}cancelled_jobs': _total(jobs, 'assigned_to', Count('id', filter=Q(status='cancelled')), count),
+                f'{prefix}last_completed_at': Subquery(
+                    jobs.filter(assigned_to=OuterRef('pk'), status='completed')
+                    .order_by('-updated_at').values('updated_at')[:1]
+                ),
+            })
+        providers = Provider.objects.annotate(**annotations).only('id', 'rating', 'total_reviews').order_by('id')
+
+        updated = 0
+        batch = []
+        for provider in providers.iterator(chunk_size=chunk_size):
+            last_completed_at = max(
+                filter(None, (provider.last_completed_at, provider.archived_last_completed_at)), default=None
+            )
+            provider.ranking_score = ProviderRankingService.score(
+                provider.rating, provider.total_reviews,
+                provider.completed_jobs + provider.archived_completed_jobs,
+                provider.cancelled_jobs + provider.archived_cancelled_jobs,
+                last_completed_at, mean_rating, now
+            )
+            provider.ranking_updated_at = now
+            batch.append(provider)
+            if len(batch) >= chunk_size:
+                updated += ProviderRankingService._save_scores(batch)
+                batch = []
+        if batch:
+            updated += ProviderRankingService._save_scores(batch)
+
+        logger.info(f"Recomputed ranking scores of {updated} providers")
+        return updated
+
+    @staticmethod
+    def _save_scores(providers):
+        with transaction.atomic():
+            Provider.objects.bulk_update(providers, ['ranking_score', 'ranking_updated_at'])
+        return len(providers)
+
+class BookingUnavailable(Exception):
+    """The requested slot is invalid, outside availability or already booked"""
+
+class BookingService:
+    """
+    Provider bookings with conflict detection
+
+    Bookings are at most Booking.MAX_DURATION long, so the bookings that
+    overlap a window are the ones starting in (window start - MAX_DURATION,
+    window end) and ending after the window starts: a bounded range scan on
+    the start index rather than a scan of every booking. The same predicate
+    answers "who is free" for all providers in one query.
+    """
+
+    @staticmethod
+    def overlapping(start, end):
+        """Active bookings overlapping [start, end)"""
+        return Booking.objects.filter(
+            status__in=Booking.ACTIVE_STATUSES,
+            start__gt=start - Booking.MAX_DURATION,
+            start__lt=end,
+            end__gt=start
+        )
+
+    @staticmethod
+    def local_window(start, end):
+        """(weekday, start time, end time) of a slot in local time"""
+        if end <= start:
+            raise BookingUnavailable('The slot must end after it starts.')
+        if end - start > Booking.MAX_DURATION:
+            raise BookingUnavailable(f'A slot can be at most {Booking.MAX_DURATION} long.')
+        local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+        if local_start.date() != local_end.date():
+            raise BookingUnavailable('The slot must start and end on the same day.')
+        return local_start.weekday(), local_start.time(), local_end.time()
+
+    @staticmethod
+    def covering_availability(start, end):
+        """Availability windows containing the slot"""
+        weekday, start_time, end_time = BookingService.local_window(start, end)
+        return ProviderAvailability.objects.filter(
+            weekday=weekday,
+            start_time__lte=start_time,
+            end_time__gte=end_time
+        )
+
+    @staticmethod
+    def available_providers(start, end, providers=None):
+        """Providers whose availability covers the slot and who have no booking in it"""
+        providers = providers if providers is not None else Provider.objects.filter(status='approved', is_verified=True)
+        return providers.filter(
+            Exists(BookingService.covering_availability(start, end).filter(provider=OuterRef('pk')))
+        ).exclude(
+            Exists(BookingService.overlapping(start, end).filter(provider=OuterRef('pk')))
+        )
+
+    @staticmethod
+    def create_booking(customer, provider, start, end, service=None, notes=''):
+        """
+        Book a provider for a slot, raising BookingUnavailable if the slot is
+        outside their availability or overlaps another booking
+        """
+        covering = BookingService.covering_availability(start, end)
+        with transaction.atomic():
+            # Serialise bookings of one provider so a slot cannot be taken twice
+            Provider.objects.select_for_update().filter(pk=provider.pk).first()
+            if not covering.filter(provider=provider).exists():
+                raise BookingUnavailable('The provider is not available at this time.')
+            if BookingService.overlapping(start, end).filter(provider=provider).exists():
+                raise BookingUnavailable('The provider is already booked at this time.')
+            return Booking.objects.create(
+                provider=provider,
+                customer=customer,
+                service=service,
+                start=start,
+                end=end,
+                notes=notes
+            )
+
+def _total(queryset, provider_field, aggregate, output_field):
+    """Correlated subquery of an aggregate over the current provider's rows, 0 if none"""
+    rows = queryset.filter(**{provider_field: OuterRef('pk')}).order_by().values(provider_field)
+    zero = Decimal('0.00') if isinstance(output_field, DecimalField) else 0
+    return Coalesce(Subquery(rows.annotate(total=aggregate).values('total')), zero, output_field=output_field)
+
+class ProviderDashboardService:
+    """
+    Figures for a provider's home screen in one query
+
+    Each figure is a correlated subquery with a filtered aggregate, so the
+    whole dashboard is a single SELECT on the provider row. Results are
+    cached per user for PROVIDER_DASHBOARD_CACHE_TIMEOUT seconds.
+    """
+
+    PENDING_PAYOUT_STATUSES = ('pending', 'approved', 'processing')
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"provider-dashboard:{user_id}"
+
+    @staticmethod
+    def dashboard_queryset():
+        money = DecimalField(max_digits=12, decimal_places=2)
+        count = IntegerField()
+        payouts = PayoutRequest.objects.all()
+        applications = JobApplication.objects.all()
+        archived_applications = ArchivedJobApplication.objects.all()
+        return Provider.objects.annotate(
+            earnings_to_date=_total(
+                Payment.objects.filter(status='completed'), 'provider', Sum('provider_amount'), money
+            ),
+            pending_payouts=_total(
+                payouts, 'provider',
+                Sum('amount', filter=Q(status__in=ProviderDashboardService.PENDING_PAYOUT_STATUSES)), money
+            ),
+            paid_out=_total(payouts, 'provider', Sum('amount', filter=Q(status='completed')), money),
+            active_jobs=_total(Job.objects.filter(status='in_progress'), 'assigned_to', Count('id'), count),
+            completed_jobs=(
+                _total(Job.objects.filter(status='completed'), 'assigned_to', Count('id'), count) +
+                _total(ArchivedJob.objects.filter(status='completed'), 'assigned_to', Count('id'), count)
+            ),
+            open_applications=_total(applications, 'provider', Count('id', filter=Q(status='pending')), count),
+            accepted_applications=(
+                _total(applications, 'provider', Count('id', filter=Q(status='accepted')), count) +
+                _total(archived_applications, 'provider', Count('id', filter=Q(status='accepted')), count)
+            ),
+            decided_applications=(
+                _total(applications, 'provider', Count('id', filter=Q(status__in=('accepted', 'rejected'))), count) +
+                _total(archived_applications, 'provider', Count('id', filter=Q(status__in=('accepted', 'rejected'))), count)
+            )
+        )
+
+    @staticmethod
+    def compute(user):
+        """The dashboard of a user's provider profile, None if they are not a provider"""
+        provider = ProviderDashboardService.dashboard_queryset().filter(user=user).values(
+            'id', 'status', 'is_verified', 'rating', 'total_reviews', 'trust_score', 'earnings_to_date',
+            'pending_payouts', 'paid_out', 'active_jobs', 'completed_jobs', 'open_applications',
+            'accepted_applications', 'decided_applications'
+        ).first()
+        if provider is None:
+            return None
+
+        decided = provider.pop('decided_applications')
+        accepted = provider.pop('accepted_applications')
+        return {
+            'provider_id': provider.pop('id'),
+            **provider,
+            'win_rate': round(accepted / decided, 4) if decided else None,
+            'generated_at': timezone.now(),
+        }
+
+    @staticmethod
+    def get(user):
+        key = ProviderDashboardService.cache_key(user.id)
+        dashboard = cache.get(key)
+        if dashboard is None:
+            dashboard = ProviderDashboardService.compute(user)
+            if dashboard is not None:
+                cache.set(key, dashboard, settings.PROVIDER_DASHBOARD_CACHE_TIMEOUT)
+        return dashboard
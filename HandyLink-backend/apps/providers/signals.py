@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Provider, ProviderService, ProviderDocument
+
+User = get_user_model()
+
+PROFILE_USER_FIELDS = {'email', 'first_name', 'last_name'}
+
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+@receiver(post_save, sender=ProviderDocument)
+@receiver(post_delete, sender=ProviderDocument)
+def invalidate_provider_profile(sender, instance, **kwargs):
+    """Services and documents are part of the cached provider profile"""
+    Provider.bump_profile_version(instance.provider_id)
+
+@receiver(post_save, sender=User)
+def invalidate_provider_profile_user(sender, instance, created, **kwargs):
+    """The profile shows the user's name and email"""
+    update_fields = kwargs.get('update_fields')
+    if created or (update_fields is not None and not PROFILE_USER_FIELDS & set(update_fields)):
+        return
+    Provider.objects.filter(user=instance).update(profile_version=models.F('profile_version') + 1)
@@ -1,3 +1,659 @@
-from django.test import TestCase
+import hashlib
+import io
+import shutil
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Provider, ProviderService, ProviderAvailability, DocumentBlob, ProviderDocument, ServiceArea
+from .areas import cell_key, covering_areas
+from .imports import import_providers
+from .services import BookingService
+from .trust import recompute_trust_scores
+
+User = get_user_model()
+
+
+def make_provider(email, **fields):
+    user = User.objects.create_user(
+        email=email, first_name='Test', last_name='Provider', password='pass1234'
+    )
+    fields = {
+        'business_name': email.split('@')[0],
+        'status': 'approved',
+        'is_verified': True,
+        **fields
+    }
+    return Provider.objects.create(user=user, **fields)
+
+
+class ProviderListTests(TestCase):
+    def setUp(self):
+        for i in range(30):
+            provider = make_provider(f'provider{i}@example.com')
+            ProviderService.objects.create(
+                provider=provider, name='Plumbing', description='Pipes and taps',
+                price=Decimal('50.00'), duration=60
+            )
+            ProviderService.objects.create(
+                provider=provider, name='Old service', description='No longer offered',
+                price=Decimal('10.00'), duration=30, is_active=False
+            )
+        make_provider('pending@example.com', status='pending')
+
+    def test_page_costs_three_queries(self):
+        with self.assertNumQueries(3):
+            response = APIClient().get(reverse('provider-list'), {'page_size': 25})
+        self.assertEqual(response.data['count'], 30)
+        self.assertEqual(len(response.data['results']), 25)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_compact_rows_list_only_active_services(self):
+        response = APIClient().get(reverse('provider-list'))
+        row = response.data['results'][0]
+        self.assertNotIn('documents', row)
+        self.assertEqual([service['name'] for service in row['services']], ['Plumbing'])
+        self.assertEqual(len(response.data['results']), 20)
+
+
+class ProviderSearchTests(TestCase):
+    def setUp(self):
+        from apps.jobs.models import JobCategory
+        self.home = JobCategory.objects.create(name='Home')
+        self.plumbing = JobCategory.objects.create(name='Plumbing', parent=self.home)
+        # Nairobi CBD, Westlands (about 4km) and Mombasa (about 440km)
+        self.veteran = make_provider(
+            'veteran@example.com', rating=Decimal('4.80'), total_reviews=120,
+            latitude=Decimal('-1.286389'), longitude=Decimal('36.817223')
+        )
+        self.newcomer = make_provider(
+            'newcomer@example.com', rating=Decimal('5.00'), total_reviews=1,
+            latitude=Decimal('-1.267'), longitude=Decimal('36.811')
+        )
+        self.far_away = make_provider(
+            'faraway@example.com', rating=Decimal('4.50'), total_reviews=40,
+            latitude=Decimal('-4.043'), longitude=Decimal('39.668')
+        )
+        for provider in (self.veteran, self.newcomer, self.far_away):
+            ProviderService.objects.create(
+                provider=provider, category=self.plumbing, name='Pipe repair',
+                description='Leaks and blockages', price=Decimal('50.00'), duration=60
+            )
+        ProviderService.objects.create(
+            provider=make_provider('electrician@example.com'), name='Wiring',
+            description='Sockets and lights', price=Decimal('80.00'), duration=60
+        )
+
+    def search(self, **params):
+        response = APIClient().get(reverse('provider-search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_bayesian_rating_outranks_single_review(self):
+        from .services import ProviderRankingService
+        self.assertEqual(ProviderRankingService.recompute_scores(), 4)
+        self.veteran.refresh_from_db()
+        self.newcomer.refresh_from_db()
+        self.assertGreater(self.veteran.ranking_score, self.newcomer.ranking_score)
+        self.assertEqual(self.search(service='pipe'), [self.veteran.id, self.newcomer.id, self.far_away.id])
+
+    def test_archived_jobs_keep_their_score(self):
+        from apps.jobs.archive import archive_finished_jobs
+        from apps.jobs.models import ArchivedJob, Job
+        from .services import ProviderRankingService
+
+        owner = User.objects.create_user(email='owner@example.com', first_name='Job', last_name='Owner', password='pass1234')
+        for job_status in ('completed', 'completed', 'cancelled'):
+            Job.objects.create(
+                title='Fix a leak', description='Kitchen sink.', category=self.plumbing, posted_by=owner,
+                budget_min=Decimal('20.00'), budget_max=Decimal('80.00'), location='Nairobi',
+                status=job_status, assigned_to=self.newcomer
+            )
+        Job.objects.update(updated_at=timezone.now() - timedelta(days=200))
+        ProviderRankingService.recompute_scores()
+        live_score = Provider.objects.get(pk=self.newcomer.pk).ranking_score
+
+        archive_finished_jobs(days=180)
+        self.assertEqual(ArchivedJob.objects.count(), 3)
+        ProviderRankingService.recompute_scores()
+        self.assertAlmostEqual(Provider.objects.get(pk=self.newcomer.pk).ranking_score, live_score, places=4)
+
+    def test_filters(self):
+        self.assertEqual(len(self.search(category=self.home.id)), 3)
+        self.assertEqual(self.search(min_rating='4.9'), [self.newcomer.id])
+        self.assertEqual(
+            sorted(self.search(latitude='-1.286389', longitude='36.817223', radius_km='10')),
+            sorted([self.veteran.id, self.newcomer.id])
+        )
+
+    def test_invalid_filters_are_rejected(self):
+        response = APIClient().get(reverse('provider-search'), {'latitude': '-1.28'})
+        self.assertEqual(response.status_code, 400)
+        response = APIClient().get(reverse('provider-search'), {'category': 999})
+        self.assertEqual(response.data, {'error': 'Unknown category.'})
+
+
+class BookingTests(TestCase):
+    def setUp(self):
+        from apps.jobs.models import JobCategory
+        self.plumbing = JobCategory.objects.create(name='Plumbing')
+        self.customer = User.objects.create_user(
+            email='customer@example.com', first_name='Test', last_name='Customer', password='pass1234'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+        self.providers = [make_provider(f'plumber{i}@example.com') for i in range(3)]
+        for provider in self.providers:
+            ProviderService.objects.create(
+                provider=provider, category=self.plumbing, name='Pipe repair',
+                description='Leaks', price=Decimal('50.00'), duration=60
+            )
+            # Saturdays 08:00-17:00
+            ProviderAvailability.objects.create(provider=provider, weekday=5, start_time=time(8), end_time=time(17))
+        # 2030-06-01 is a Saturday
+        self.start = timezone.make_aware(datetime(2030, 6, 1, 10))
+        self.end = timezone.make_aware(datetime(2030, 6, 1, 12))
+
+    def book(self, provider, start, end):
+        return self.client.post(reverse('booking-list-create'), {
+            'provider': provider.id, 'start': start.isoformat(), 'end': end.isoformat()
+        })
+
+    def test_overlapping_booking_is_rejected(self):
+        self.assertEqual(self.book(self.providers[0], self.start, self.end).status_code, 201)
+        overlapping = self.book(self.providers[0], self.start + timedelta(hours=1), self.end + timedelta(hours=1))
+        self.assertEqual(overlapping.status_code, 409)
+        self.assertEqual(overlapping.data, {'error': 'The provider is already booked at this time.'})
+        # Back to back is fine, a slot outside availability is not
+        self.assertEqual(self.book(self.providers[0], self.end, self.end + timedelta(hours=1)).status_code, 201)
+        late = self.book(self.providers[0], self.start + timedelta(hours=8), self.end + timedelta(hours=8))
+        self.assertEqual(late.status_code, 409)
+
+    def test_past_slot_is_rejected(self):
+        # 2020-06-06 is a Saturday, inside availability but already over
+        start = timezone.make_aware(datetime(2020, 6, 6, 10))
+        response = self.book(self.providers[0], start, start + timedelta(hours=2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['non_field_errors'], ['A booking must start in the future.'])
+
+    def test_who_is_free_in_one_query(self):
+        BookingService.create_booking(self.customer, self.providers[1], self.start + timedelta(hours=1), self.end)
+        cancelled = BookingService.create_booking(self.customer, self.providers[2], self.start, self.end)
+        cancelled.status = 'cancelled'
+        cancelled.save()
+
+        available = BookingService.available_providers(self.start, self.end).filter(
+            services__category=self.plumbing
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(sorted(p.id for p in available), [self.providers[0].id, self.providers[2].id])
+
+        response = APIClient().get(reverse('provider-search'), {
+            'category': self.plumbing.id, 'start': '2030-06-01T10:00:00', 'end': '2030-06-01T12:00:00'
+        })
+        self.assertEqual(sorted(row['id'] for row in response.data['results']), [self.providers[0].id, self.providers[2].id])
+        # A Sunday slot has nobody available
+        response = APIClient().get(reverse('provider-search'), {
+            'start': '2030-06-02T10:00:00', 'end': '2030-06-02T12:00:00'
+        })
+        self.assertEqual(response.data['results'], [])
+
+    def test_status_changes(self):
+        booking = BookingService.create_booking(self.customer, self.providers[0], self.start, self.end)
+        url = reverse('booking-status', args=[booking.id])
+        self.assertEqual(self.client.patch(url, {'status': 'confirmed'}).status_code, 403)
+
+        provider_client = APIClient()
+        provider_client.force_authenticate(self.providers[0].user)
+        self.assertEqual(provider_client.patch(url, {'status': 'confirmed'}).data['status'], 'confirmed')
+        self.assertEqual(self.client.patch(url, {'status': 'cancelled'}).data['status'], 'cancelled')
+        # The slot is free again
+        self.assertEqual(self.book(self.providers[0], self.start, self.end).status_code, 201)
+
+
+class ProviderProfileCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider = make_provider('cached@example.com', rating=Decimal('4.00'), total_reviews=3)
+        self.service = ProviderService.objects.create(
+            provider=self.provider, name='Pipe repair', description='Leaks',
+            price=Decimal('50.00'), duration=60
+        )
+        self.url = reverse('provider-detail', args=[self.provider.id])
+
+    def test_repeat_reads_hit_the_cache(self):
+        first = APIClient().get(self.url)
+        with self.assertNumQueries(1):
+            second = APIClient().get(self.url)
+        self.assertEqual(first.data, second.data)
+
+    def test_changes_invalidate_the_profile(self):
+        APIClient().get(self.url)
+
+        # A stale copy saved after the rating changed must not roll the version back
+        stale = Provider.objects.get(pk=self.provider.pk)
+        self.provider.rating = Decimal('4.50')
+        self.provider.save()
+        stale.description = 'Updated'
+        stale.save(update_fields=['description'])
+        self.assertEqual(APIClient().get(self.url).data['rating'], '4.50')
+
+        self.service.price = Decimal('60.00')
+        self.service.save()
+        self.assertEqual(APIClient().get(self.url).data['services'][0]['price'], '60.00')
+
+        self.provider.user.first_name = 'Renamed'
+        self.provider.user.save()
+        self.assertEqual(APIClient().get(self.url).data['user_name'], 'Renamed Provider')
+
+    def test_my_profile_uses_the_cache(self):
+        client = APIClient()
+        client.force_authenticate(self.provider.user)
+        client.get(reverse('my-provider-profile'))
+        with self.assertNumQueries(1):
+            response = client.get(reverse('my-provider-profile'))
+        self.assertEqual(response.data['business_name'], 'cached')
+
+    def test_admin_document_verification_invalidates_the_profile(self):
+        document = ProviderDocument.objects.create(
+            provider=self.provider, document_type='license', document_file='provider_documents/license.pdf'
+        )
+        self.assertFalse(APIClient().get(self.url).data['documents'][0]['is_verified'])
+
+        admin_client = APIClient()
+        admin_client.force_login(User.objects.create_superuser(
+            email='admin@example.com', first_name='Site', last_name='Admin', password='pass1234'
+        ))
+        admin_client.post(reverse('admin:providers_providerdocument_changelist'), {
+            'action': 'verify_documents', '_selected_action': [document.id]
+        })
+        self.assertTrue(APIClient().get(self.url).data['documents'][0]['is_verified'])
+
+
+class DocumentUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            PROVIDER_UPLOAD_TEMP_DIR=f'{self.media_root}/partial',
+            PROVIDER_UPLOAD_MAX_CHUNK_SIZE=1024,
+            PROVIDER_DOCUMENT_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.provider = make_provider('docs@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+
+    def start(self, content, filename='license.png'):
+        response = self.client.post(reverse('document-upload-list-create'), {
+            'document_type': 'license', 'filename': filename, 'total_size': len(content)
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return reverse('document-upload-chunk', args=[response.data['id']])
+
+    def send(self, url, offset, chunk):
+        return self.client.put(
+            f'{url}?offset={offset}', data=chunk, content_type='application/octet-stream'
+        )
+
+    def upload(self, content, filename='license.png'):
+        url = self.start(content, filename)
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(0, len(content), 1024):
+                response = self.send(url, offset, content[offset:offset + 1024])
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def png(self):
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.new('RGB', (800, 600), (200, 30, 30)).save(output, format='PNG')
+        return output.getvalue()
+
+    def test_chunked_upload_is_stored_by_hash_and_processed(self):
+        content = self.png() + b'\0' * 3000
+        response = self.upload(content)
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        document = response.data['document']
+        self.assertEqual(document['original_filename'], 'license.png')
+        self.assertTrue(document['document_file'].endswith(f'provider_documents/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}'))
+        self.assertEqual(document['processing_status'], 'pending')
+
+        blob = DocumentBlob.objects.get(sha256=sha256)
+        self.assertEqual((blob.status, blob.content_type, blob.page_count), ('ready', 'image/png', 1))
+        with blob.file.open('rb') as f:
+            self.assertEqual(f.read(), content)
+        self.assertTrue(blob.thumbnail.name.endswith(f'{sha256}.png'))
+
+    def test_resume_after_offset_mismatch(self):
+        content = b'%PDF-1.4\n' + b'1 0 obj << /Type /Pages /Count 2 >>\n' + b'<< /Type /Page >>\n' * 2 + b'x' * 2000
+        url = self.start(content, 'insurance.pdf')
+        self.assertEqual(self.send(url, 0, content[:1024]).status_code, 200)
+
+        # A retried chunk is refused with the offset to resume from
+        response = self.send(url, 0, content[:1024])
+        self.assertEqual((response.status_code, response.data['received_size']), (409, 1024))
+        self.assertEqual(self.client.get(url).data['received_size'], 1024)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for offset in range(1024, len(content), 1024):
+                response = self.send(url, offset, content[offset:offset + 1024])
+        self.assertEqual(response.status_code, 201)
+        blob = DocumentBlob.objects.get()
+        self.assertEqual((blob.status, blob.content_type, blob.page_count), ('ready', 'application/pdf', 2))
+
+    def test_identical_documents_share_one_blob(self):
+        content = self.png()
+        first = self.upload(content)
+        second = self.upload(content, 'copy.png')
+        self.assertNotEqual(first.data['document']['id'], second.data['document']['id'])
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+        self.assertEqual(ProviderDocument.objects.filter(blob__isnull=False).count(), 2)
+
+    def test_unsupported_files_are_rejected(self):
+        self.upload(b'MZ' + b'\0' * 100, 'setup.exe')
+        blob = DocumentBlob.objects.get()
+        self.assertEqual(blob.status, 'rejected')
+        self.assertIn('Unsupported file type', blob.error)
+
+    def test_size_limits(self):
+        response = self.client.post(reverse('document-upload-list-create'), {
+            'document_type': 'license', 'filename': 'huge.pdf', 'total_size': 10 ** 9
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        url = self.start(b'x' * 100)
+        self.assertEqual(self.send(url, 0, b'x' * 200).status_code, 400)
+
+
+class ProviderImportTests(TestCase):
+    HEADER = 'email,business_name,provider_type,service_name,service_price,service_duration,service_category\n'
+
+    def setUp(self):
+        from apps.jobs.models import JobCategory
+        self.category = JobCategory.objects.create(name='Cleaning')
+        for i in range(4):
+            User.objects.create_user(
+                email=f'agency{i}@example.com', first_name='Agency', last_name=str(i),
+                password='pass1234', is_verified=True
+            )
+        User.objects.create_user(email='unverified@example.com', first_name='No', last_name='Verify', password='pass1234')
+        make_provider('existing@example.com')
+
+    def run_import(self, rows, batch_size=1000):
+        return import_providers(io.BytesIO((self.HEADER + rows).encode()), 'providers.csv', batch_size)
+
+    def test_import_creates_providers_and_services_in_batches(self):
+        rows = (
+            f'agency0@example.com,Sparkle,company,Deep clean,120.00,180,{self.category.id}\n'
+            'agency0@example.com,Sparkle,company,Windows,40,60,\n'
+            'agency1@example.com,Shine,individual,,,,\n'
+            'agency2@example.com,Gleam,freelancer,Carpets,80,90,\n'
+            'agency3@example.com,Polish,company,Ovens,50,60,\n'
+        )
+        # Per batch: users, categories when referenced and both bulk inserts in a savepoint
+        with self.assertNumQueries(11):
+            result = self.run_import(rows, batch_size=3)
+
+        self.assertEqual((result.rows, result.providers, result.services, result.error_count), (5, 4, 4, 0))
+        sparkle = Provider.objects.get(business_name='Sparkle')
+        self.assertEqual((sparkle.provider_type, sparkle.status), ('company', 'pending'))
+        self.assertEqual(
+            sorted(sparkle.services.values_list('name', 'category_id')),
+            [('Deep clean', self.category.id), ('Windows', None)]
+        )
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        rows = (
+            'nobody@example.com,Ghost,company,,,,\n'
+            'unverified@example.com,Early,company,,,,\n'
+            'existing@example.com,Again,company,,,,\n'
+            'agency0@example.com,,company,,,,\n'
+            'agency1@example.com,Half,company,Repairs,,60,\n'
+            'agency2@example.com,Fine,company,Repairs,10,60,999\n'
+        )
+        result = self.run_import(rows)
+        self.assertEqual(result.error_count, 6)
+        errors = dict(result.errors)
+        self.assertEqual(sorted(errors), [2, 3, 4, 5, 6, 7])
+        self.assertIn('No user', errors[2])
+        self.assertIn('business_name', errors[5])
+        self.assertIn('price and a duration', errors[6])
+        self.assertIn('Unknown service category', errors[7])
+        # The provider of a row whose service failed is still created
+        self.assertEqual(result.providers, 1)
+
+    def test_xlsx_import(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(self.HEADER.strip().split(','))
+        sheet.append(['agency0@example.com', 'Sparkle', 'company', 'Deep clean', 120, 180, None])
+        output = io.BytesIO()
+        workbook.save(output)
+        output.seek(0)
+
+        result = import_providers(output, 'providers.xlsx')
+        self.assertEqual((result.providers, result.services, result.error_count), (1, 1, 0))
+        self.assertEqual(ProviderService.objects.get(name='Deep clean').duration, 180)
+
+
+class ProviderDashboardTests(TestCase):
+    def setUp(self):
+        from apps.jobs.models import Job, JobApplication, JobCategory
+        from apps.payments.models import Payment, PayoutRequest
+
+        cache.clear()
+        self.provider = make_provider('dashboard@example.com', rating=Decimal('4.60'), total_reviews=12)
+        other = make_provider('other@example.com')
+        owner = User.objects.create_user(email='owner@example.com', first_name='Job', last_name='Owner', password='pass1234')
+        category = JobCategory.objects.create(name='Gardening')
+
+        def job(status, assigned_to=None):
+            return Job.objects.create(
+                title='Mow the lawn', description='Front and back.', category=category, posted_by=owner,
+                budget_min=Decimal('20.00'), budget_max=Decimal('80.00'), location='Nairobi',
+                status=status, assigned_to=assigned_to
+            )
+
+        done = [job('completed', self.provider) for _ in range(2)]
+        job('in_progress', self.provider)
+        job('in_progress', other)
+        for i, paid in enumerate(done):
+            Payment.objects.create(
+                job=paid, payer=owner, provider=self.provider, amount=Decimal('100.00'),
+                platform_fee=Decimal('10.00'), payment_method='card',
+                transaction_id=f'txn-dashboard-{i}', status='completed'
+            )
+        payout = {'bank_name': 'Bank', 'account_number': '123', 'account_holder_name': 'Dash'}
+        PayoutRequest.objects.create(provider=self.provider, amount=Decimal('50.00'), status='pending', **payout)
+        PayoutRequest.objects.create(provider=self.provider, amount=Decimal('30.00'), status='completed', **payout)
+
+        for application_status in ('pending', 'accepted', 'rejected', 'rejected', 'withdrawn'):
+            JobApplication.objects.create(
+                job=job('open'), provider=self.provider, bid_amount=Decimal('60.00'),
+                estimated_duration='2 hours', cover_letter='I can help.', status=application_status
+            )
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+
+    def test_dashboard_is_one_query_and_cached(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('provider-dashboard'))
+        data = response.data
+        self.assertEqual(data['provider_id'], self.provider.id)
+        self.assertEqual(data['earnings_to_date'], Decimal('180.00'))
+        self.assertEqual((data['pending_payouts'], data['paid_out']), (Decimal('50.00'), Decimal('30.00')))
+        self.assertEqual((data['active_jobs'], data['completed_jobs'], data['open_applications']), (1, 2, 1))
+        self.assertEqual(data['win_rate'], round(1 / 3, 4))
+        self.assertEqual((data['rating'], data['total_reviews']), (Decimal('4.60'), 12))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('provider-dashboard')).data, data)
+
+    def test_not_a_provider(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(email='owner@example.com'))
+        self.assertEqual(client.get(reverse('provider-dashboard')).status_code, 404)
+
+    def test_archived_jobs_still_count(self):
+        from apps.jobs.archive import archive_finished_jobs
+        from apps.jobs.models import Job
+        unpaid = Job.objects.filter(assigned_to=self.provider, status='in_progress').get()
+        Job.objects.filter(id=unpaid.id).update(status='completed', updated_at=timezone.now() - timedelta(days=400))
+        Job.objects.filter(status='open').update(status='cancelled', updated_at=timezone.now() - timedelta(days=400))
+        archive_finished_jobs(days=180)
+
+        data = self.client.get(reverse('provider-dashboard')).data
+        self.assertEqual((data['active_jobs'], data['completed_jobs']), (0, 3))
+        self.assertEqual(data['win_rate'], round(1 / 3, 4))
+
+
+
+class TrustScoreTests(TestCase):
+    def setUp(self):
+        from apps.jobs.models import Job, JobCategory
+        from apps.payments.models import Payment, PaymentDispute
+
+        self.trusted = make_provider('trusted@example.com', rating=Decimal('4.80'), total_reviews=40)
+        self.risky = make_provider('risky@example.com', rating=Decimal('4.80'), total_reviews=40)
+        self.newcomer = make_provider('newcomer@example.com', is_verified=False)
+        ProviderDocument.objects.create(
+            provider=self.trusted, document_type='license', document_file='provider_documents/license.pdf', is_verified=True
+        )
+        owner = User.objects.create_user(email='owner@example.com', first_name='Job', last_name='Owner', password='pass1234')
+        category = JobCategory.objects.create(name='Roofing')
+
+        for i, (provider, job_status, disputed) in enumerate([
+            (self.trusted, 'completed', False),
+            (self.trusted, 'completed', False),
+            (self.risky, 'completed', True),
+            (self.risky, 'cancelled', False),
+            (self.risky, 'cancelled', False),
+        ]):
+            job = Job.objects.create(
+                title='Fix the roof', description='Leaks when it rains.', category=category, posted_by=owner,
+                budget_min=Decimal('100.00'), budget_max=Decimal('300.00'), location='Nairobi',
+                status=job_status, assigned_to=provider
+            )
+            if job_status == 'completed':
+                payment = Payment.objects.create(
+                    job=job, payer=owner, provider=provider, amount=Decimal('200.00'),
+                    payment_method='card', transaction_id=f'txn-trust-{i}', status='completed'
+                )
+                if disputed:
+                    PaymentDispute.objects.create(
+                        payment=payment, disputed_by=owner, reason='poor_quality', description='Still leaks.'
+                    )
+
+    def test_scores_rank_trust_signals(self):
+        # Eight grouped reads and the site mean rating, then one update per chunk, however many providers
+        with self.assertNumQueries(9 + 2 * 3):
+            count, timings = recompute_trust_scores(chunk_size=2)
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            set(timings),
+            {'load_providers', 'load_disputes', 'load_jobs', 'load_responses', 'load_documents', 'score', 'save'}
+        )
+
+        scores = dict(Provider.objects.values_list('business_name', 'trust_score'))
+        self.assertGreater(scores['trusted'], scores['risky'])
+        self.assertGreater(scores['risky'], scores['newcomer'])
+        self.assertTrue(all(0 <= score <= 1 for score in scores.values()))
+        self.assertIsNotNone(Provider.objects.get(pk=self.trusted.pk).trust_score_updated_at)
+
+    def test_archived_jobs_and_applications_count(self):
+        from apps.jobs.archive import archive_finished_jobs
+        from apps.jobs.models import ArchivedJob, ArchivedJobApplication, Job, JobApplication
+        from .trust import load_features
+
+        cancelled = Job.objects.filter(assigned_to=self.risky, status='cancelled')
+        applied = Job.objects.filter(assigned_to=self.trusted).first()
+        JobApplication.objects.create(
+            job=cancelled.first(), provider=self.trusted, bid_amount=Decimal('90.00'),
+            estimated_duration='1 day', cover_letter='Available.'
+        )
+        JobApplication.objects.create(
+            job=applied, provider=self.trusted, bid_amount=Decimal('90.00'),
+            estimated_duration='1 day', cover_letter='Available.'
+        )
+        before = load_features({})[1]
+        cancelled.update(updated_at=timezone.now() - timedelta(days=400))
+        Job.objects.filter(id=applied.id).update(updated_at=timezone.now() - timedelta(days=400))
+        archive_finished_jobs(days=180)
+        self.assertEqual(ArchivedJob.objects.count(), 3)
+        self.assertEqual(ArchivedJobApplication.objects.count(), 2)
+
+        ids, after = load_features({})
+        for feature in ('finished_jobs', 'cancelled_jobs', 'response_hours'):
+            np.testing.assert_allclose(after[feature], before[feature])
+
+    @override_settings(PROVIDER_TRUST_WEIGHTS={'rating': float('nan')})
+    def test_non_finite_weights_are_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('recompute_trust_scores', stdout=io.StringIO())
+
+
+
+class ServiceAreaTests(TestCase):
+    def setUp(self):
+        self.central = make_provider('central@example.com')
+        self.westlands = make_provider('westlands@example.com')
+        make_provider('nowhere@example.com')
+        self.circle = ServiceArea.objects.create(
+            provider=self.central, name='CBD', kind='circle',
+            latitude=Decimal('-1.286389'), longitude=Decimal('36.817223'), radius_km=Decimal('5')
+        )
+        self.polygon = ServiceArea.objects.create(
+            provider=self.westlands, name='Westlands', kind='polygon',
+            polygon=[[-1.25, 36.78], [-1.25, 36.83], [-1.29, 36.83], [-1.29, 36.78]]
+        )
+
+    def test_areas_are_indexed_in_grid_cells(self):
+        self.assertIn(cell_key(-1.286389, 36.817223), set(self.circle.cells.values_list('cell', flat=True)))
+        self.assertIn(cell_key(-1.27, 36.80), set(self.polygon.cells.values_list('cell', flat=True)))
+
+    def test_covering_areas(self):
+        # Inside both the CBD circle and the Westlands square
+        self.assertEqual({area.name for area in covering_areas(-1.28, 36.815)}, {'CBD', 'Westlands'})
+        # Inside the square's bounding box cell but outside the circle
+        self.assertEqual([area.name for area in covering_areas(-1.255, 36.785)], ['Westlands'])
+        # In the circle, outside the square
+        self.assertEqual([area.name for area in covering_areas(-1.30, 36.82)], ['CBD'])
+        self.assertEqual(covering_areas(-4.043, 39.668), [])
+
+    def test_search_by_served_location(self):
+        response = APIClient().get(reverse('provider-search'), {'serves_latitude': -1.30, 'serves_longitude': 36.82})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.central.id])
+        response = APIClient().get(reverse('provider-search'), {'serves_latitude': -1.30})
+        self.assertEqual(response.status_code, 400)
+
+    def test_provider_manages_areas(self):
+        client = APIClient()
+        client.force_authenticate(self.central.user)
+        response = client.post(reverse('service-area-list'), {
+            'name': 'Too big', 'kind': 'polygon', 'polygon': [[0, 0], [0, 5], [5, 5]]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = client.post(reverse('service-area-list'), {
+            'name': 'Karen', 'kind': 'circle', 'latitude': '-1.3194', 'longitude': '36.7073', 'radius_km': '4'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(covering_areas(-1.3194, 36.7073)[0].provider_id, self.central.id)
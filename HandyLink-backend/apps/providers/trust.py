@@ -0,0 +1,200 @@
+"""
+Nightly provider trust score.
+
+Features of every provider are pulled with one grouped query each into
+NumPy arrays aligned on provider id, scored together with array
+operations and written back with chunked bulk updates, so the cost is a
+handful of scans however many providers there are. Every factor is
+normalised to 0..1 (higher is more trustworthy) and weighted by
+PROVIDER_TRUST_WEIGHTS:
+
+- rating: Bayesian average rating, as used by the search ranking
+- volume: diminishing returns on the number of reviews
+- disputes: share of the provider's payments that were not disputed
+- cancellations: smoothed share of assigned jobs not cancelled
+- response: how quickly the provider applies to new jobs, halving every
+  TRUST_RESPONSE_HALF_LIFE_HOURS
+- verification: verified provider and at least one verified document
+
+Jobs and applications moved to the archive tables count towards the
+cancellation and response factors like live ones.
+"""
+import logging
+import math
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from apps.jobs.models import ArchivedJob, ArchivedJobApplication, Job, JobApplication
+from apps.payments.models import Payment, PaymentDispute
+from .models import Provider, ProviderDocument
+from .services import ProviderRankingService
+
+logger = logging.getLogger(__name__)
+
+FACTORS = ('rating', 'volume', 'disputes', 'cancellations', 'response', 'verification')
+CHUNK_SIZE = 2000
+
+# Reviews at which the volume factor reaches 1 - 1/e
+TRUST_REVIEW_SCALE = 20.0
+# Average delay between a job being posted and the provider applying at which the response factor is 0.5
+TRUST_RESPONSE_HALF_LIFE_HOURS = 24.0
+
+
+def get_weights():
+    """
+    Trust weights from settings, normalised to sum to 1. Raises ValueError
+    for a NaN or infinite weight.
+    """
+    weights = settings.PROVIDER_TRUST_WEIGHTS
+    values = [float(weights.get(factor, 0)) for factor in FACTORS]
+    for factor, value in zip(FACTORS, values):
+        if not math.isfinite(value):
+            raise ValueError(f'The {factor} trust weight must be a finite number.')
+    vector = np.array([max(value, 0.0) for value in values])
+    total = vector.sum()
+    return vector / total if total else np.full(len(FACTORS), 1.0 / len(FACTORS))
+
+
+def _scatter(ids, rows, fill=0.0):
+    """Array aligned on the sorted provider ids from (provider id, value) rows, `fill` where missing"""
+    values = np.full(len(ids), fill)
+    rows = [(provider_id, value) for provider_id, value in rows if value is not None]
+    if rows:
+        row_ids = np.fromiter((provider_id for provider_id, value in rows), dtype=np.int64, count=len(rows))
+        positions = np.searchsorted(ids, row_ids)
+        found = (positions < len(ids)) & (ids[np.minimum(positions, len(ids) - 1)] == row_ids)
+        values[positions[found]] = np.fromiter((value for provider_id, value in rows), dtype=np.float64, count=len(rows))[found]
+    return values
+
+
+def load_features(timings):
+    """Provider ids and a dict of feature arrays aligned on them, one query per feature group"""
+    started = time.monotonic()
+    providers = list(
+        Provider.objects.order_by('id').values_list('id', 'rating', 'total_reviews', 'is_verified').iterator(chunk_size=CHUNK_SIZE)
+    )
+    ids = np.fromiter((row[0] for row in providers), dtype=np.int64, count=len(providers))
+    features = {
+        'rating': np.fromiter((float(row[1]) for row in providers), dtype=np.float64, count=len(providers)),
+        'reviews': np.fromiter((row[2] for row in providers), dtype=np.float64, count=len(providers)),
+        'is_verified': np.fromiter((row[3] for row in providers), dtype=np.float64, count=len(providers)),
+    }
+    del providers
+    timings['load_providers'] = time.monotonic() - started
+
+    started = time.monotonic()
+    features['payments'] = _scatter(ids, Payment.objects.order_by().values('provider_id').annotate(
+        total=Count('id')
+    ).values_list('provider_id', 'total'))
+    features['disputes'] = _scatter(ids, PaymentDispute.objects.order_by().values('payment__provider_id').annotate(
+        total=Count('id')
+    ).values_list('payment__provider_id', 'total'))
+    timings['load_disputes'] = time.monotonic() - started
+
+    started = time.monotonic()
+    features['finished_jobs'] = np.zeros(len(ids))
+    features['cancelled_jobs'] = np.zeros(len(ids))
+    for model in (Job, ArchivedJob):
+        jobs = model.objects.filter(assigned_to__isnull=False).order_by().values('assigned_to_id').annotate(
+            finished=Count('id', filter=Q(status__in=('completed', 'cancelled'))),
+            cancelled=Count('id', filter=Q(status='cancelled'))
+        )
+        job_rows = list(jobs.values_list('assigned_to_id', 'finished', 'cancelled'))
+        features['finished_jobs'] += _scatter(ids, ((row[0], row[1]) for row in job_rows))
+        features['cancelled_jobs'] += _scatter(ids, ((row[0], row[2]) for row in job_rows))
+    timings['load_jobs'] = time.monotonic() - started
+
+    started = time.monotonic()
+    # Applications are archived together with their job
+    job_created_at = Subquery(ArchivedJob.objects.filter(id=OuterRef('job_id')).values('created_at')[:1])
+    applications = (
+        JobApplication.objects.annotate(job_created_at=F('job__created_at')),
+        ArchivedJobApplication.objects.annotate(job_created_at=job_created_at).filter(job_created_at__isnull=False),
+    )
+    delay_hours = np.zeros(len(ids))
+    applied = np.zeros(len(ids))
+    for queryset in applications:
+        rows = list(queryset.order_by().values('provider_id').annotate(
+            delay=Sum(F('applied_at') - F('job_created_at')), total=Count('id')
+        ).values_list('provider_id', 'delay', 'total'))
+        delay_hours += _scatter(ids, (
+            (provider_id, delay.total_seconds() / 3600) for provider_id, delay, total in rows if delay is not None
+        ))
+        applied += _scatter(ids, ((provider_id, total) for provider_id, delay, total in rows))
+    # NaN marks providers who never applied, they get a neutral response factor
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['response_hours'] = np.where(applied > 0, delay_hours / applied, np.nan)
+    timings['load_responses'] = time.monotonic() - started
+
+    started = time.monotonic()
+    features['verified_documents'] = _scatter(ids, ProviderDocument.objects.filter(is_verified=True).order_by().values(
+        'provider_id'
+    ).annotate(total=Count('id')).values_list('provider_id', 'total'))
+    timings['load_documents'] = time.monotonic() - started
+    return ids, features
+
+
+def score_features(features, mean_rating, weights):
+    """Trust scores from feature arrays, returning (scores, factor_matrix)"""
+    prior = settings.PROVIDER_RATING_PRIOR_REVIEWS
+    reviews = features['reviews']
+    bayesian_rating = (prior * mean_rating + features['rating'] * reviews) / (prior + reviews)
+    rating_score = np.clip(bayesian_rating / 5.0, 0.0, 1.0)
+
+    volume_score = 1.0 - np.exp(-reviews / TRUST_REVIEW_SCALE)
+
+    # Smoothed with one undisputed phantom payment so a single dispute is not fatal
+    dispute_score = 1.0 - features['disputes'] / (features['payments'] + 1.0)
+
+    cancellation_score = 1.0 - features['cancelled_jobs'] / (features['finished_jobs'] + 2.0)
+
+    response_hours = np.maximum(features['response_hours'], 0.0)
+    response_score = np.where(
+        np.isnan(response_hours), 0.5, 0.5 ** (np.nan_to_num(response_hours) / TRUST_RESPONSE_HALF_LIFE_HOURS)
+    )
+
+    verification_score = 0.5 * features['is_verified'] + 0.5 * (features['verified_documents'] > 0)
+
+    factors = np.column_stack([
+        rating_score, volume_score, dispute_score, cancellation_score, response_score, verification_score
+    ])
+    contributions = factors * weights
+    return contributions.sum(axis=1), contributions
+
+
+def save_scores(ids, scores, chunk_size=CHUNK_SIZE):
+    """Write scores back in chunks, one bulk update per transaction"""
+    now = timezone.now()
+    for start in range(0, len(ids), chunk_size):
+        providers = [
+            Provider(id=int(provider_id), trust_score=round(float(score), 6), trust_score_updated_at=now)
+            for provider_id, score in zip(ids[start:start + chunk_size], scores[start:start + chunk_size])
+        ]
+        with transaction.atomic():
+            Provider.objects.bulk_update(providers, ['trust_score', 'trust_score_updated_at'])
+
+
+def recompute_trust_scores(chunk_size=CHUNK_SIZE):
+    """Recompute every provider's trust score, returning (providers updated, seconds per stage)"""
+    weights = get_weights()
+    timings = {}
+    ids, features = load_features(timings)
+
+    started = time.monotonic()
+    scores, contributions = score_features(features, ProviderRankingService.site_mean_rating(), weights)
+    timings['score'] = time.monotonic() - started
+
+    started = time.monotonic()
+    save_scores(ids, scores, chunk_size)
+    timings['save'] = time.monotonic() - started
+
+    logger.info(
+        f"Recomputed trust scores of {len(ids)} providers: "
+        + ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    )
+    return len(ids), timings
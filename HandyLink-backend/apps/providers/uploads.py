@@ -0,0 +1,213 @@
+"""
+Chunked, resumable provider document uploads.
+
+A client starts an upload with the document's total size and sends its bytes
+in order, each chunk at the offset the server has acknowledged. Every chunk
+is fsynced before the offset advances. The last chunk's request hashes the
+file and moves it to its content-addressed path, so identical documents are
+stored once, then returns. Checking the type, size and page count and
+thumbnailing images happens afterwards in a process pool
+(apps/providers/document_processing.py).
+"""
+import hashlib
+import logging
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.pools import BlobProcessingPool
+from . import document_processing
+from .models import DocumentBlob, DocumentUpload, Provider, ProviderDocument
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+class UploadRejected(Exception):
+    """The upload or chunk is invalid"""
+
+class UploadOffsetMismatch(Exception):
+    """The chunk does not start where the received bytes end"""
+
+    def __init__(self, received_size):
+        self.received_size = received_size
+        super().__init__(f'Expected a chunk at offset {received_size}.')
+
+def blob_name(sha256):
+    """Storage name of a document, sharded on the first two bytes of its hash"""
+    return f'provider_documents/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+def thumbnail_name(sha256):
+    return f'provider_documents/thumbnails/{sha256[:2]}/{sha256[2:4]}/{sha256}.png'
+
+def _fsync_directory(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class DocumentUploadService:
+
+    @staticmethod
+    def partial_path(upload):
+        return os.path.join(settings.PROVIDER_UPLOAD_TEMP_DIR, f'{upload.id}.part')
+
+    @staticmethod
+    def start_upload(provider, document_type, filename, total_size):
+        if not 0 < total_size <= settings.PROVIDER_DOCUMENT_MAX_SIZE:
+            raise UploadRejected(f'Documents must be between 1 and {settings.PROVIDER_DOCUMENT_MAX_SIZE} bytes.')
+        return DocumentUpload.objects.create(
+            provider=provider,
+            document_type=document_type,
+            filename=os.path.basename(filename)[:255],
+            total_size=total_size
+        )
+
+    @staticmethod
+    def append_chunk(upload_id, offset, stream, length):
+        """
+        Write a chunk at `offset` and fsync it, finishing the upload with
+        the last one. Returns the upload, its document once complete.
+        """
+        if not 0 < length <= settings.PROVIDER_UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadRejected(f'Chunks must be between 1 and {settings.PROVIDER_UPLOAD_MAX_CHUNK_SIZE} bytes.')
+
+        with transaction.atomic():
+            # Serialise the chunks of one upload so retries cannot interleave
+            upload = DocumentUpload.objects.select_for_update().get(id=upload_id)
+            if upload.status != 'uploading':
+                raise UploadRejected('This upload is already complete.')
+            if offset != upload.received_size:
+                raise UploadOffsetMismatch(upload.received_size)
+            if offset + length > upload.total_size:
+                raise UploadRejected('The chunk goes past the declared total size.')
+
+            path = DocumentUploadService.partial_path(upload)
+            os.makedirs(settings.PROVIDER_UPLOAD_TEMP_DIR, exist_ok=True)
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Bytes past the acknowledged offset are from a chunk that failed
+                f.seek(offset)
+                written = 0
+                while written < length:
+                    data = stream.read(min(READ_SIZE, length - written))
+                    if not data:
+                        break
+                    f.write(data)
+                    written += len(data)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+            if written != length:
+                raise UploadRejected(f'Received {written} of the {length} bytes announced.')
+
+            upload.received_size = offset + length
+            if upload.received_size < upload.total_size:
+                upload.save(update_fields=['received_size', 'updated_at'])
+                return upload
+            return DocumentUploadService.complete_upload(upload)
+
+    @staticmethod
+    def complete_upload(upload):
+        """Store the received file under its hash and create the document"""
+        path = DocumentUploadService.partial_path(upload)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(READ_SIZE), b''):
+                digest.update(data)
+        sha256 = digest.hexdigest()
+
+        name = blob_name(sha256)
+        blob = DocumentBlob.objects.filter(sha256=sha256).first()
+        if blob is None:
+            DocumentUploadService.store_file(path, name)
+            blob, created = DocumentBlob.objects.get_or_create(
+                sha256=sha256, defaults={'file': name, 'size': upload.total_size}
+            )
+            if created:
+                transaction.on_commit(lambda: DocumentProcessingPool.submit(sha256))
+        if os.path.exists(path):
+            os.remove(path)
+
+        document = ProviderDocument.objects.create(
+            provider_id=upload.provider_id,
+            document_type=upload.document_type,
+            document_file=blob.file.name,
+            blob=blob,
+            original_filename=upload.filename
+        )
+        upload.status = 'complete'
+        upload.document = document
+        upload.save(update_fields=['received_size', 'status', 'document', 'updated_at'])
+        return upload
+
+    @staticmethod
+    def store_file(path, name):
+        """Move a file into storage under `name`, a rename for local storage"""
+        try:
+            target = default_storage.path(name)
+        except NotImplementedError:
+            with open(path, 'rb') as f:
+                default_storage.save(name, File(f))
+            return
+        if os.path.exists(target):
+            return
+        directory = os.path.dirname(target)
+        os.makedirs(directory, exist_ok=True)
+        shutil.move(path, target)
+        _fsync_directory(directory)
+
+    @staticmethod
+    def expire_uploads(hours):
+        """Delete uploads not touched for `hours` hours and their partial files"""
+        uploads = DocumentUpload.objects.filter(
+            status='uploading', updated_at__lt=timezone.now() - timedelta(hours=hours)
+        )
+        count = 0
+        for upload in uploads.iterator():
+            path = DocumentUploadService.partial_path(upload)
+            if os.path.exists(path):
+                os.remove(path)
+            upload.delete()
+            count += 1
+        return count
+
+class DocumentProcessingPool(BlobProcessingPool):
+    """Process pool checking and thumbnailing documents, see core/pools.py"""
+
+    workers_setting = 'PROVIDER_DOCUMENT_WORKERS'
+    blob_model = DocumentBlob
+    label = 'document'
+    process = staticmethod(document_processing.process_document)
+
+    @staticmethod
+    def arguments(blob):
+        return (
+            default_storage.path(blob.file.name),
+            default_storage.path(thumbnail_name(blob.sha256)),
+            settings.PROVIDER_DOCUMENT_MAX_SIZE,
+            settings.PROVIDER_DOCUMENT_MAX_PAGES,
+            settings.PROVIDER_DOCUMENT_THUMBNAIL_SIZE
+        )
+
+    @staticmethod
+    def store_result(sha256, result):
+        DocumentBlob.objects.filter(sha256=sha256).update(
+            status='rejected' if result['error'] else 'ready',
+            error=result['error'],
+            content_type=result['content_type'],
+            page_count=result['page_count'],
+            thumbnail=thumbnail_name(sha256) if result['thumbnail'] else '',
+            processed_at=timezone.now()
+        )
+        # Processing results are part of the cached profiles showing the document
+        Provider.objects.filter(documents__blob_id=sha256).update(profile_version=F('profile_version') + 1)
+        if result['error']:
+            logger.info(f"Rejected document {sha256}: {result['error']}")
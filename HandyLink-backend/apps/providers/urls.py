@@ -1,16 +1,40 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import SimpleRouter
 from .views import (
     ProviderRegistrationView,
     ProviderListView,
+    ProviderSearchView,
     ProviderDetailView,
     MyProviderProfileView,
-    ProviderServicesView
+    ProviderDashboardView,
+    ProviderServicesView,
+    ProviderAvailabilityViewSet,
+    ServiceAreaViewSet,
+    BookingListCreateView,
+    BookingStatusView,
+    DocumentUploadListCreateView,
+    DocumentUploadChunkView
 )
 
+router = SimpleRouter()
+router.register(r'my-availability', ProviderAvailabilityViewSet, basename='provider-availability')
+router.register(r'my-service-areas', ServiceAreaViewSet, basename='service-area')
+
 urlpatterns = [
     path('register/', ProviderRegistrationView.as_view(), name='provider-register'),
     path('', ProviderListView.as_view(), name='provider-list'),
+    path('search/', ProviderSearchView.as_view(), name='provider-search'),
     path('<int:id>/', ProviderDetailView.as_view(), name='provider-detail'),
     path('my-profile/', MyProviderProfileView.as_view(), name='my-provider-profile'),
+    path('dashboard/', ProviderDashboardView.as_view(), name='provider-dashboard'),
     path('<int:provider_id>/services/', ProviderServicesView.as_view(), name='provider-services'),
+    
+    # Availability and booking URLs
+    path('', include(router.urls)),
+    path('bookings/', BookingListCreateView.as_view(), name='booking-list-create'),
+    path('bookings/<int:booking_id>/status/', BookingStatusView.as_view(), name='booking-status'),
+    
+    # Document upload URLs
+    path('documents/uploads/', DocumentUploadListCreateView.as_view(), name='document-upload-list-create'),
+    path('documents/uploads/<uuid:upload_id>/', DocumentUploadChunkView.as_view(), name='document-upload-chunk'),
 ]
\ No newline at end of file
@@ -1,17 +1,37 @@
-from django.shortcuts import render
+from django.db.models import Prefetch, Q
+from django.http import Http404
+from django.shortcuts import get_object_or_404, render
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework.generics import GenericAPIView, ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.viewsets import ModelViewSet
+from rest_framework.exceptions import PermissionDenied
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 
-from .models import Provider, ProviderService
+from .models import (
+    Provider, ProviderService, ProviderDocument, DocumentUpload, ServiceArea, ProviderAvailability, Booking
+)
 from .serializers import (
     ProviderRegistrationSerializer, 
     ProviderSerializer,
+    ProviderListSerializer,
+    ProviderAvailabilitySerializer,
+    ServiceAreaSerializer,
+    BookingSerializer,
+    DocumentUploadSerializer,
     ProviderServiceSerializer
 )
+from .pagination import ProviderPagination
+from .services import BookingService, BookingUnavailable, ProviderDashboardService
+from .uploads import DocumentUploadService, UploadOffsetMismatch, UploadRejected
+from .cache import ProviderProfileCache
+from .areas import covering_provider_ids
+from apps.jobs.models import Job, JobCategory
+from apps.jobs.utils import bounding_box, distance_km_expression
 
 class ProviderRegistrationView(GenericAPIView):
     serializer_class = ProviderRegistrationSerializer
@@ -61,20 +81,201 @@ class ProviderRegistrationView(GenericAPIView):
                 'provider_id': provider.id
             }, status=status.HTTP_201_CREATED)
 
+def with_active_services(queryset):
+    """One query for a page of providers and one for their active services"""
+    return queryset.select_related('user').prefetch_related(
+        Prefetch(
+            'services',
+            queryset=ProviderService.objects.filter(is_active=True).order_by('id'),
+            to_attr='active_services'
+        )
+    )
+
+def documents_with_blobs():
+    return Prefetch('documents', queryset=ProviderDocument.objects.select_related('blob'))
+
+def parse_slot(start, end, required=True):
+    """
+    Parse an ISO 8601 (start, end) slot, naive times being local, raising
+    ValueError with a message when invalid. Returns (None, None) when
+    neither is given and the slot is optional.
+    """
+    if not start and not end and not required:
+        return None, None
+    if not start or not end:
+        raise ValueError('start and end must be given together.')
+    slot = []
+    for value in (start, end):
+        try:
+            parsed = parse_datetime(value)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise ValueError('start and end must be ISO 8601 datetimes.')
+        slot.append(timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed)
+    try:
+        BookingService.local_window(*slot)
+    except BookingUnavailable as e:
+        raise ValueError(str(e))
+    return tuple(slot)
+
 class ProviderListView(ListAPIView):
-    serializer_class = ProviderSerializer
+    serializer_class = ProviderListSerializer
+    pagination_class = ProviderPagination
     
     def get_queryset(self):
-        return Provider.objects.filter(status='approved', is_verified=True).select_related('user')
+        return with_active_services(
+            Provider.objects.filter(status='approved', is_verified=True)
+        ).order_by('id')
     
     @swagger_auto_schema(
         operation_summary='List all approved providers',
-        operation_description='Returns a list of all approved and verified service providers.',
+        operation_description="""
+        Returns a paginated, compact list of approved and verified service
+        providers with their active services. Use the provider detail endpoint
+        for documents and the full profile.
+        
+        **Pagination:** `page` and `page_size` (default 20, at most 100)
+        """,
         tags=['Providers']
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+class ProviderSearchView(ListAPIView):
+    serializer_class = ProviderListSerializer
+    pagination_class = ProviderPagination
+    
+    MAX_RADIUS_KM = 500
+    
+    def get_queryset(self):
+        filters = self.search_filters
+        providers = Provider.objects.filter(status='approved', is_verified=True)
+        
+        if filters['service'] or filters['category']:
+            services = ProviderService.objects.filter(is_active=True)
+            if filters['service']:
+                services = services.filter(
+                    Q(name__icontains=filters['service']) | Q(description__icontains=filters['service'])
+                )
+            if filters['category']:
+                services = services.filter(category__path__startswith=filters['category'].path)
+            providers = providers.filter(id__in=services.values('provider_id'))
+        
+        if filters['min_rating'] is not None:
+            providers = providers.filter(rating__gte=filters['min_rating'])
+        
+        if filters['radius_km'] is not None:
+            lat, lng, radius_km = filters['latitude'], filters['longitude'], filters['radius_km']
+            min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_km)
+            # The box narrows candidates on the coordinates, the exact distance filters the rest
+            providers = providers.filter(
+                latitude__range=(min_lat, max_lat),
+                longitude__range=(min_lng, max_lng)
+            ).annotate(
+                distance_km=distance_km_expression(lat, lng)
+            ).filter(distance_km__lte=radius_km)
+        
+        if filters['serves'] is not None:
+            providers = providers.filter(id__in=covering_provider_ids(*filters['serves']))
+        
+        if filters['start'] is not None:
+            providers = BookingService.available_providers(filters['start'], filters['end'], providers)
+        
+        return with_active_services(providers).order_by('-ranking_score', 'id')
+    
+    def parse_search_filters(self, params):
+        """Parsed query parameters, raising ValueError with a message when invalid"""
+        filters = {
+            'service': params.get('service', '').strip(),
+            'category': None,
+            'min_rating': None,
+            'radius_km': None,
+            'serves': None,
+        }
+        
+        category_id = params.get('category')
+        if category_id:
+            filters['category'] = JobCategory.objects.filter(id=category_id).first() if category_id.isdigit() else None
+            if filters['category'] is None:
+                raise ValueError('Unknown category.')
+        
+        location = [params.get(name) for name in ('latitude', 'longitude', 'radius_km')]
+        if any(location) and not all(location):
+            raise ValueError('latitude, longitude and radius_km must be given together.')
+        try:
+            if params.get('min_rating'):
+                filters['min_rating'] = float(params['min_rating'])
+            if all(location):
+                filters['latitude'], filters['longitude'], filters['radius_km'] = map(float, location)
+        except ValueError:
+            raise ValueError('min_rating, latitude, longitude and radius_km must be numbers.')
+        
+        if filters['radius_km'] is not None and not 0 < filters['radius_km'] <= self.MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {self.MAX_RADIUS_KM}.')
+        
+        serves = [params.get('serves_latitude'), params.get('serves_longitude')]
+        if any(serves) and not all(serves):
+            raise ValueError('serves_latitude and serves_longitude must be given together.')
+        if all(serves):
+            try:
+                filters['serves'] = tuple(map(float, serves))
+            except ValueError:
+                raise ValueError('serves_latitude and serves_longitude must be numbers.')
+        job_id = params.get('job')
+        if job_id:
+            job = Job.objects.filter(id=job_id).values('latitude', 'longitude').first() if job_id.isdigit() else None
+            if job is None or job['latitude'] is None or job['longitude'] is None:
+                raise ValueError('Unknown job or the job has no location.')
+            filters['serves'] = (float(job['latitude']), float(job['longitude']))
+        
+        filters['start'], filters['end'] = parse_slot(params.get('start'), params.get('end'), required=False)
+        return filters
+    
+    @swagger_auto_schema(
+        operation_summary='Search providers',
+        operation_description="""
+        Search approved providers, best ranked first. The ranking score is a
+        Bayesian-smoothed rating combined with the provider's job completion
+        rate and how recently they completed a job. It is precomputed in
+        batch by the recompute_provider_scores command.
+        
+        **Filters:**
+        - service: text matched against active service names and descriptions
+        - category: job category ID, including its subcategories
+        - min_rating: minimum average rating
+        - latitude, longitude, radius_km: only providers within radius_km
+        - serves_latitude, serves_longitude: only providers with a service
+          area containing the point
+        - job: job ID, only providers with a service area containing the
+          job's location
+        - start, end: only providers whose availability covers the slot and
+          who have no booking overlapping it (ISO 8601 datetimes)
+        """,
+        manual_parameters=[
+            openapi.Parameter('service', openapi.IN_QUERY, type=openapi.TYPE_STRING),
+            openapi.Parameter('category', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('min_rating', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('latitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('longitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('radius_km', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('serves_latitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('serves_longitude', openapi.IN_QUERY, type=openapi.TYPE_NUMBER),
+            openapi.Parameter('job', openapi.IN_QUERY, type=openapi.TYPE_INTEGER),
+            openapi.Parameter('start', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+            openapi.Parameter('end', openapi.IN_QUERY, type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        ],
+        tags=['Providers']
+    )
+    def get(self, request, *args, **kwargs):
+        try:
+            self.search_filters = self.parse_search_filters(request.query_params)
+        except ValueError as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return super().get(request, *args, **kwargs)
+
 class ProviderDetailView(RetrieveAPIView):
     serializer_class = ProviderSerializer
     lookup_field = 'id'
@@ -89,6 +290,21 @@ class ProviderDetailView(RetrieveAPIView):
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        # Reading the version is one primary key lookup, the profile is cached per version
+        provider_id = self.kwargs[self.lookup_field]
+        version = self.get_queryset().filter(id=provider_id).values_list('profile_version', flat=True).first()
+        if version is None:
+            raise Http404
+        data = ProviderProfileCache.get_or_render(
+            provider_id, version,
+            lambda: self.get_serializer(
+                self.get_queryset().prefetch_related('services', documents_with_blobs()).get(id=provider_id)
+            ).data,
+            request
+        )
+        return Response(data)
 
 class MyProviderProfileView(GenericAPIView):
     serializer_class = ProviderSerializer
@@ -100,14 +316,45 @@ class MyProviderProfileView(GenericAPIView):
         tags=['Providers']
     )
     def get(self, request):
-        try:
-            provider = request.user.provider_profile
-            serializer = self.get_serializer(provider)
-            return Response(serializer.data)
-        except Provider.DoesNotExist:
+        profile = Provider.objects.filter(user=request.user).values_list('id', 'profile_version').first()
+        if profile is None:
             return Response({
                 'message': 'You are not registered as a provider.'
             }, status=status.HTTP_404_NOT_FOUND)
+        
+        provider_id, version = profile
+        data = ProviderProfileCache.get_or_render(
+            provider_id, version,
+            lambda: self.get_serializer(
+                Provider.objects.select_related('user').prefetch_related('services', documents_with_blobs()).get(id=provider_id)
+            ).data,
+            request
+        )
+        return Response(data)
+
+class ProviderDashboardView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Get my provider dashboard',
+        operation_description="""
+        Returns the authenticated provider's home screen figures in one call:
+        earnings to date, pending and paid out payouts, active and completed
+        jobs, open applications, win rate (accepted share of decided
+        applications) and rating.
+        
+        Figures are computed in one query and cached for up to
+        PROVIDER_DASHBOARD_CACHE_TIMEOUT seconds, see generated_at.
+        """,
+        tags=['Providers']
+    )
+    def get(self, request):
+        dashboard = ProviderDashboardService.get(request.user)
+        if dashboard is None:
+            return Response({
+                'message': 'You are not registered as a provider.'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response(dashboard)
 
 class ProviderServicesView(ListAPIView):
     serializer_class = ProviderServiceSerializer
@@ -127,3 +374,275 @@ class ProviderServicesView(ListAPIView):
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+
+class ProviderAvailabilityViewSet(ModelViewSet):
+    """
+    ViewSet for the authenticated provider's weekly availability
+    """
+    serializer_class = ProviderAvailabilitySerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return ProviderAvailability.objects.filter(provider__user=self.request.user)
+    
+    def perform_create(self, serializer):
+        if not hasattr(self.request.user, 'provider_profile'):
+            raise PermissionDenied('You must be a registered provider to set availability.')
+        serializer.save(provider=self.request.user.provider_profile)
+    
+    @swagger_auto_schema(
+        operation_summary='List my availability',
+        operation_description='Returns the weekly windows in which the authenticated provider accepts bookings. Times are in the server time zone.',
+        tags=['Bookings']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+class ServiceAreaViewSet(ModelViewSet):
+    """
+    ViewSet for the authenticated provider's service areas
+    """
+    serializer_class = ServiceAreaSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return ServiceArea.objects.filter(provider__user=self.request.user)
+    
+    def perform_create(self, serializer):
+        if not hasattr(self.request.user, 'provider_profile'):
+            raise PermissionDenied('You must be a registered provider to set service areas.')
+        serializer.save(provider=self.request.user.provider_profile)
+    
+    @swagger_auto_schema(
+        operation_summary='List my service areas',
+        operation_description="""
+        Returns the areas the authenticated provider serves: circles
+        (latitude, longitude, radius_km) or polygons of [lat, lng] points.
+        Jobs inside an area match the provider's saved searches that have
+        no area of their own, and provider search can filter on them.
+        """,
+        tags=['Providers']
+    )
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+class BookingListCreateView(GenericAPIView):
+    """
+    List my bookings or book a provider
+    """
+    serializer_class = BookingSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        user = self.request.user
+        return Booking.objects.filter(
+            Q(customer=user) | Q(provider__user=user)
+        ).select_related('provider', 'customer', 'service')
+    
+    @swagger_auto_schema(
+        operation_summary='List my bookings',
+        operation_description='Returns bookings made by the authenticated user and, for providers, bookings of them.',
+        tags=['Bookings']
+    )
+    def get(self, request):
+        bookings = self.get_queryset().filter(end__gte=timezone.now()) if request.query_params.get('upcoming') else self.get_queryset()
+        return Response(self.get_serializer(bookings, many=True).data)
+    
+    @swagger_auto_schema(
+        operation_summary='Book a provider',
+        operation_description='Book a provider for a future time slot inside their availability. Fails with 409 if the slot overlaps another booking.',
+        request_body=BookingSerializer,
+        responses={
+            201: BookingSerializer,
+            400: 'Validation errors',
+            409: 'Provider not available or already booked'
+        },
+        tags=['Bookings']
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            booking = BookingService.create_booking(
+                customer=request.user,
+                provider=data['provider'],
+                start=data['start'],
+                end=data['end'],
+                service=data.get('service'),
+                notes=data.get('notes', '')
+            )
+        except BookingUnavailable as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(booking).data, status=status.HTTP_201_CREATED)
+
+class BookingStatusView(GenericAPIView):
+    """
+    Confirm or cancel a booking
+    """
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='Update booking status',
+        operation_description='The provider can confirm a pending booking. Either party can cancel an active booking.',
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'status': openapi.Schema(type=openapi.TYPE_STRING, enum=['confirmed', 'cancelled'])
+            },
+            required=['status']
+        ),
+        tags=['Bookings']
+    )
+    def patch(self, request, booking_id):
+        booking = get_object_or_404(
+            Booking.objects.select_related('provider', 'customer', 'service').filter(
+                Q(customer=request.user) | Q(provider__user=request.user)
+            ),
+            id=booking_id
+        )
+        new_status = request.data.get('status')
+        is_provider = booking.provider.user_id == request.user.id
+        
+        if booking.status not in Booking.ACTIVE_STATUSES:
+            return Response({
+                'error': 'Only pending or confirmed bookings can be changed.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if new_status == 'confirmed' and not (is_provider and booking.status == 'pending'):
+            return Response({
+                'error': 'Only the provider can confirm a pending booking.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        if new_status not in ('confirmed', 'cancelled'):
+            return Response({
+                'error': 'Invalid status.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        booking.status = new_status
+        booking.save(update_fields=['status', 'updated_at'])
+        return Response(BookingSerializer(booking).data)
+
+class DocumentUploadListCreateView(GenericAPIView):
+    """
+    Start a chunked document upload or list my unfinished ones
+    """
+    serializer_class = DocumentUploadSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return DocumentUpload.objects.filter(
+            provider__user=self.request.user, status='uploading'
+        ).order_by('-created_at')
+    
+    @swagger_auto_schema(
+        operation_summary='List my unfinished document uploads',
+        operation_description='Returns uploads still in progress, with the number of bytes received so far to resume from.',
+        tags=['Provider Documents']
+    )
+    def get(self, request):
+        return Response(self.get_serializer(self.get_queryset(), many=True).data)
+    
+    @swagger_auto_schema(
+        operation_summary='Start a document upload',
+        operation_description="""
+        Starts a resumable upload of a provider document. Send the file's
+        bytes in order to the upload's chunk endpoint.
+        
+        **Limits:** PDF, PNG, JPEG or WebP files of at most
+        PROVIDER_DOCUMENT_MAX_SIZE bytes. The type, size and page count are
+        checked once the upload is complete.
+        """,
+        request_body=DocumentUploadSerializer,
+        responses={
+            201: DocumentUploadSerializer,
+            400: 'Validation errors',
+            403: 'Not a provider'
+        },
+        tags=['Provider Documents']
+    )
+    def post(self, request):
+        provider = Provider.objects.filter(user=request.user).first()
+        if provider is None:
+            return Response({
+                'error': 'You must be a registered provider to upload documents.'
+            }, status=status.HTTP_403_FORBIDDEN)
+        
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            upload = DocumentUploadService.start_upload(
+                provider, data['document_type'], data['filename'], data['total_size']
+            )
+        except UploadRejected as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+class DocumentUploadChunkView(GenericAPIView):
+    """
+    Check or continue a chunked document upload
+    """
+    serializer_class = DocumentUploadSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        return DocumentUpload.objects.filter(provider__user=self.request.user)
+    
+    @swagger_auto_schema(
+        operation_summary='Get a document upload',
+        operation_description='Returns the upload, received_size being the offset of the next chunk.',
+        tags=['Provider Documents']
+    )
+    def get(self, request, upload_id):
+        upload = get_object_or_404(self.get_queryset().select_related('document__blob'), id=upload_id)
+        return Response(self.get_serializer(upload).data)
+    
+    @swagger_auto_schema(
+        operation_summary='Upload a document chunk',
+        operation_description="""
+        Appends the raw request body (application/octet-stream) at `offset`,
+        which must equal the upload's received_size. The chunk is on disk
+        when the request returns.
+        
+        The last chunk completes the upload and returns 201 with the
+        document. Processing (type, size and page checks, thumbnails)
+        continues in the background, see the document's processing_status.
+        A 409 response carries the received_size to resume from.
+        """,
+        manual_parameters=[
+            openapi.Parameter('offset', openapi.IN_QUERY, type=openapi.TYPE_INTEGER, required=True),
+        ],
+        responses={
+            200: DocumentUploadSerializer,
+            201: DocumentUploadSerializer,
+            400: 'Invalid chunk',
+            409: 'Offset does not match the received size'
+        },
+        tags=['Provider Documents']
+    )
+    def put(self, request, upload_id):
+        get_object_or_404(self.get_queryset(), id=upload_id)
+        offset = request.query_params.get('offset', '')
+        if not offset.isdigit():
+            return Response({
+                'error': 'offset must be a non-negative integer.'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        try:
+            upload = DocumentUploadService.append_chunk(upload_id, int(offset), request.stream, length)
+        except UploadOffsetMismatch as e:
+            return Response({
+                'error': str(e),
+                'received_size': e.received_size
+            }, status=status.HTTP_409_CONFLICT)
+        except UploadRejected as e:
+            return Response({
+                'error': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        response_status = status.HTTP_201_CREATED if upload.status == 'complete' else status.HTTP_200_OK
+        return Response(self.get_serializer(upload).data, status=response_status)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Review, ReviewResponse, ReviewHelpful
+from .models import ProviderRatingStats, Review, ReviewPhoto, ReviewResponse, ReviewHelpful
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -53,3 +53,22 @@ class ReviewHelpfulAdmin(admin.ModelAdmin):
     list_filter = ['is_helpful', 'created_at']
     search_fields = ['review__title', 'user__email']
     readonly_fields = ['created_at']
+
+@admin.register(ProviderRatingStats)
+class ProviderRatingStatsAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'review_count', 'average_rating', 'updated_at']
+    search_fields = ['provider__business_name']
+    readonly_fields = ['provider', *ProviderRatingStats.COUNTER_FIELDS, 'updated_at']
+    
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(ReviewPhoto)
+class ReviewPhotoAdmin(admin.ModelAdmin):
+    list_display = ['review', 'position', 'blob', 'created_at']
+    list_filter = ['blob__status', 'created_at']
+    search_fields = ['review__title', 'blob__sha256']
+    readonly_fields = ['blob', 'created_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('review', 'blob')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.reviews.services import ReviewService
+
+
+class Command(BaseCommand):
+    help = "Move legacy job reviews into the reviews table, updating provider rating aggregates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many legacy reviews would be merged'
+        )
+
+    def handle(self, *args, **options):
+        merged, duplicates = ReviewService.merge_job_reviews(dry_run=options['dry_run'])
+        verb = 'Would merge' if options['dry_run'] else 'Merged'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {merged} legacy job reviews, {duplicates} duplicated an existing review'
+        ))
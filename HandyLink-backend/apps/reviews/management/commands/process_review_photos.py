@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from apps.reviews.photos import ReviewPhotoPool
+
+
+class Command(BaseCommand):
+    help = 'Resize review photos left pending'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending-minutes', type=int, default=10,
+            help='Process photos still pending after this many minutes'
+        )
+
+    def handle(self, *args, **options):
+        processed = ReviewPhotoPool.process_pending(options['pending_minutes'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} pending review photos'))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.reviews.services import RatingStatsService
+
+
+class Command(BaseCommand):
+    help = "Recompute provider rating aggregates from the reviews and fix the ones that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the providers whose aggregates drifted'
+        )
+
+    def handle(self, *args, **options):
+        fixed = RatingStatsService.reconcile(dry_run=options['dry_run'])
+        if fixed:
+            self.stdout.write(f"Providers with drifted aggregates: {', '.join(map(str, fixed))}")
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(fixed)} providers with drifted rating aggregates'))
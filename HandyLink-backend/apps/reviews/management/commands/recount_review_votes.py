@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.reviews.services import ReviewVoteService
+
+
+class Command(BaseCommand):
+    help = "Recount the helpful votes of every review and recompute its helpfulness score"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Reviews per bulk update')
+
+    def handle(self, *args, **options):
+        changed = ReviewVoteService.recount(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Updated the vote counts of {changed} reviews'))
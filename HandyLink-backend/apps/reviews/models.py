@@ -1,13 +1,21 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from apps.providers.models import Provider
-from apps.jobs.models import Job
+from apps.jobs.fields import ArchivableJobField
+from core.tracking import TrackedFieldsMixin
 
 User = get_user_model()
 
-class Review(models.Model):
+# Review fields counted in ProviderRatingStats
+RATED_FIELDS = (
+    'provider_id', 'rating', 'quality_rating', 'timeliness_rating',
+    'communication_rating', 'value_rating', 'would_recommend'
+)
+
+class Review(TrackedFieldsMixin, models.Model):
     # Core relationships - using different related_name to avoid conflicts
-    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name='main_review')  # Changed related_name
+    # Reviews outlive the live row of their job, see apps/jobs/fields.py
+    job = ArchivableJobField('jobs.Job', related_name='main_review')
     reviewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reviews_written')
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='reviews_received')
     
@@ -27,6 +35,12 @@ class Review(models.Model):
     photos = models.JSONField(default=list, blank=True)
     would_recommend = models.BooleanField(default=True)
     
+    # Helpfulness votes, maintained by ReviewVoteService
+    helpful_count = models.PositiveIntegerField(default=0, editable=False)
+    total_votes = models.PositiveIntegerField(default=0, editable=False)
+    # Wilson lower bound of the helpful share, for ordering by helpfulness
+    helpful_score = models.FloatField(default=0.0, editable=False)
+    
     # Provider response
     provider_response = models.TextField(blank=True)
     response_date = models.DateTimeField(null=True, blank=True)
@@ -35,8 +49,14 @@ class Review(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Compared by the rating stats and notification signals
+    tracked_fields = RATED_FIELDS + ('provider_response',)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['provider', '-helpful_score', '-created_at']),
+        ]
 
     def __str__(self):
         return f"Review for {self.job.title} - {self.rating} stars"
@@ -50,6 +70,62 @@ class Review(models.Model):
             self.value_rating
         ) / 4
 
+class ProviderRatingStats(models.Model):
+    """
+    Running rating aggregates of a provider, maintained as reviews are
+    created, changed or deleted
+
+    Every counter is updated with F() expressions in the same transaction as
+    the review, so concurrent reviews never lose an update and rating pages
+    read one row instead of aggregating reviews. The reconcile_rating_stats
+    command recomputes them from the reviews.
+    """
+    SUB_RATINGS = ('quality', 'timeliness', 'communication', 'value')
+    COUNTER_FIELDS = (
+        'review_count', 'rating_sum', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5',
+        'quality_sum', 'timeliness_sum', 'communication_sum', 'value_sum', 'recommend_count'
+    )
+    
+    provider = models.OneToOneField(Provider, on_delete=models.CASCADE, primary_key=True, related_name='rating_stats')
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+    quality_sum = models.PositiveIntegerField(default=0)
+    timeliness_sum = models.PositiveIntegerField(default=0)
+    communication_sum = models.PositiveIntegerField(default=0)
+    value_sum = models.PositiveIntegerField(default=0)
+    recommend_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name_plural = "Provider rating stats"
+    
+    def __str__(self):
+        return f"Rating stats for provider {self.provider_id}"
+    
+    def _average(self, total):
+        return round(total / self.review_count, 2) if self.review_count else None
+    
+    @property
+    def average_rating(self):
+        return self._average(self.rating_sum)
+    
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f'stars_{stars}') for stars in range(1, 6)}
+    
+    @property
+    def sub_ratings(self):
+        return {name: self._average(getattr(self, f'{name}_sum')) for name in self.SUB_RATINGS}
+    
+    @property
+    def recommend_rate(self):
+        return round(self.recommend_count / self.review_count, 4) if self.review_count else None
+
 class ReviewResponse(models.Model):
     review = models.OneToOneField(Review, on_delete=models.CASCADE, related_name='response')
     responder = models.ForeignKey(User, on_delete=models.CASCADE)  # Usually the provider
@@ -70,3 +146,49 @@ class ReviewHelpful(models.Model):
 
     def __str__(self):
         return f"{'Helpful' if self.is_helpful else 'Not helpful'} vote for review {self.review.id}"
+
+class PhotoBlob(models.Model):
+    """
+    Stored review photo content, addressed by its SHA-256
+
+    The original is kept under review_photos/sha256/<2 hex>/<2 hex>/<hash>
+    and resized in the background into the REVIEW_PHOTO_VARIANTS sizes,
+    each as WebP and JPEG under review_photos/variants/.../<hash>/. The
+    variants map holds their dimensions and storage names.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('rejected', 'Rejected'),
+    ]
+    
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
+class ReviewPhoto(models.Model):
+    review = models.ForeignKey(Review, on_delete=models.CASCADE, related_name='review_photos')
+    blob = models.ForeignKey(PhotoBlob, on_delete=models.PROTECT, related_name='review_photos')
+    position = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['review', 'position']
+    
+    def __str__(self):
+        return f"Photo {self.position} of review {self.review_id}"
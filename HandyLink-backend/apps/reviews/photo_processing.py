@@ -0,0 +1,65 @@
+"""
+Resizing of review photos into display variants.
+
+These functions run in worker processes of the review photo pool, so they
+only take and return plain values: no Django settings, models or database
+connections. apps/reviews/photos.py stores the results.
+"""
+import os
+import warnings
+
+# (extension, Pillow format, save options) of the files written for every variant
+ENCODINGS = [
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpg', 'JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+]
+
+
+def variant_path(variant_dir, name, extension):
+    return os.path.join(variant_dir, f'{name}.{extension}')
+
+
+def load_image(path, max_pixels):
+    """Decode an image upright and in RGB, refusing ones over `max_pixels` pixels"""
+    from PIL import Image, ImageOps
+
+    with warnings.catch_warnings():
+        # Pillow only warns below twice MAX_IMAGE_PIXELS, refuse those too
+        warnings.simplefilter('error', Image.DecompressionBombWarning)
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        with Image.open(path) as image:
+            return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def process_photo(path, variant_dir, sizes, max_pixels):
+    """
+    Write a WebP and a JPEG of the photo for every variant in `sizes`, a
+    dict of variant name to longest side in pixels. Returns a dict with the
+    photo's width and height, the width and height of each variant and
+    error (empty when the photo is accepted).
+    """
+    from PIL import Image
+
+    result = {'width': None, 'height': None, 'variants': {}, 'error': ''}
+    try:
+        image = load_image(path, max_pixels)
+    except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+        result['error'] = f'The photo has more than {max_pixels} pixels.'
+        return result
+    except Exception as e:
+        result['error'] = f'The photo could not be read: {e}'
+        return result
+    result['width'], result['height'] = image.size
+
+    os.makedirs(variant_dir, exist_ok=True)
+    for name, size in sizes.items():
+        # thumbnail() keeps the aspect ratio and never enlarges
+        variant = image.copy()
+        variant.thumbnail((size, size), Image.LANCZOS)
+        for extension, image_format, options in ENCODINGS:
+            target = variant_path(variant_dir, name, extension)
+            partial_path = f'{target}.partial'
+            variant.save(partial_path, format=image_format, **options)
+            os.replace(partial_path, target)
+        result['variants'][name] = {'width': variant.width, 'height': variant.height}
+    return result
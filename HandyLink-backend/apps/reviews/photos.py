@@ -0,0 +1,121 @@
+"""
+Review photo uploads.
+
+A photo is hashed as it is received and stored once under its hash, so the
+same picture attached to several reviews shares one file and one set of
+variants. Resizing it into the REVIEW_PHOTO_VARIANTS sizes, as WebP and
+JPEG, happens afterwards in a process pool (apps/reviews/photo_processing.py),
+the upload request only stores the original.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.providers.document_processing import sniff_content_type
+from core.pools import BlobProcessingPool
+from . import photo_processing
+from .models import PhotoBlob, Review, ReviewPhoto
+
+logger = logging.getLogger(__name__)
+
+PHOTO_CONTENT_TYPES = ('image/png', 'image/jpeg', 'image/webp')
+
+class PhotoRejected(Exception):
+    """The photo cannot be added to the review"""
+
+def original_name(sha256):
+    """Storage name of a photo, sharded on the first two bytes of its hash"""
+    return f'review_photos/sha256/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+def variant_dir_name(sha256):
+    return f'review_photos/variants/{sha256[:2]}/{sha256[2:4]}/{sha256}'
+
+def ready_photos():
+    """Prefetch of the processed photos of reviews, with their blobs"""
+    return Prefetch(
+        'review_photos',
+        queryset=ReviewPhoto.objects.filter(blob__status='ready').select_related('blob')
+    )
+
+class ReviewPhotoService:
+
+    @staticmethod
+    def add_photo(review, uploaded):
+        """Store an uploaded photo under its hash and attach it to the review"""
+        if not 0 < uploaded.size <= settings.REVIEW_PHOTO_MAX_SIZE:
+            raise PhotoRejected(f'Photos must be between 1 and {settings.REVIEW_PHOTO_MAX_SIZE} bytes.')
+        uploaded.seek(0)
+        if sniff_content_type(uploaded.read(16)) not in PHOTO_CONTENT_TYPES:
+            raise PhotoRejected('Unsupported file type, upload a PNG, JPEG or WebP photo.')
+
+        digest = hashlib.sha256()
+        uploaded.seek(0)
+        for chunk in uploaded.chunks():
+            digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        with transaction.atomic():
+            # Serialise uploads to one review so the photo limit holds
+            review = Review.objects.select_for_update().only('id').get(pk=review.pk)
+            count = review.review_photos.count()
+            if count >= settings.REVIEW_PHOTO_MAX_PER_REVIEW:
+                raise PhotoRejected(f'A review can have at most {settings.REVIEW_PHOTO_MAX_PER_REVIEW} photos.')
+
+            blob = PhotoBlob.objects.filter(sha256=sha256).first()
+            if blob is None:
+                name = original_name(sha256)
+                if not default_storage.exists(name):
+                    uploaded.seek(0)
+                    name = default_storage.save(name, uploaded)
+                blob, created = PhotoBlob.objects.get_or_create(
+                    sha256=sha256, defaults={'file': name, 'size': uploaded.size}
+                )
+                if created:
+                    transaction.on_commit(lambda: ReviewPhotoPool.submit(sha256))
+            return ReviewPhoto.objects.create(review=review, blob=blob, position=count)
+
+class ReviewPhotoPool(BlobProcessingPool):
+    """Process pool resizing review photos, see core/pools.py"""
+
+    workers_setting = 'REVIEW_PHOTO_WORKERS'
+    blob_model = PhotoBlob
+    label = 'review photo'
+    process = staticmethod(photo_processing.process_photo)
+
+    @staticmethod
+    def arguments(blob):
+        return (
+            default_storage.path(blob.file.name),
+            default_storage.path(variant_dir_name(blob.sha256)),
+            dict(settings.REVIEW_PHOTO_VARIANTS),
+            settings.REVIEW_PHOTO_MAX_PIXELS
+        )
+
+    @staticmethod
+    def store_result(sha256, result):
+        directory = variant_dir_name(sha256)
+        variants = {
+            name: {
+                **dimensions,
+                **{
+                    extension: f'{directory}/{name}.{extension}'
+                    for extension, image_format, options in photo_processing.ENCODINGS
+                },
+            }
+            for name, dimensions in result['variants'].items()
+        }
+        PhotoBlob.objects.filter(sha256=sha256).update(
+            status='rejected' if result['error'] else 'ready',
+            error=result['error'],
+            width=result['width'],
+            height=result['height'],
+            variants=variants,
+            processed_at=timezone.now()
+        )
+        if result['error']:
+            logger.info(f"Rejected review photo {sha256}: {result['error']}")
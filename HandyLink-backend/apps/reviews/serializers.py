@@ -1,5 +1,6 @@
+from django.core.files.storage import default_storage
 from rest_framework import serializers
-from .models import Review, ReviewResponse, ReviewHelpful
+from .models import ProviderRatingStats, Review, ReviewPhoto, ReviewResponse, ReviewHelpful
 from apps.jobs.models import Job
 
 class ReviewCreateSerializer(serializers.ModelSerializer):
@@ -8,7 +9,7 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
         fields = [
             'title', 'content', 'rating', 'quality_rating', 
             'timeliness_rating', 'communication_rating', 'value_rating',
-            'would_recommend', 'photos'
+            'would_recommend'
         ]
     
     def validate_rating(self, value):
@@ -16,11 +17,40 @@ class ReviewCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Rating must be between 1 and 5")
         return value
 
+class ReviewPhotoSerializer(serializers.ModelSerializer):
+    """
+    A review photo with a compact map of its variants, {name: {width,
+    height, webp, jpg}} with URLs. Only the variants listed in the
+    `photo_variants` context are included when it is set.
+    """
+    status = serializers.CharField(source='blob.status', read_only=True)
+    width = serializers.IntegerField(source='blob.width', read_only=True)
+    height = serializers.IntegerField(source='blob.height', read_only=True)
+    variants = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ReviewPhoto
+        fields = ['id', 'status', 'width', 'height', 'variants']
+    
+    def get_variants(self, obj):
+        wanted = self.context.get('photo_variants')
+        return {
+            name: {
+                key: default_storage.url(value) if isinstance(value, str) else value
+                for key, value in variant.items()
+            }
+            for name, variant in obj.blob.variants.items()
+            if wanted is None or name in wanted
+        }
+
 class ReviewSerializer(serializers.ModelSerializer):
     reviewer_name = serializers.SerializerMethodField()
     provider_name = serializers.CharField(source='provider.business_name', read_only=True)
     job_title = serializers.CharField(source='job.title', read_only=True)
     helpful_votes = serializers.SerializerMethodField()
+    photos = serializers.SerializerMethodField()
+    # Photo URLs stored on Review.photos before uploads were processed
+    legacy_photos = serializers.ListField(source='photos', child=serializers.CharField(), read_only=True)
     average_detailed_rating = serializers.ReadOnlyField()
     
     class Meta:
@@ -28,7 +58,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'title', 'content', 'rating', 'quality_rating',
             'timeliness_rating', 'communication_rating', 'value_rating',
-            'would_recommend', 'photos', 'reviewer_name', 'provider_name',
+            'would_recommend', 'photos', 'legacy_photos', 'reviewer_name', 'provider_name',
             'job_title', 'provider_response', 'response_date',
             'helpful_votes', 'average_detailed_rating', 'created_at'
         ]
@@ -37,12 +67,15 @@ class ReviewSerializer(serializers.ModelSerializer):
         return f"{obj.reviewer.first_name} {obj.reviewer.last_name}".strip()
     
     def get_helpful_votes(self, obj):
-        helpful_count = obj.helpful_votes.filter(is_helpful=True).count()
-        total_votes = obj.helpful_votes.count()
         return {
-            'helpful': helpful_count,
-            'total': total_votes
+            'helpful': obj.helpful_count,
+            'total': obj.total_votes
         }
+    
+    def get_photos(self, obj):
+        # Views prefetch the processed photos with apps.reviews.photos.ready_photos()
+        photos = [photo for photo in obj.review_photos.all() if photo.blob.status == 'ready']
+        return ReviewPhotoSerializer(photos, many=True, context=self.context).data
 
 class ReviewResponseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -62,3 +95,17 @@ class ReviewListSerializer(serializers.ModelSerializer):
     
     def get_reviewer_name(self, obj):
         return f"{obj.reviewer.first_name} {obj.reviewer.last_name}".strip()
+
+class ProviderRatingSummarySerializer(serializers.ModelSerializer):
+    provider_id = serializers.IntegerField(read_only=True)
+    average_rating = serializers.FloatField(read_only=True)
+    histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+    sub_ratings = serializers.DictField(child=serializers.FloatField(allow_null=True), read_only=True)
+    recommend_rate = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = ProviderRatingStats
+        fields = [
+            'provider_id', 'review_count', 'average_rating', 'histogram',
+            'sub_ratings', 'recommend_rate', 'updated_at'
+        ]
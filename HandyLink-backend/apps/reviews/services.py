@@ -0,0 +1,299 @@
+import math
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils.text import Truncator
+
+from apps.jobs.models import JobReview
+from apps.providers.models import Provider
+from .models import RATED_FIELDS, ProviderRatingStats, Review, ReviewHelpful
+
+
+class ReviewRejected(Exception):
+    """The job cannot be reviewed"""
+
+class ReviewService:
+    """
+    The one write path for job reviews
+
+    Both the reviews endpoint and the legacy jobs/<id>/review/ endpoint
+    create Review rows through here, so rating aggregates (signals.py) and
+    the provider's cached profile follow every review. jobs.JobReview only
+    holds rows written before the merge, which merge_job_reviews moves over.
+    """
+
+    @staticmethod
+    def legacy_fields(rating, comment):
+        """Review fields for a review given only a star rating and a comment"""
+        first_line = comment.strip().split('\n')[0]
+        return {
+            'rating': rating,
+            'title': Truncator(first_line).chars(80) or f'{rating} stars',
+            'content': comment,
+            'quality_rating': rating,
+            'timeliness_rating': rating,
+            'communication_rating': rating,
+            'value_rating': rating,
+            'would_recommend': rating >= 4,
+        }
+
+    @staticmethod
+    def create_review(job, reviewer, **fields):
+        """Review a completed job for its assigned provider, raising ReviewRejected if it cannot be"""
+        if not job.assigned_to_id:
+            raise ReviewRejected('No provider assigned to this job')
+        if Review.objects.filter(job=job).exists():
+            raise ReviewRejected('Review already exists for this job')
+        try:
+            with transaction.atomic():
+                return Review.objects.create(job=job, reviewer=reviewer, provider_id=job.assigned_to_id, **fields)
+        except IntegrityError:
+            # Another request reviewed the job since the check
+            raise ReviewRejected('Review already exists for this job')
+
+    @staticmethod
+    def merge_job_reviews(dry_run=False):
+        """
+        Move jobs.JobReview rows into Review, returning (merged, duplicates).
+        Legacy reviews of a job that already has a Review are dropped as
+        duplicates, the Review is kept. Merged rows are inserted with
+        bulk_create so the post_save receivers do not notify providers about
+        old reviews, and are counted in the rating stats here instead.
+        """
+        merged = duplicates = 0
+        reviewed = set(Review.objects.values_list('job_id', flat=True))
+        for legacy in JobReview.objects.order_by('id').iterator():
+            if legacy.job_id in reviewed:
+                duplicates += 1
+            else:
+                merged += 1
+            if dry_run:
+                continue
+            with transaction.atomic():
+                if legacy.job_id not in reviewed:
+                    review = Review(
+                        job_id=legacy.job_id,
+                        reviewer_id=legacy.reviewer_id,
+                        provider_id=legacy.provider_id,
+                        **ReviewService.legacy_fields(legacy.rating, legacy.comment)
+                    )
+                    Review.objects.bulk_create([review])
+                    # created_at is auto_now_add, keep the original date with an update
+                    Review.objects.filter(job_id=legacy.job_id).update(created_at=legacy.created_at)
+                    RatingStatsService.add_review({field: getattr(review, field) for field in RATED_FIELDS})
+                    reviewed.add(legacy.job_id)
+                legacy.delete()
+        return merged, duplicates
+
+class RatingStatsService:
+    """
+    Incremental provider rating aggregates
+
+    A review adds one to its star bucket and its ratings to the running
+    sums of ProviderRatingStats. The provider's rating and total_reviews are
+    derived from the updated row in the same transaction, and the profile
+    version is bumped in that same UPDATE.
+    """
+
+    @staticmethod
+    def review_deltas(ratings, sign):
+        """Counter changes for adding (sign 1) or removing (sign -1) a review's ratings"""
+        return {
+            'review_count': sign,
+            'rating_sum': sign * ratings['rating'],
+            f"stars_{ratings['rating']}": sign,
+            'quality_sum': sign * ratings['quality_rating'],
+            'timeliness_sum': sign * ratings['timeliness_rating'],
+            'communication_sum': sign * ratings['communication_rating'],
+            'value_sum': sign * ratings['value_rating'],
+            'recommend_count': sign * int(bool(ratings['would_recommend'])),
+        }
+
+    @staticmethod
+    def apply(provider_id, deltas):
+        """Apply counter changes to a provider's stats and refresh their rating"""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        with transaction.atomic():
+            ProviderRatingStats.objects.get_or_create(provider_id=provider_id)
+            # The UPDATE locks the row, so concurrent reviews of a provider apply one after the other
+            ProviderRatingStats.objects.filter(provider_id=provider_id).update(
+                **{field: F(field) + delta for field, delta in deltas.items()}
+            )
+            count, total = ProviderRatingStats.objects.filter(provider_id=provider_id).values_list(
+                'review_count', 'rating_sum'
+            ).get()
+            Provider.objects.filter(pk=provider_id).update(
+                rating=RatingStatsService.rating(count, total),
+                total_reviews=count,
+                profile_version=F('profile_version') + 1
+            )
+
+    @staticmethod
+    def add_review(ratings):
+        RatingStatsService.apply(ratings['provider_id'], RatingStatsService.review_deltas(ratings, 1))
+
+    @staticmethod
+    def remove_review(ratings):
+        RatingStatsService.apply(ratings['provider_id'], RatingStatsService.review_deltas(ratings, -1))
+
+    @staticmethod
+    def change_review(old, new):
+        """Move a changed review's ratings from its old values to its new ones"""
+        if old['provider_id'] != new['provider_id']:
+            RatingStatsService.remove_review(old)
+            RatingStatsService.add_review(new)
+            return
+        deltas = RatingStatsService.review_deltas(old, -1)
+        for field, delta in RatingStatsService.review_deltas(new, 1).items():
+            deltas[field] = deltas.get(field, 0) + delta
+        RatingStatsService.apply(new['provider_id'], deltas)
+
+    @staticmethod
+    def computed_stats():
+        """Stats of every reviewed provider recomputed from the reviews, by provider id"""
+        rows = Review.objects.order_by().values('provider_id').annotate(
+            review_count=Count('id'),
+            rating_sum=Sum('rating'),
+            **{f'stars_{stars}': Count('id', filter=Q(rating=stars)) for stars in range(1, 6)},
+            quality_sum=Sum('quality_rating'),
+            timeliness_sum=Sum('timeliness_rating'),
+            communication_sum=Sum('communication_rating'),
+            value_sum=Sum('value_rating'),
+            recommend_count=Count('id', filter=Q(would_recommend=True))
+        )
+        return {row.pop('provider_id'): row for row in rows}
+
+    @staticmethod
+    def rating(count, total):
+        return (Decimal(total) / count).quantize(Decimal('0.01')) if count else Decimal('0.00')
+
+    @staticmethod
+    def reconcile(dry_run=False):
+        """
+        Recompute every provider's stats from their reviews and fix the
+        providers whose stats, rating or review count drifted, returning
+        their ids
+        """
+        computed = RatingStatsService.computed_stats()
+        zero = dict.fromkeys(ProviderRatingStats.COUNTER_FIELDS, 0)
+        stored = {
+            row[0]: dict(zip(ProviderRatingStats.COUNTER_FIELDS, row[1:]))
+            for row in ProviderRatingStats.objects.values_list('provider_id', *ProviderRatingStats.COUNTER_FIELDS)
+        }
+
+        fixed = []
+        for provider_id, rating, total_reviews in Provider.objects.values_list('id', 'rating', 'total_reviews').iterator():
+            expected = computed.get(provider_id, zero)
+            drifted = (
+                stored.get(provider_id, zero) != expected or
+                total_reviews != expected['review_count'] or
+                rating != RatingStatsService.rating(expected['review_count'], expected['rating_sum'])
+            )
+            if drifted:
+                fixed.append(provider_id)
+                if not dry_run:
+                    RatingStatsService.store(provider_id, expected)
+        return fixed
+
+    @staticmethod
+    def store(provider_id, values):
+        """Overwrite a provider's stats and rating with recomputed values"""
+        with transaction.atomic():
+            ProviderRatingStats.objects.update_or_create(provider_id=provider_id, defaults=values)
+            Provider.objects.filter(pk=provider_id).update(
+                rating=RatingStatsService.rating(values['review_count'], values['rating_sum']),
+                total_reviews=values['review_count'],
+                profile_version=F('profile_version') + 1
+            )
+
+
+class ReviewVoteService:
+    """
+    Helpfulness votes with counters denormalized on Review
+
+    Casting, changing or withdrawing a vote adjusts Review.helpful_count and
+    Review.total_votes in the vote's transaction, so serializing a review
+    reads two columns instead of counting votes. Review.helpful_score, the
+    lower bound of the Wilson score interval of the helpful share, is
+    rewritten at the same time so "most helpful" is an index walk: a review
+    with 40 of 50 helpful votes ranks above one with a single helpful vote.
+    """
+
+    # 95% confidence
+    WILSON_Z = 1.96
+
+    @staticmethod
+    def wilson_score(helpful, total):
+        """Lower bound of the Wilson score interval of helpful / total, 0 without votes"""
+        if not total:
+            return 0.0
+        z = ReviewVoteService.WILSON_Z
+        share = helpful / total
+        centre = share + z * z / (2 * total)
+        margin = z * math.sqrt((share * (1 - share) + z * z / (4 * total)) / total)
+        return round((centre - margin) / (1 + z * z / total), 6)
+
+    @staticmethod
+    def vote(review_id, user, is_helpful):
+        """Record a user's vote on a review, returning whether it was a new vote"""
+        with transaction.atomic():
+            # Lock the review first so concurrent first votes by one user queue
+            # here instead of both inserting and failing the unique constraint
+            if not Review.objects.select_for_update().filter(pk=review_id).values_list('id').first():
+                return False
+            existing = ReviewHelpful.objects.select_for_update().filter(review_id=review_id, user=user).first()
+            if existing is None:
+                ReviewHelpful.objects.create(review_id=review_id, user=user, is_helpful=is_helpful)
+                ReviewVoteService.adjust(review_id, int(is_helpful), 1)
+                return True
+            if existing.is_helpful != is_helpful:
+                existing.is_helpful = is_helpful
+                existing.save(update_fields=['is_helpful'])
+                ReviewVoteService.adjust(review_id, 1 if is_helpful else -1, 0)
+            return False
+
+    @staticmethod
+    def adjust(review_id, helpful_delta, total_delta):
+        """Apply vote count changes to a review and rescore it"""
+        with transaction.atomic():
+            # The score depends on both counters, so read and write them under the row lock
+            counts = Review.objects.select_for_update().filter(pk=review_id).values_list(
+                'helpful_count', 'total_votes'
+            ).first()
+            if counts is None:
+                return
+            helpful, total = counts[0] + helpful_delta, counts[1] + total_delta
+            Review.objects.filter(pk=review_id).update(
+                helpful_count=helpful,
+                total_votes=total,
+                helpful_score=ReviewVoteService.wilson_score(helpful, total)
+            )
+
+    @staticmethod
+    def recount(chunk_size=1000):
+        """Recount every review's votes and rescore it, returning the number of reviews changed"""
+        reviews = Review.objects.annotate(
+            counted_helpful=Count('helpful_votes', filter=Q(helpful_votes__is_helpful=True)),
+            counted_total=Count('helpful_votes')
+        ).only('id', 'helpful_count', 'total_votes', 'helpful_score').order_by('id')
+
+        changed = []
+        for review in reviews.iterator(chunk_size=chunk_size):
+            score = ReviewVoteService.wilson_score(review.counted_helpful, review.counted_total)
+            if (review.helpful_count, review.total_votes, review.helpful_score) == (
+                review.counted_helpful, review.counted_total, score
+            ):
+                continue
+            review.helpful_count = review.counted_helpful
+            review.total_votes = review.counted_total
+            review.helpful_score = score
+            changed.append(review)
+        for start in range(0, len(changed), chunk_size):
+            with transaction.atomic():
+                Review.objects.bulk_update(
+                    changed[start:start + chunk_size], ['helpful_count', 'total_votes', 'helpful_score']
+                )
+        return len(changed)
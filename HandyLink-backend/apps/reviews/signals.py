@@ -0,0 +1,29 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import RATED_FIELDS, Review, ReviewHelpful
+from .services import RatingStatsService, ReviewVoteService
+
+def review_ratings(review):
+    return {field: getattr(review, field) for field in RATED_FIELDS}
+
+@receiver(post_save, sender=Review)
+def update_provider_rating_stats(sender, instance, created, **kwargs):
+    """Count new reviews in the provider's rating stats and move changed ones"""
+    ratings = review_ratings(instance)
+    if created:
+        RatingStatsService.add_review(ratings)
+        return
+    stored = instance.original_values(RATED_FIELDS)
+    if stored is not None and stored != ratings:
+        RatingStatsService.change_review(stored, ratings)
+
+@receiver(post_delete, sender=Review)
+def remove_deleted_review(sender, instance, **kwargs):
+    """Deleted reviews no longer count towards the provider's rating"""
+    RatingStatsService.remove_review(instance.original_values(RATED_FIELDS) or review_ratings(instance))
+
+@receiver(post_delete, sender=ReviewHelpful)
+def remove_deleted_vote(sender, instance, **kwargs):
+    """Deleted votes no longer count on the review"""
+    ReviewVoteService.adjust(instance.review_id, -int(instance.is_helpful), -1)
@@ -1,3 +1,385 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.jobs.models import Job, JobCategory, JobReview
+from apps.notifications.models import Notification
+from apps.providers.models import Provider
+from .models import PhotoBlob, ProviderRatingStats, Review
+from .services import ReviewVoteService
+from . import photo_processing
+from .photos import ReviewPhotoPool
+
+User = get_user_model()
+
+
+def make_user(email):
+    return User.objects.create_user(email=email, first_name='Test', last_name='User', password='pass1234')
+
+
+class ProviderRatingStatsTests(TestCase):
+    def setUp(self):
+        self.owner = make_user('owner@example.com')
+        self.provider = Provider.objects.create(
+            user=make_user('provider@example.com'), business_name='Fixit', status='approved', is_verified=True
+        )
+        self.category = JobCategory.objects.create(name='Painting')
+
+    def completed_job(self):
+        return Job.objects.create(
+            title='Paint the fence', description='About 20 metres.', category=self.category,
+            posted_by=self.owner, budget_min=Decimal('50.00'), budget_max=Decimal('90.00'),
+            location='Nairobi', status='completed', assigned_to=self.provider
+        )
+
+    def review(self, rating, **ratings):
+        ratings = {
+            'quality_rating': rating, 'timeliness_rating': rating,
+            'communication_rating': rating, 'value_rating': rating, **ratings
+        }
+        return Review.objects.create(
+            job=self.completed_job(), reviewer=self.owner, provider=self.provider,
+            rating=rating, title='Review', content='Done.', **ratings
+        )
+
+    def test_create_review_updates_aggregates(self):
+        self.review(5)
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(reverse('create-review', args=[self.completed_job().id]), {
+            'title': 'Late', 'content': 'Arrived late.', 'rating': 2, 'quality_rating': 4,
+            'timeliness_rating': 1, 'communication_rating': 3, 'value_rating': 2, 'would_recommend': False
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        self.provider.refresh_from_db()
+        self.assertEqual((self.provider.rating, self.provider.total_reviews), (Decimal('3.50'), 2))
+
+        with self.assertNumQueries(2):
+            summary = APIClient().get(reverse('provider-rating-summary', args=[self.provider.id])).data
+        self.assertEqual(summary['review_count'], 2)
+        self.assertEqual(summary['average_rating'], 3.5)
+        self.assertEqual(summary['histogram'], {'1': 0, '2': 1, '3': 0, '4': 0, '5': 1})
+        self.assertEqual(summary['sub_ratings'], {'quality': 4.5, 'timeliness': 3.0, 'communication': 4.0, 'value': 3.5})
+        self.assertEqual(summary['recommend_rate'], 0.5)
+
+    def test_changed_and_deleted_reviews(self):
+        first, second = self.review(5), self.review(1)
+        second.rating = 3
+        second.save()
+        stats = ProviderRatingStats.objects.get(provider=self.provider)
+        self.assertEqual((stats.stars_1, stats.stars_3, stats.rating_sum), (0, 1, 8))
+
+        first.delete()
+        stats.refresh_from_db()
+        self.provider.refresh_from_db()
+        self.assertEqual((stats.review_count, stats.stars_5, stats.average_rating), (1, 0, 3))
+        self.assertEqual((self.provider.rating, self.provider.total_reviews), (Decimal('3.00'), 1))
+
+    def test_reconcile_fixes_drift(self):
+        self.review(4)
+        self.review(2)
+        ProviderRatingStats.objects.filter(provider=self.provider).update(review_count=7, stars_4=0)
+        Provider.objects.filter(pk=self.provider.pk).update(rating=Decimal('1.00'))
+
+        out = StringIO()
+        call_command('reconcile_rating_stats', stdout=out)
+        self.assertIn('Fixed 1 providers', out.getvalue())
+        stats = ProviderRatingStats.objects.get(provider=self.provider)
+        self.assertEqual((stats.review_count, stats.stars_4, stats.average_rating), (2, 1, 3))
+        self.provider.refresh_from_db()
+        self.assertEqual(self.provider.rating, Decimal('3.00'))
+
+        out = StringIO()
+        call_command('reconcile_rating_stats', stdout=out)
+        self.assertIn('Fixed 0 providers', out.getvalue())
+
+
+    def test_legacy_job_review_endpoint_writes_reviews(self):
+        job = self.completed_job()
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(reverse('job-review', args=[job.id]), {'rating': 2, 'comment': 'Too slow.\nLeft a mess.'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['comment'], 'Too slow.\nLeft a mess.')
+
+        review = Review.objects.get(job=job)
+        self.assertEqual((review.title, review.value_rating, review.would_recommend), ('Too slow.', 2, False))
+        self.assertEqual(ProviderRatingStats.objects.get(provider=self.provider).review_count, 1)
+        self.assertEqual(client.get(reverse('job-review', args=[job.id])).data['rating'], 2)
+
+        # Either endpoint sees the review the other one wrote
+        response = client.post(reverse('create-review', args=[job.id]), {
+            'title': 'Again', 'content': 'Twice.', 'rating': 5, 'quality_rating': 5,
+            'timeliness_rating': 5, 'communication_rating': 5, 'value_rating': 5
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(client.post(reverse('job-review', args=[job.id]), {'rating': 5, 'comment': 'x'}).status_code, 400)
+
+    def test_merge_job_reviews(self):
+        reviewed = self.review(5).job
+        JobReview.objects.create(job=reviewed, reviewer=self.owner, provider=self.provider, rating=1, comment='Dup')
+        legacy = JobReview.objects.create(
+            job=self.completed_job(), reviewer=self.owner, provider=self.provider, rating=3, comment='Fine'
+        )
+
+        notifications = Notification.objects.count()
+        out = StringIO()
+        call_command('merge_job_reviews', stdout=out)
+        self.assertIn('Merged 1 legacy job reviews, 1 duplicated', out.getvalue())
+        # Old reviews are not announced to the provider again
+        self.assertEqual(Notification.objects.count(), notifications)
+        self.assertFalse(JobReview.objects.exists())
+        merged = Review.objects.get(job_id=legacy.job_id)
+        self.assertEqual((merged.rating, merged.content, merged.created_at), (3, 'Fine', legacy.created_at))
+        self.provider.refresh_from_db()
+        self.assertEqual((self.provider.rating, self.provider.total_reviews), (Decimal('4.00'), 2))
+
+
+class ReviewHelpfulVoteTests(TestCase):
+    def setUp(self):
+        owner = make_user('owner@example.com')
+        provider = Provider.objects.create(
+            user=make_user('provider@example.com'), business_name='Fixit', status='approved', is_verified=True
+        )
+        category = JobCategory.objects.create(name='Painting')
+        self.reviews = []
+        for i in range(5):
+            job = Job.objects.create(
+                title='Paint the fence', description='About 20 metres.', category=category,
+                posted_by=owner, budget_min=Decimal('50.00'), budget_max=Decimal('90.00'),
+                location='Nairobi', status='completed', assigned_to=provider
+            )
+            self.reviews.append(Review.objects.create(
+                job=job, reviewer=owner, provider=provider, rating=4, title='Good', content='Nice work.',
+                quality_rating=4, timeliness_rating=4, communication_rating=4, value_rating=4
+            ))
+        self.provider = provider
+        self.voters = [make_user(f'voter{i}@example.com') for i in range(2)]
+
+    def vote(self, user, review, is_helpful):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse('review-helpfulness', args=[review.id]), {'is_helpful': is_helpful}, format='json')
+
+    def test_votes_and_flips_update_counters(self):
+        review = self.reviews[0]
+        self.vote(self.voters[0], review, True)
+        self.vote(self.voters[1], review, False)
+        review.refresh_from_db()
+        self.assertEqual((review.helpful_count, review.total_votes), (1, 2))
+
+        # Flipping a vote moves it without adding one, repeating it changes nothing
+        self.vote(self.voters[1], review, True)
+        self.vote(self.voters[1], review, True)
+        review.refresh_from_db()
+        self.assertEqual((review.helpful_count, review.total_votes), (2, 2))
+
+        review.helpful_votes.get(user=self.voters[0]).delete()
+        review.refresh_from_db()
+        self.assertEqual((review.helpful_count, review.total_votes), (1, 1))
+        self.assertEqual(self.vote(self.voters[0], review, 'maybe').status_code, 400)
+
+    def test_review_page_does_not_count_votes(self):
+        self.vote(self.voters[0], self.reviews[2], True)
+        # The reviews and their processed photos
+        with self.assertNumQueries(2):
+            response = APIClient().get(reverse('provider-reviews', args=[self.provider.id]))
+        votes = {row['id']: row['helpful_votes'] for row in response.data}
+        self.assertEqual(votes[self.reviews[2].id], {'helpful': 1, 'total': 1})
+
+    def test_most_helpful_ordering(self):
+        for voter in self.voters:
+            self.vote(voter, self.reviews[3], True)
+        self.vote(self.voters[0], self.reviews[1], True)
+        self.vote(self.voters[0], self.reviews[4], False)
+
+        response = APIClient().get(reverse('provider-reviews', args=[self.provider.id]), {'ordering': 'helpful'})
+        self.assertEqual(
+            [row['id'] for row in response.data],
+            [self.reviews[i].id for i in (3, 1, 4, 2, 0)]
+        )
+        self.assertEqual(ReviewVoteService.wilson_score(0, 0), 0.0)
+        self.assertGreater(ReviewVoteService.wilson_score(40, 50), ReviewVoteService.wilson_score(1, 1))
+
+        Review.objects.filter(pk=self.reviews[3].pk).update(helpful_count=0, total_votes=0, helpful_score=0)
+        self.assertEqual(ReviewVoteService.recount(), 1)
+        self.assertEqual(Review.objects.get(pk=self.reviews[3].pk).total_votes, 2)
+
+
+class ConcurrentReviewVoteTests(TransactionTestCase):
+    workers = 6
+
+    def test_parallel_first_votes_count_once(self):
+        owner = make_user('owner@example.com')
+        provider = Provider.objects.create(
+            user=make_user('provider@example.com'), business_name='Fixit', status='approved', is_verified=True
+        )
+        job = Job.objects.create(
+            title='Paint the fence', description='About 20 metres.',
+            category=JobCategory.objects.create(name='Painting'), posted_by=owner,
+            budget_min=Decimal('50.00'), budget_max=Decimal('90.00'), location='Nairobi',
+            status='completed', assigned_to=provider
+        )
+        review = Review.objects.create(
+            job=job, reviewer=owner, provider=provider, rating=4, title='Good', content='Nice work.',
+            quality_rating=4, timeliness_rating=4, communication_rating=4, value_rating=4
+        )
+        voter = make_user('voter@example.com')
+        barrier = threading.Barrier(self.workers)
+        errors = []
+
+        def vote():
+            try:
+                barrier.wait()
+                try:
+                    ReviewVoteService.vote(review.id, voter, True)
+                except OperationalError:
+                    # Locked out by SQLite, the vote is not recorded
+                    pass
+                except Exception as e:
+                    errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=vote) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        review.refresh_from_db()
+        self.assertEqual(review.helpful_votes.count(), 1)
+        self.assertEqual((review.helpful_count, review.total_votes), (1, 1))
+
+
+class ReviewPhotoTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            REVIEW_PHOTO_VARIANTS={'thumb': 100, 'large': 400},
+            REVIEW_PHOTO_MAX_PER_REVIEW=2,
+            REVIEW_PHOTO_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = make_user('owner@example.com')
+        self.provider = Provider.objects.create(
+            user=make_user('provider@example.com'), business_name='Fixit', status='approved', is_verified=True
+        )
+        job = Job.objects.create(
+            title='Paint the fence', description='About 20 metres.', category=JobCategory.objects.create(name='Painting'),
+            posted_by=self.owner, budget_min=Decimal('50.00'), budget_max=Decimal('90.00'),
+            location='Nairobi', status='completed', assigned_to=self.provider
+        )
+        self.review = Review.objects.create(
+            job=job, reviewer=self.owner, provider=self.provider, rating=5, title='Great', content='Neat job.',
+            quality_rating=5, timeliness_rating=5, communication_rating=5, value_rating=5
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def jpeg(self, color=(200, 30, 30)):
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.new('RGB', (1000, 500), color).save(output, format='JPEG')
+        return output.getvalue()
+
+    def upload(self, content, name='fence.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse('review-photos', args=[self.review.id]),
+                {'photo': SimpleUploadedFile(name, content)}, format='multipart'
+            )
+
+    def test_upload_makes_variants_and_lists_show_thumbnails(self):
+        response = self.upload(self.jpeg())
+        self.assertEqual(response.status_code, 202)
+
+        blob = PhotoBlob.objects.get()
+        self.assertEqual((blob.status, blob.width, blob.height), ('ready', 1000, 500))
+        self.assertEqual(blob.variants['thumb']['width'], 100)
+        self.assertEqual(blob.variants['large']['height'], 200)
+        with open(f"{self.media_root}/{blob.variants['thumb']['webp']}", 'rb') as f:
+            self.assertEqual(f.read(4), b'RIFF')
+
+        listed = APIClient().get(reverse('provider-reviews', args=[self.provider.id])).data[0]['photos']
+        self.assertEqual(list(listed[0]['variants']), ['thumb'])
+        self.assertTrue(listed[0]['variants']['thumb']['jpg'].endswith(f'{blob.sha256}/thumb.jpg'))
+        detail = APIClient().get(reverse('review-detail', args=[self.review.id])).data['photos']
+        self.assertEqual(sorted(detail[0]['variants']), ['large', 'thumb'])
+
+    def test_legacy_photo_urls_are_still_listed(self):
+        Review.objects.filter(pk=self.review.pk).update(photos=['https://cdn.example.com/fence.jpg'])
+        self.upload(self.jpeg())
+
+        data = APIClient().get(reverse('review-detail', args=[self.review.id])).data
+        self.assertEqual(data['legacy_photos'], ['https://cdn.example.com/fence.jpg'])
+        self.assertEqual(len(data['photos']), 1)
+
+    def test_pools_share_one_executor(self):
+        from apps.providers.uploads import DocumentProcessingPool
+        from core.pools import BlobProcessingPool
+
+        executor = ReviewPhotoPool.executor()
+        self.addCleanup(setattr, BlobProcessingPool, '_executor', None)
+        self.addCleanup(executor.shutdown)
+        self.assertIs(DocumentProcessingPool.executor(), executor)
+
+        with self.assertRaisesMessage(TypeError, 'must set blob_model, arguments, store_result'):
+            type('BrokenPool', (BlobProcessingPool,), {
+                'workers_setting': 'REVIEW_PHOTO_WORKERS', 'process': staticmethod(print)
+            })
+
+    def test_inline_callback_keeps_the_request_connection(self):
+        from concurrent.futures import Future
+
+        self.upload(self.jpeg())
+        blob = PhotoBlob.objects.get()
+        future = Future()
+        future.set_result(photo_processing.process_photo(*ReviewPhotoPool.arguments(blob)))
+        with mock.patch('core.pools.connections.close_all') as close_all:
+            # A future done before its callback is added runs the callback in the submitting thread
+            ReviewPhotoPool._store_future(blob.sha256, future, threading.get_ident())
+            close_all.assert_not_called()
+            ReviewPhotoPool._store_future(blob.sha256, future, threading.get_ident() + 1)
+            close_all.assert_called_once()
+        self.assertEqual(PhotoBlob.objects.get().status, 'ready')
+
+    def test_identical_photos_share_one_blob_and_limits_apply(self):
+        content = self.jpeg()
+        self.assertEqual(self.upload(content).status_code, 202)
+        self.assertEqual(self.upload(content, 'again.jpg').status_code, 202)
+        self.assertEqual(PhotoBlob.objects.count(), 1)
+        self.assertEqual(self.review.review_photos.count(), 2)
+
+        response = self.upload(self.jpeg((0, 0, 0)))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('at most 2 photos', response.data['message'])
+
+        self.review.review_photos.all().delete()
+        self.assertEqual(self.upload(b'GIF89a' + b'\0' * 100, 'x.gif').status_code, 400)
+        other = APIClient()
+        other.force_authenticate(self.provider.user)
+        response = other.post(
+            reverse('review-photos', args=[self.review.id]),
+            {'photo': SimpleUploadedFile('x.jpg', content)}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 404)
@@ -1,16 +1,19 @@
 from rest_framework.generics import GenericAPIView, ListAPIView, RetrieveAPIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from rest_framework.permissions import IsAuthenticated
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from django.db.models import Avg, Count, Q
+from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import Review, ReviewHelpful, ReviewResponse
+from .models import ProviderRatingStats, Review, ReviewPhoto, ReviewResponse
+from .services import ReviewRejected, ReviewService, ReviewVoteService
+from .photos import PhotoRejected, ReviewPhotoService, ready_photos
 from .serializers import (
-    ReviewCreateSerializer, ReviewSerializer, ReviewResponseSerializer
+    ReviewCreateSerializer, ReviewSerializer, ReviewResponseSerializer, ProviderRatingSummarySerializer,
+    ReviewPhotoSerializer
 )
 from apps.jobs.models import Job
 from apps.providers.models import Provider
@@ -40,65 +43,76 @@ class CreateReviewView(GenericAPIView):
         try:
             job = Job.objects.get(id=job_id, posted_by=request.user, status='completed')
             
-            # Check if review already exists
-            if hasattr(job, 'main_review'):
-                return Response({
-                    'message': 'Review already exists for this job'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            if not job.assigned_to:
+            serializer = self.get_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            try:
+                # Saving the review updates the provider's rating aggregates, see signals.py
+                review = ReviewService.create_review(job, request.user, **serializer.validated_data)
+            except ReviewRejected as e:
                 return Response({
-                    'message': 'No provider assigned to this job'
+                    'message': str(e)
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            serializer = self.get_serializer(data=request.data)
-            if serializer.is_valid(raise_exception=True):
-                review = serializer.save(
-                    job=job,
-                    reviewer=request.user,
-                    provider=job.assigned_to
-                )
-                
-                # Update provider's average rating
-                self.update_provider_rating(job.assigned_to)
-                
-                return Response({
-                    'message': 'Review created successfully',
-                    'review_id': review.id
-                }, status=status.HTTP_201_CREATED)
+            return Response({
+                'message': 'Review created successfully',
+                'review_id': review.id
+            }, status=status.HTTP_201_CREATED)
                 
         except Job.DoesNotExist:
             return Response({
                 'message': 'Job not found or not eligible for review'
             }, status=status.HTTP_404_NOT_FOUND)
     
-    def update_provider_rating(self, provider):
-        """Update provider's average rating based on all reviews"""
-        reviews = provider.reviews_received.all()
-        avg_rating = reviews.aggregate(Avg('rating'))['rating__avg']
-        total_reviews = reviews.count()
-        
-        provider.rating = avg_rating or 0.0
-        provider.total_reviews = total_reviews
-        provider.save()
-
 class ProviderReviewsView(ListAPIView):
     serializer_class = ReviewSerializer
     
     def get_queryset(self):
         provider_id = self.kwargs['provider_id']
-        return Review.objects.filter(provider_id=provider_id).select_related(
+        reviews = Review.objects.filter(provider_id=provider_id).select_related(
             'reviewer', 'provider', 'job'
-        )
+        ).prefetch_related(ready_photos())
+        if self.request.query_params.get('ordering') == 'helpful':
+            # Walks the (provider, -helpful_score, -created_at) index
+            reviews = reviews.order_by('-helpful_score', '-created_at')
+        return reviews
+    
+    def get_serializer_context(self):
+        # List screens only show thumbnails
+        return {**super().get_serializer_context(), 'photo_variants': ('thumb',)}
     
     @swagger_auto_schema(
         operation_summary='Get provider reviews',
-        operation_description='Returns all reviews for a specific provider.',
+        operation_description='Returns all reviews for a specific provider, newest first or most helpful first with ordering=helpful.',
+        manual_parameters=[
+            openapi.Parameter(
+                'ordering', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['newest', 'helpful'],
+                description='newest (default) or helpful, by the lower bound of the helpful vote share'
+            ),
+        ],
         tags=['Reviews']
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
+class ProviderRatingSummaryView(GenericAPIView):
+    serializer_class = ProviderRatingSummarySerializer
+    
+    @swagger_auto_schema(
+        operation_summary='Get provider rating summary',
+        operation_description="""
+        Returns a provider's average rating, review count, 1-5 star histogram,
+        average quality, timeliness, communication and value ratings and
+        share of reviewers who would recommend them.
+        
+        Read from aggregates maintained as reviews change, no reviews are scanned.
+        """,
+        tags=['Reviews']
+    )
+    def get(self, request, provider_id):
+        provider = get_object_or_404(Provider.objects.only('id'), id=provider_id)
+        stats = ProviderRatingStats.objects.filter(provider_id=provider_id).first() or ProviderRatingStats(provider=provider)
+        return Response(self.get_serializer(stats).data)
+
 class MyReviewsView(ListAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
@@ -106,7 +120,10 @@ class MyReviewsView(ListAPIView):
     def get_queryset(self):
         return Review.objects.filter(reviewer=self.request.user).select_related(
             'provider', 'job'
-        )
+        ).prefetch_related(ready_photos())
+    
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'photo_variants': ('thumb',)}
     
     @swagger_auto_schema(
         operation_summary='Get my reviews',
@@ -166,33 +183,27 @@ class ReviewHelpfulnessView(GenericAPIView):
         tags=['Reviews']
     )
     def post(self, request, review_id):
-        try:
-            review = Review.objects.get(id=review_id)
-            
-            # Check if user already voted
-            helpfulness, created = ReviewHelpful.objects.get_or_create(
-                review=review,
-                user=request.user,
-                defaults={'is_helpful': request.data.get('is_helpful', True)}
-            )
-            
-            if not created:
-                # Update existing vote
-                helpfulness.is_helpful = request.data.get('is_helpful', True)
-                helpfulness.save()
-            
-            return Response({
-                'message': 'Vote recorded successfully'
-            }, status=status.HTTP_200_OK)
-            
-        except Review.DoesNotExist:
+        if not Review.objects.filter(id=review_id).exists():
             return Response({
                 'message': 'Review not found'
             }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            is_helpful = serializers.BooleanField().to_internal_value(request.data.get('is_helpful', True))
+        except serializers.ValidationError:
+            return Response({
+                'message': 'is_helpful must be true or false'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        ReviewVoteService.vote(review_id, request.user, is_helpful)
+        return Response({
+            'message': 'Vote recorded successfully'
+        }, status=status.HTTP_200_OK)
 
 class ReviewDetailView(RetrieveAPIView):
     serializer_class = ReviewSerializer
-    queryset = Review.objects.all()
+    queryset = Review.objects.prefetch_related(ready_photos())
+    lookup_url_kwarg = 'review_id'
     
     @swagger_auto_schema(
         operation_summary='Get review details',
@@ -201,3 +212,55 @@ class ReviewDetailView(RetrieveAPIView):
     )
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
+
+class ReviewPhotoListCreateView(GenericAPIView):
+    serializer_class = ReviewPhotoSerializer
+    permission_classes = [IsAuthenticated]
+    
+    @swagger_auto_schema(
+        operation_summary='List review photos',
+        operation_description='Returns the photos of a review, with those still being processed.',
+        tags=['Reviews']
+    )
+    def get(self, request, review_id):
+        review = get_object_or_404(Review, id=review_id)
+        photos = review.review_photos.select_related('blob')
+        return Response(self.get_serializer(photos, many=True).data)
+    
+    @swagger_auto_schema(
+        operation_summary='Add a photo to a review',
+        operation_description="""
+        Uploads a photo (multipart field `photo`) to a review written by the
+        authenticated user.
+        
+        **Limits:** PNG, JPEG or WebP files of at most REVIEW_PHOTO_MAX_SIZE
+        bytes, REVIEW_PHOTO_MAX_PER_REVIEW photos per review. Resized
+        variants are generated in the background, the photo shows in reviews
+        once its status is ready.
+        """,
+        manual_parameters=[
+            openapi.Parameter('photo', openapi.IN_FORM, type=openapi.TYPE_FILE, required=True),
+        ],
+        responses={
+            202: ReviewPhotoSerializer,
+            400: 'Invalid photo',
+            404: 'Review not found'
+        },
+        tags=['Reviews']
+    )
+    def post(self, request, review_id):
+        review = get_object_or_404(Review, id=review_id, reviewer=request.user)
+        uploaded = request.FILES.get('photo')
+        if uploaded is None:
+            return Response({
+                'message': 'Send the photo in the photo field'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            photo = ReviewPhotoService.add_photo(review, uploaded)
+        except PhotoRejected as e:
+            return Response({
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        photo = ReviewPhoto.objects.select_related('blob').get(pk=photo.pk)
+        return Response(self.get_serializer(photo).data, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,108 @@
+"""
+Process pool for post-processing uploaded blobs off the request path.
+
+A pool subclass names the setting holding its worker count, the blob model
+it processes and the module-level function doing the work, which runs in a
+spawned worker process and returns a plain dict. The subclass turns a blob
+into that function's arguments and stores its result. With the worker
+setting at 0 blobs are processed inline. Results are stored by a callback in
+this process, so the workers never touch the database.
+
+All pools submit to one spawn executor sized by the largest worker setting,
+so a process runs a single set of workers however many kinds of blobs it
+processes.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class BlobProcessingPool:
+    """
+    Base of the blob pools, which set these class attributes:
+
+    - workers_setting: name of the setting with the number of worker processes
+    - blob_model: model with sha256, status and created_at fields
+    - process: staticmethod of the module-level processing function
+    - arguments(blob): staticmethod returning the function's arguments for a blob
+    - store_result(sha256, result): staticmethod saving the function's result
+    """
+
+    REQUIRED = ('workers_setting', 'blob_model', 'process', 'arguments', 'store_result')
+
+    workers_setting = None
+    blob_model = None
+    process = None
+    arguments = None
+    store_result = None
+    # Noun used in log messages
+    label = 'blob'
+
+    _executor = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        missing = [name for name in cls.REQUIRED if getattr(cls, name) is None]
+        if missing:
+            raise TypeError(f"{cls.__name__} must set {', '.join(missing)}")
+
+    @classmethod
+    def workers(cls):
+        return getattr(settings, cls.workers_setting)
+
+    @staticmethod
+    def executor():
+        """The executor shared by every pool, created on first use"""
+        if BlobProcessingPool._executor is None:
+            BlobProcessingPool._executor = ProcessPoolExecutor(
+                max_workers=max(pool.workers() for pool in BlobProcessingPool.__subclasses__()),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return BlobProcessingPool._executor
+
+    @classmethod
+    def submit(cls, sha256):
+        blob = cls.blob_model.objects.get(sha256=sha256)
+        arguments = cls.arguments(blob)
+        if not cls.workers():
+            cls.store_result(sha256, cls.process(*arguments))
+            return
+        future = cls.executor().submit(cls.process, *arguments)
+        submitter = threading.get_ident()
+        future.add_done_callback(lambda future: cls._store_future(sha256, future, submitter))
+
+    @classmethod
+    def _store_future(cls, sha256, future, submitter):
+        try:
+            result = future.result()
+        except Exception:
+            # The blob stays pending and process_pending retries it
+            logger.exception(f"Processing {cls.label} {sha256} failed")
+            return
+        try:
+            cls.store_result(sha256, result)
+        finally:
+            # Callbacks normally run in the pool's thread, which has its own
+            # connections, but inline in the submitting thread if the future
+            # was already done, and that thread keeps its connections
+            if threading.get_ident() != submitter:
+                connections.close_all()
+
+    @classmethod
+    def process_pending(cls, older_than_minutes=10):
+        """Process inline the blobs still pending after `older_than_minutes`, returning their number"""
+        cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+        blobs = cls.blob_model.objects.filter(status='pending', created_at__lt=cutoff)
+        count = 0
+        for blob in blobs.iterator():
+            cls.store_result(blob.sha256, cls.process(*cls.arguments(blob)))
+            count += 1
+        return count
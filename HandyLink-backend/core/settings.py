@@ -150,3 +150,84 @@ EMAIL_HOST_PASSWORD = 'lhhy qaru nrxu mzin'
 DEFAULT_FROM_EMAIL = 'HandyLink <haithamomar520@gmail.com>'
 EMAIL_TIMEOUT = 30
 
+
+# Job view counters are buffered in each process's memory and flushed to the
+# database when the buffer is this old (seconds) or holds this many jobs, by
+# the next view or by a background thread when traffic stops, and at exit
+JOB_VIEW_FLUSH_INTERVAL = 30
+JOB_VIEW_FLUSH_THRESHOLD = 500
+
+# Relative weights of the factors used by ?rank=best on job applications
+APPLICATION_RANKING_WEIGHTS = {
+    'bid': 0.30,
+    'rating': 0.25,
+    'reviews': 0.15,
+    'distance': 0.15,
+    'history': 0.15,
+}
+
+# Completed and cancelled jobs untouched for this many days are moved to the
+# archive tables by the archive_jobs command
+JOB_ARCHIVE_AFTER_DAYS = 180
+
+# Longest a job messages long-poll request may wait for new messages, in seconds
+JOB_MESSAGE_LONG_POLL_TIMEOUT = 25
+
+# Most jobs accepted by one bulk job create request
+JOB_BULK_CREATE_LIMIT = 50
+
+# Weights of the provider search ranking score, see apps/providers/services.py
+PROVIDER_RANKING_WEIGHTS = {
+    'rating': 0.60,
+    'completion': 0.25,
+    'recency': 0.15,
+}
+# Reviews the Bayesian rating needs before it moves halfway from the site-wide mean
+PROVIDER_RATING_PRIOR_REVIEWS = 10
+# Days after which the recency factor of a provider's last completed job halves
+PROVIDER_RECENCY_HALF_LIFE_DAYS = 90
+
+# Seconds a rendered provider profile stays cached, stale versions are never read
+PROVIDER_PROFILE_CACHE_TIMEOUT = 60 * 60
+
+# Chunked provider document uploads, see apps/providers/uploads.py
+PROVIDER_DOCUMENT_MAX_SIZE = 20 * 1024 * 1024
+PROVIDER_DOCUMENT_MAX_PAGES = 50
+PROVIDER_DOCUMENT_THUMBNAIL_SIZE = 256
+PROVIDER_UPLOAD_MAX_CHUNK_SIZE = 2 * 1024 * 1024
+PROVIDER_UPLOAD_TEMP_DIR = BASE_DIR / 'provider_documents' / 'partial'
+# Processes checking and thumbnailing uploaded documents, 0 processes them inline
+PROVIDER_DOCUMENT_WORKERS = 2
+
+# Seconds a provider's dashboard figures are cached
+PROVIDER_DASHBOARD_CACHE_TIMEOUT = 60
+
+# Weights of the nightly provider trust score, see apps/providers/trust.py
+PROVIDER_TRUST_WEIGHTS = {
+    'rating': 0.30,
+    'volume': 0.10,
+    'disputes': 0.20,
+    'cancellations': 0.15,
+    'response': 0.10,
+    'verification': 0.15,
+}
+
+# Side in degrees of the grid cells indexing provider service areas. Run the
+# rebuild_service_area_index command after changing it.
+SERVICE_AREA_GRID_DEGREES = 0.1
+# Largest service area accepted, as a circle radius and a polygon's bounding box span
+SERVICE_AREA_MAX_RADIUS_KM = 100
+SERVICE_AREA_MAX_SPAN_DEGREES = 2.0
+
+# Review photo uploads, see apps/reviews/photos.py
+REVIEW_PHOTO_MAX_SIZE = 10 * 1024 * 1024
+REVIEW_PHOTO_MAX_PIXELS = 40_000_000
+REVIEW_PHOTO_MAX_PER_REVIEW = 6
+# Longest side in pixels of each resized variant, list screens only use thumb
+REVIEW_PHOTO_VARIANTS = {
+    'thumb': 200,
+    'medium': 800,
+    'large': 1600,
+}
+# Processes resizing review photos, 0 processes them inline
+REVIEW_PHOTO_WORKERS = 2
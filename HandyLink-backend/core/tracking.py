@@ -0,0 +1,37 @@
+"""
+Change tracking for model fields.
+
+A model lists the fields its post_save and post_delete receivers compare
+against in `tracked_fields`. Their stored values are remembered as
+`_original_<field>` when a row is loaded and again once save() has run the
+post_save receivers, so a receiver sees the values from before the save
+without querying the row again. Code that changes rows with a queryset
+update() and mirrors the change in memory calls remember_stored_values().
+"""
+
+
+class TrackedFieldsMixin:
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_stored_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.remember_stored_values()
+
+    def remember_stored_values(self):
+        """Take the current values as the stored ones, skipping fields deferred at load"""
+        for field in self.tracked_fields:
+            if field in self.__dict__:
+                setattr(self, f'_original_{field}', self.__dict__[field])
+
+    def original_values(self, fields=None):
+        """Stored values of tracked fields by name, None unless all of them are known"""
+        fields = fields or self.tracked_fields
+        if not all(hasattr(self, f'_original_{field}') for field in fields):
+            return None
+        return {field: getattr(self, f'_original_{field}') for field in fields}